@@ -0,0 +1 @@
+"""Performance benchmarks for the dashboard hot paths (``python -m benchmarks.run``)."""
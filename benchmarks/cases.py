@@ -0,0 +1,201 @@
+"""Benchmark cases: the hot paths of the site pages at a given data scale.
+
+Page scripts cannot be imported (they render on import), so helpers that
+still live in a page are compiled straight out of its source with ``ast``
+(``page_function`` / ``page_value``) - the benchmark always times the code
+the page actually runs. Code that has moved to ``biomet`` is called directly.
+
+Each case's ``prepare(scale, work)`` writes or loads its inputs (untimed) and
+returns the zero-argument callable to time.
+"""
+import ast
+import math
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import synthetic
+from biomet.paths import BASE_DIR
+
+PAGES = BASE_DIR / "pages"
+STANLOW_PAGE = "Manufacturing Sites - Biodiversity.py"
+FIRE_PAGE = "Fire Hazard - Risk Prediction.py"
+STANLOW = BASE_DIR / "stanlow area risk"
+LANDCOVER = STANLOW / "export_land_cover_polygons_Stanlow_ChangeNow_{year}.geojson"
+
+
+@dataclass
+class Case:
+    name: str
+    prepare: Callable
+    cold: bool = False          # run each repeat against an empty derived-data cache
+    max_scale: int = 100
+    repeat: int = 3
+
+
+# --- Page source helpers ---
+def _page_nodes(page):
+    return ast.parse((PAGES / page).read_text(), filename=str(PAGES / page)).body
+
+
+def page_function(page, name, namespace):
+    """Compile one top-level function of a page (decorators dropped) into ``namespace``."""
+    node = next(n for n in _page_nodes(page) if isinstance(n, ast.FunctionDef) and n.name == name)
+    node.decorator_list = []
+    exec(compile(ast.Module(body=[node], type_ignores=[]), str(PAGES / page), "exec"), namespace)
+    return namespace[name]
+
+
+def page_value(page, name):
+    """Literal value of a top-level ``name = ...`` assignment in a page."""
+    for n in _page_nodes(page):
+        if isinstance(n, ast.Assign) and any(getattr(t, "id", None) == name for t in n.targets):
+            return ast.literal_eval(n.value)
+    raise KeyError(name)
+
+
+def _scaled_landcover(work, year, scale):
+    dst = work / f"landcover_{year}_x{scale}.geojson"
+    if not dst.exists():
+        synthetic.landcover_geojson(LANDCOVER.with_name(LANDCOVER.name.format(year=year)), dst, scale)
+    return dst
+
+
+# --- Cases ---
+def prepare_read_landcover(scale, work):
+    import geopandas as gpd
+    path = _scaled_landcover(work, 2018, scale)
+    return lambda: gpd.read_file(path)
+
+
+def prepare_build_map(scale, work):
+    """Land-cover layer of ``build_map``: dissolve, one GeoJson per class, HTML render."""
+    import folium
+    from biomet.landcover import landcover_layer
+    path = _scaled_landcover(work, 2018, scale)
+    names = page_value(STANLOW_PAGE, "land_cover_dict")
+    water, eco = page_value(STANLOW_PAGE, "water_classes"), page_value(STANLOW_PAGE, "ecosystem_classes")
+
+    def run():
+        m = folium.Map(location=[53.28, -2.86], zoom_start=11, tiles=None)
+        landcover_layer(path, names, water, eco).add_to(m)
+        return len(m.get_root().render())
+    return run
+
+
+def prepare_ffi(scale, work):
+    """Fragmentation engine (FFI, drift, distance) for a two-year pseudo site."""
+    from biomet import fragmentation
+    from biomet.rasterize import SITES
+    for y in (2001, 2018):
+        _scaled_landcover(work, y, scale)
+    site = f"bench_x{scale}"
+    SITES[site] = {"folder": work, "pattern": "landcover_{year}_x%d.geojson" % scale, "years": [2001, 2018]}
+    return lambda: fragmentation.compare_years(site, 2001, 2018, (53.2822, -2.8623))
+
+
+def prepare_check_exceedances(scale, work):
+    ns = {"pd": pd}
+    check = page_function(STANLOW_PAGE, "check_exceedances", ns)
+    clean = page_function(STANLOW_PAGE, "clean_names", ns)
+    sheets = pd.read_excel(STANLOW / "Water and Air Quality Thresholds.xlsx", sheet_name=None)
+    epa, water = sheets["EPA Air Quality"], sheets["Ecosystem Water Quality"]
+    epa["clean_pollutant"] = clean(epa["Pollutant"])
+    epa["thr_num"] = epa["Level"].astype(str).str.extract(r"(\d+\.?\d*)")[0].astype(float)
+    water["clean_pollutant"] = clean(water["Pollutant (P = Priority Pollutant)"])
+    water["thr_num"] = pd.to_numeric(water["Freshwater CCC (chronic, µg/L)"], errors="coerce")
+    air = synthetic.measurement_sites(page_value(STANLOW_PAGE, "air_sites"), scale)
+    wat = synthetic.measurement_sites(page_value(STANLOW_PAGE, "water_sites"), scale)
+    return lambda: (check(air, epa), check(wat, water))
+
+
+def prepare_growth_table(scale, work):
+    """Growth table from the rasterized class stack, tiled ``scale`` times."""
+    from biomet.landcover import growth_table
+    from biomet.rasterize import ClassStack, ensure_class_stack
+    base = ensure_class_stack("Stanlow")
+    reps = math.ceil(math.sqrt(scale))
+    grids = np.tile(np.asarray(base.grids), (1, reps, math.ceil(scale / reps)))
+    stack = ClassStack(grids, base.years, base.transform, base.crs)
+    names = page_value(STANLOW_PAGE, "land_cover_dict")
+    return lambda: growth_table(stack.class_areas(2001), stack.class_areas(2018), 2001, 2018, names)
+
+
+def prepare_growth_table_vector(scale, work):
+    """Fallback growth table: read, reproject and measure both years' polygons."""
+    import geopandas as gpd
+    from biomet.landcover import growth_table, polygon_areas
+    p1, p2 = _scaled_landcover(work, 2001, scale), _scaled_landcover(work, 2018, scale)
+    names = page_value(STANLOW_PAGE, "land_cover_dict")
+
+    def areas(p):
+        g = gpd.read_file(p)
+        return polygon_areas(g[g["label"].notna()], names)
+    return lambda: growth_table(areas(p1), areas(p2), 2001, 2018)
+
+
+def prepare_species_scans(scale, work):
+    """Threatened + invasive scans over the nine per-position species tables."""
+    from biomet.loaders import load_positions
+    from biomet.taxonomy import invasive_occurrences, load_index
+    positions = page_value(STANLOW_PAGE, "positions")
+    index = load_index(page_value(STANLOW_PAGE, "INVASIVE_REGISTERS"))
+    for pos in positions:
+        dst = work / f"species_{pos}_x{scale}.csv"
+        if not dst.exists():
+            synthetic.species_table(STANLOW / f"species_iucn_gbif_results_{pos}.csv", dst, scale)
+
+    def run():
+        at_risk = set()
+        loaded = load_positions(work, "species_{pos}_x%d.csv" % scale, positions)
+        for _, df in loaded.items():
+            mask = df["Red List Category"].isin(["Critically Endangered", "Endangered", "Vulnerable"])
+            at_risk |= set(df.loc[mask, "Species Name"].dropna())
+        found = set(invasive_occurrences(loaded.results, index)["Invasive Name"])
+        return len(at_risk), len(found)
+    return run
+
+
+def prepare_create_la_grid(scale, work):
+    import geopandas as gpd
+    from shapely.geometry import box
+    from biomet.grid import GRID_SIZE_DEG, LA_BOUNDS
+    create = page_function(FIRE_PAGE, "create_la_grid", {"gpd": gpd, "box": box})
+    bounds = synthetic.grid_bounds(LA_BOUNDS, scale)
+    return lambda: create(bounds, GRID_SIZE_DEG, n_cells=110 * scale)
+
+
+def prepare_shap_panel(scale, work):
+    """One uncached month of the SHAP panel, for ``scale`` x the grid cells.
+
+    Uses a small in-memory model so the benchmark never touches the cached
+    production model.
+    """
+    from sklearn.ensemble import HistGradientBoostingRegressor
+    from biomet.explain import ShapService
+    from biomet.fire_model import build_features, la_inputs
+    matrix, cells, shared, local = la_inputs(BASE_DIR / "LA")
+    X, names = build_features(cells, matrix["Date"], shared, local)
+    y = matrix[cells["cell"]].to_numpy(np.float32).ravel()
+    ok = np.isfinite(y)
+    model = HistGradientBoostingRegressor(max_iter=50, random_state=0).fit(X[ok], y[ok])
+    bundle = {"model": model, "feature_names": names, "version": f"bench_x{scale}", "params": {}}
+    service = ShapService(bundle, BASE_DIR / "LA")
+    service.cells = synthetic.jitter_cells(service.cells, scale, 0.5)
+    date = shared.index[-1]
+    return lambda: service.explain(date)
+
+
+CASES = {c.name: c for c in [
+    Case("read_landcover", prepare_read_landcover),
+    Case("build_map", prepare_build_map, cold=True),
+    Case("ffi", prepare_ffi, cold=True),
+    Case("check_exceedances", prepare_check_exceedances),
+    Case("growth_table", prepare_growth_table),
+    Case("growth_table_vector", prepare_growth_table_vector, repeat=1),
+    Case("species_scans", prepare_species_scans),
+    Case("create_la_grid", prepare_create_la_grid),
+    Case("shap_panel", prepare_shap_panel, cold=True, repeat=1),
+]}
@@ -0,0 +1,107 @@
+"""Run the benchmark cases, compare with the recorded baseline, flag regressions.
+
+    python -m benchmarks.run                         # all cases at 1x, 10x, 100x
+    python -m benchmarks.run --cases ffi build_map --scales 1 10
+    python -m benchmarks.run --save-baseline         # record benchmarks/baseline.json
+
+A result regresses when it is more than ``--tolerance`` slower than the
+baseline (and by more than the ``NOISE_S`` floor); the exit status is then 1,
+so the command can gate CI. Synthetic inputs are generated once under
+``.biomet_cache/bench`` and reused.
+"""
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+from benchmarks.cases import CASES
+from biomet import paths
+
+BASELINE = Path(__file__).with_name("baseline.json")
+SCALES = [1, 10, 100]
+NOISE_S = 0.05
+
+
+def fresh_cache(root):
+    """Point the derived-data cache at an empty folder (cold-start timings)."""
+    paths.CACHE_DIR = Path(tempfile.mkdtemp(dir=root))
+
+
+def time_case(case, scale, work, tmp_root):
+    run = case.prepare(scale, work)
+    times = []
+    for _ in range(case.repeat):
+        if case.cold:
+            fresh_cache(tmp_root)
+        t0 = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def compare(results, baseline, tolerance):
+    """Rows of (key, seconds, baseline seconds, ratio, regressed)."""
+    rows = []
+    for key, t in results.items():
+        base = baseline.get(key)
+        ratio = t / base if base else None
+        regressed = bool(base) and t > base * (1 + tolerance) and t - base > NOISE_S
+        rows.append((key, t, base, ratio, regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard hot paths")
+    parser.add_argument("--cases", nargs="*", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--scales", nargs="*", type=int, default=SCALES)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--out", default=None, help="write results JSON here")
+    args = parser.parse_args(argv)
+    # geographic-CRS centroid and similar library warnings would swamp the report
+    warnings.filterwarnings("ignore")
+
+    work = paths.cache_path("bench", "data", ".keep").parent
+    cache_dir = paths.CACHE_DIR
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_root:
+        for name in args.cases:
+            case = CASES[name]
+            for scale in args.scales:
+                if scale > case.max_scale:
+                    continue
+                paths.CACHE_DIR = cache_dir
+                key = f"{name}@x{scale}"
+                results[key] = time_case(case, scale, work, tmp_root)
+                print(f"{key:<28} {results[key]:8.3f} s", flush=True)
+        paths.CACHE_DIR = cache_dir
+
+    meta = {"python": platform.python_version(), "machine": platform.machine(),
+            "processor": platform.processor() or platform.machine()}
+    if args.out:
+        Path(args.out).write_text(json.dumps({"meta": meta, "results": results}, indent=2))
+    if args.save_baseline:
+        recorded = json.loads(BASELINE.read_text())["results"] if BASELINE.exists() else {}
+        merged = {k: round(v, 4) for k, v in {**recorded, **results}.items()}
+        BASELINE.write_text(json.dumps({"meta": meta, "results": merged}, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline written to {BASELINE}")
+        return 0
+
+    baseline = json.loads(BASELINE.read_text())["results"] if BASELINE.exists() else {}
+    rows = compare(results, baseline, args.tolerance)
+    print(f"\n{'case':<28} {'now (s)':>9} {'base (s)':>9} {'ratio':>7}")
+    for key, t, base, ratio, regressed in rows:
+        print(f"{key:<28} {t:9.3f} {base if base else float('nan'):9.3f} "
+              f"{ratio if ratio else float('nan'):7.2f}{'  REGRESSION' if regressed else ''}")
+    n_bad = sum(r[4] for r in rows)
+    if n_bad:
+        print(f"\n{n_bad} regression(s) beyond {args.tolerance:.0%}")
+    return 1 if n_bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""Scaled-up copies of the demo datasets.
+
+Every generator takes the real file(s) and a scale factor and writes a
+dataset roughly ``scale`` times larger under ``out_dir``, keeping the schema
+of the original so the real code paths can read it unchanged:
+
+* land cover - the polygons tiled ``scale`` times side by side (new extent),
+* species tables - rows repeated with suffixed species names,
+* grid / measurement sets - more cells, sites and months.
+"""
+import json
+import math
+
+import numpy as np
+import pandas as pd
+
+
+def tile_offsets(scale, width, height):
+    """``scale`` (dx, dy) offsets laying copies out on a near-square grid."""
+    ncols = math.ceil(math.sqrt(scale))
+    return [((k % ncols) * width, (k // ncols) * height) for k in range(scale)]
+
+
+def _shift(coords, dx, dy):
+    if isinstance(coords[0], (int, float)):
+        return [coords[0] + dx, coords[1] + dy, *coords[2:]]
+    return [_shift(c, dx, dy) for c in coords]
+
+
+def landcover_geojson(src, dst, scale):
+    """Tile the features of a land-cover GeoJSON ``scale`` times."""
+    with open(src) as fh:
+        fc = json.load(fh)
+    feats = fc["features"]
+    xs, ys = [], []
+    for f in feats:
+        arr = np.array(_flatten(f["geometry"]["coordinates"]))
+        xs += [arr[:, 0].min(), arr[:, 0].max()]
+        ys += [arr[:, 1].min(), arr[:, 1].max()]
+    width, height = (max(xs) - min(xs)) * 1.01, (max(ys) - min(ys)) * 1.01
+    out = []
+    for k, (dx, dy) in enumerate(tile_offsets(scale, width, height)):
+        for f in feats:
+            g = dict(f["geometry"], coordinates=_shift(f["geometry"]["coordinates"], dx, dy))
+            out.append({"type": "Feature", "geometry": g, "properties": f["properties"],
+                        "id": f"{f.get('id', '')}_{k}"})
+    with open(dst, "w") as fh:
+        json.dump({"type": "FeatureCollection", "features": out}, fh)
+    return len(out)
+
+
+def _flatten(coords):
+    if isinstance(coords[0], (int, float)):
+        return [coords[:2]]
+    return [p for c in coords for p in _flatten(c)]
+
+
+def species_table(src, dst, scale, name_col="Species Name"):
+    """Repeat species rows ``scale`` times; copies get a ``" sp<k>"`` name suffix."""
+    df = pd.read_csv(src)
+    copies = [df] + [df.assign(**{name_col: df[name_col].astype(str) + f" sp{k}"}) for k in range(1, scale)]
+    out = pd.concat(copies, ignore_index=True)
+    out.to_csv(dst, index=False)
+    return len(out)
+
+
+def measurement_sites(sites, scale):
+    """``{site: {pollutant: value}}`` with ``scale`` x the sites (values jittered)."""
+    rng = np.random.default_rng(0)
+    out = {}
+    for k in range(scale):
+        for name, meas in sites.items():
+            out[f"{name} #{k}" if k else name] = {p: v * rng.uniform(0.5, 1.5) for p, v in meas.items()}
+    return out
+
+
+def grid_bounds(bounds, scale):
+    """Bounds grown so a fixed cell size covers ``scale`` x the cells."""
+    f = math.sqrt(scale)
+    return {"min_lon": bounds["min_lon"], "min_lat": bounds["min_lat"],
+            "max_lon": bounds["min_lon"] + (bounds["max_lon"] - bounds["min_lon"]) * f,
+            "max_lat": bounds["min_lat"] + (bounds["max_lat"] - bounds["min_lat"]) * f}
+
+
+def jitter_cells(cells, scale, step_deg):
+    """Replicate a ``cell/lat/lon/position`` frame ``scale`` times on shifted copies."""
+    reps = []
+    for k, (dx, dy) in enumerate(tile_offsets(scale, step_deg, step_deg)):
+        c = cells.copy()
+        c["lon"] += dx
+        c["lat"] += dy
+        c["cell"] = [f"{la:.4f}_{lo:.4f}" for la, lo in zip(c["lat"], c["lon"])]
+        reps.append(c)
+    return pd.concat(reps, ignore_index=True)
@@ -0,0 +1 @@
+"""Shared helpers for the Biomet.life dashboard pages."""
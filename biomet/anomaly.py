@@ -0,0 +1,212 @@
+"""Per-cell fire-readiness climatology, anomalies and alerts.
+
+``Climatology`` holds, for every calendar month and cell of a ``Date x cell``
+readiness matrix (``LA/Annual_Fire_Readiness.csv``, or the single MOH series
+``MOH/Fire_Readiness_2005_2024.csv``), the running count, mean and sum of
+squared deviations (Welford). The anomaly of a month is its z-score against
+that month's climatology. The run length of a cell counts its consecutive
+months at or above ``Z_WARN``. A cell is on the alert list when its z-score
+reaches ``Z_ALERT`` or its run reaches ``RUN_ALERT`` months.
+
+``sync`` keeps the state of a readiness file under ``.biomet_cache/anomaly``.
+When months are appended to the file, only those months go through
+``Climatology.update``: a Welford step for their calendar month plus the
+run-length update, O(cells) per month. If earlier rows change, the
+climatology is refitted.
+
+    python -m biomet.anomaly LA
+    python -m biomet.anomaly MOH
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from biomet.paths import BASE_DIR, cache_path
+
+SOURCES = {"LA": BASE_DIR / "LA" / "Annual_Fire_Readiness.csv",
+           "MOH": BASE_DIR / "MOH" / "Fire_Readiness_2005_2024.csv"}
+MIN_YEARS = 3      # years of a calendar month before its z-scores are reported
+Z_WARN = 1.0       # z-score that extends a run
+Z_ALERT = 2.0      # z-score that raises an alert on its own
+RUN_ALERT = 3      # consecutive months at or above Z_WARN that raise an alert
+
+
+def cell_columns(matrix):
+    return [c for c in matrix.columns if c != "Date"]
+
+
+def save_npz(path, compress=False, **arrays):
+    """``np.savez`` to a unique temporary file next to ``path``, then atomically replace it."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.stem + ".", suffix=".tmp.npz")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            (np.savez_compressed if compress else np.savez)(fh, **arrays)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def rows_hash_of(matrix, cells):
+    """Digest of the dates and ``cells`` values of ``matrix`` (detects edited history)."""
+    h = hashlib.sha1()
+    h.update(pd.DatetimeIndex(matrix["Date"]).asi8.tobytes())
+    h.update(np.ascontiguousarray(matrix[cells].to_numpy(np.float64)).tobytes())
+    return h.hexdigest()
+
+
+class Climatology:
+    """Welford state per (calendar month, cell) plus the current run lengths.
+
+    ``n``, ``mean`` and ``m2`` are ``12 x cells``; ``run`` and ``z`` are the run
+    lengths and z-scores of the latest month (``last``).
+    """
+
+    def __init__(self, cells, n, mean, m2, run, z, last):
+        self.cells = list(cells)
+        self.n, self.mean, self.m2 = n, mean, m2
+        self.run, self.z = run, z
+        self.last = pd.Timestamp(last) if last is not None else None
+
+    @classmethod
+    def fit(cls, matrix, z_warn=Z_WARN):
+        """State after every month of ``matrix`` (vectorized; equal to updating month by month)."""
+        cells = cell_columns(matrix)
+        values = matrix[cells].to_numpy(np.float64)
+        month = pd.DatetimeIndex(matrix["Date"]).month.to_numpy() - 1
+        grouped = pd.DataFrame(values).groupby(month)
+        n = np.zeros((12, len(cells)))
+        mean = np.zeros((12, len(cells)))
+        m2 = np.zeros((12, len(cells)))
+        idx = grouped.count().index.to_numpy()
+        n[idx] = grouped.count().to_numpy()
+        mean[idx] = grouped.mean().fillna(0).to_numpy()
+        m2[idx] = (grouped.var(ddof=0).fillna(0) * grouped.count()).to_numpy()
+        clim = cls(cells, n, mean, m2, np.zeros(len(cells), dtype=np.int64), np.full(len(cells), np.nan), None)
+        if len(matrix):
+            z = clim.zscores(matrix).to_numpy()
+            clim.run = run_lengths(z, z_warn)[-1]
+            clim.z = z[-1]
+            clim.last = pd.Timestamp(matrix["Date"].iloc[-1])
+        return clim
+
+    def std(self):
+        """``12 x cells`` sample standard deviation (NaN below ``MIN_YEARS``)."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            sd = np.sqrt(self.m2 / (self.n - 1))
+        return np.where(self.n >= MIN_YEARS, sd, np.nan)
+
+    def zscores(self, matrix):
+        """``Date x cell`` z-scores of ``matrix`` against the current climatology."""
+        month = pd.DatetimeIndex(matrix["Date"]).month.to_numpy() - 1
+        values = matrix[self.cells].to_numpy(np.float64)
+        sd = self.std()[month]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            z = (values - self.mean[month]) / np.where(sd > 0, sd, np.nan)
+        return pd.DataFrame(z, index=pd.DatetimeIndex(matrix["Date"], name="Date"), columns=self.cells)
+
+    def update(self, date, values, z_warn=Z_WARN):
+        """Add one month (``values`` in ``cells`` order): Welford step, z-scores, run lengths."""
+        date = pd.Timestamp(date)
+        if self.last is not None and date <= self.last:
+            raise ValueError(f"{date.date()} is not after the last month ({self.last.date()})")
+        x = np.asarray(values, dtype=np.float64)
+        m, ok = date.month - 1, ~np.isnan(x)
+        self.n[m, ok] += 1
+        delta = x[ok] - self.mean[m, ok]
+        self.mean[m, ok] += delta / self.n[m, ok]
+        self.m2[m, ok] += delta * (x[ok] - self.mean[m, ok])
+        sd = self.std()[m]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.z = (x - self.mean[m]) / np.where(sd > 0, sd, np.nan)
+        self.run = np.where(self.z >= z_warn, self.run + 1, 0)
+        self.last = date
+        return self.z
+
+    # --- Storage ---
+    def save(self, path, rows_hash):
+        save_npz(path, cells=np.asarray(self.cells), n=self.n, mean=self.mean, m2=self.m2, run=self.run,
+                 z=self.z, last=np.datetime64(self.last, "ns"), rows_hash=rows_hash)
+
+    @classmethod
+    def load(cls, path):
+        """``(state, rows_hash)`` from a saved state file."""
+        with np.load(path) as f:
+            clim = cls(f["cells"].tolist(), f["n"], f["mean"], f["m2"], f["run"], f["z"], f["last"][()])
+            return clim, str(f["rows_hash"])
+
+
+def run_lengths(z, z_warn=Z_WARN):
+    """Consecutive months at or above ``z_warn`` ending at each month (``months x cells``)."""
+    above = np.nan_to_num(z, nan=-np.inf) >= z_warn
+    runs = np.zeros(above.shape, dtype=np.int64)
+    run = np.zeros(above.shape[1], dtype=np.int64)
+    for t, row in enumerate(above):
+        run = np.where(row, run + 1, 0)
+        runs[t] = run
+    return runs
+
+
+def alert_table(matrix, clim, z_alert=Z_ALERT, run_alert=RUN_ALERT, z_warn=Z_WARN):
+    """Every (month, cell) on the alert list: Date, Cell, Readiness, Normal, z, Run (months)."""
+    z = clim.zscores(matrix)
+    runs = run_lengths(z.to_numpy(), z_warn)
+    hit = (np.nan_to_num(z.to_numpy(), nan=-np.inf) >= z_alert) | (runs >= run_alert)
+    t, c = np.nonzero(hit)
+    month = z.index.month.to_numpy()[t] - 1
+    return pd.DataFrame({
+        "Date": z.index[t], "Cell": np.asarray(clim.cells, dtype=object)[c],
+        "Readiness (%)": matrix[clim.cells].to_numpy(np.float64)[t, c],
+        "Normal (%)": clim.mean[month, c], "z": z.to_numpy()[t, c], "Run (months)": runs[t, c],
+    }).sort_values(["Date", "z"], ascending=[True, False], ignore_index=True)
+
+
+def sync(name, matrix=None):
+    """Climatology of a readiness source, updated with the months added since the last call.
+
+    ``name`` is a key of ``SOURCES``; ``matrix`` overrides reading its file.
+    Returns ``(climatology, months added)``; a full refit reports every month.
+    """
+    if matrix is None:
+        matrix = pd.read_csv(SOURCES[name], parse_dates=["Date"])
+    matrix = matrix.sort_values("Date", ignore_index=True)
+    path = cache_path("anomaly", f"{name}.npz")
+    cells = cell_columns(matrix)
+    if path.exists():
+        clim, rows_hash = Climatology.load(path)
+        old = matrix[matrix["Date"] <= clim.last]
+        if clim.cells == cells and rows_hash_of(old, cells) == rows_hash:
+            new = matrix[matrix["Date"] > clim.last]
+            for date, values in zip(new["Date"], new[cells].to_numpy(np.float64)):
+                clim.update(date, values)
+            if len(new):
+                clim.save(path, rows_hash_of(matrix, cells))
+            return clim, len(new)
+    clim = Climatology.fit(matrix)
+    clim.save(path, rows_hash_of(matrix, cells))
+    return clim, len(matrix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fire-readiness anomalies and alerts")
+    parser.add_argument("source", choices=list(SOURCES))
+    parser.add_argument("--out", help="CSV for the full alert list (default: latest month)")
+    args = parser.parse_args()
+    matrix = pd.read_csv(SOURCES[args.source], parse_dates=["Date"])
+    clim, added = sync(args.source, matrix)
+    alerts = alert_table(matrix, clim)
+    print(f"{added} month(s) added; {len(clim.cells)} cells, last month {clim.last.date()}")
+    if args.out:
+        alerts.to_csv(args.out, index=False)
+        print(f"{len(alerts)} alerts written to {args.out}")
+    else:
+        latest = alerts[alerts["Date"] == clim.last]
+        print(latest.to_string(index=False, float_format="{:.2f}".format) if len(latest) else "No alerts in the latest month")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Time-series chart path: server-side downsampling, WebGL traces, cached figure JSON."""
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.io as pio
+import streamlit as st
+
+from biomet import instrument
+
+# Roughly the pixel width of a wide dashboard column; more points than this
+# cannot be told apart on screen and only slow down the browser.
+DEFAULT_POINTS = 800
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets downsampling.
+
+    Returns the sorted indices of ``n_out`` points of ``(x, y)`` that best
+    preserve the visual shape of the series (first and last points are kept).
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # Bucket edges for the n_out - 2 interior buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    idx = np.empty(n_out, dtype=int)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third vertex
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - cx) * (by - y[a]) - (x[a] - bx) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[i + 1] = a
+    return idx
+
+
+def downsample_long(df, x, y, by=None, n_out=DEFAULT_POINTS):
+    """Apply LTTB per series of a long-format frame (one series per ``by`` group)."""
+    if by is None:
+        groups = [df]
+    else:
+        keys = [by] if isinstance(by, str) else list(by)
+        groups = [g for _, g in df.groupby(keys, sort=False)]
+    parts = []
+    for g in groups:
+        g = g.dropna(subset=[y]).sort_values(x)
+        if len(g) > n_out:
+            xs = g[x]
+            if pd.api.types.is_datetime64_any_dtype(xs):
+                xs = xs.astype("int64")
+            g = g.iloc[lttb(xs.to_numpy(), g[y].to_numpy(), n_out)]
+        parts.append(g)
+    if not parts:
+        return df.iloc[0:0]
+    return pd.concat(parts, ignore_index=True)
+
+
+@st.cache_data(show_spinner=False)
+def line_figure_json(df, x, y, color=None, line_dash=None, n_out=DEFAULT_POINTS,
+                     layout=None, **px_kwargs):
+    """Downsample ``df`` and build a WebGL line figure; returns the figure as JSON."""
+    if isinstance(y, (list, tuple)):
+        # Wide input: same long layout plotly express would build internally
+        df = df.melt(id_vars=[x], value_vars=list(y), var_name="variable", value_name="value")
+        y, color = "value", "variable"
+    series = [c for c in (color, line_dash) if c is not None]
+    df_ds = downsample_long(df, x, y, by=series or None, n_out=n_out)
+    fig = px.line(df_ds, x=x, y=y, color=color, line_dash=line_dash,
+                  render_mode="webgl", **px_kwargs)
+    if layout:
+        fig.update_layout(**layout)
+    return fig.to_json()
+
+
+def line_chart(df, x, y, **kwargs):
+    """Cached, downsampled equivalent of ``px.line`` returning a Figure."""
+    # Only hash the columns the chart actually uses
+    used = [x] + (list(y) if isinstance(y, (list, tuple)) else [y])
+    used += [kwargs[k] for k in ("color", "line_dash") if kwargs.get(k) is not None]
+    fig_json = line_figure_json(df[used], x, y, **kwargs)
+    instrument.payload(f"chart: {kwargs.get('title') or y}", len(fig_json.encode()))
+    return pio.from_json(fig_json)
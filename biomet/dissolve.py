@@ -0,0 +1,129 @@
+"""Dissolve land-cover polygons into same-class patches before drawing or measuring.
+
+Two reductions, both cached per source file:
+
+* **patches** - polygons of one class that touch are merged into a single
+  patch (STRtree pair search + sparse connected components + one union per
+  component). Patch area / perimeter / count are measured on these, in
+  EPSG:3857 like the rest of the pages.
+* **class layer** - all patches of a class collected into one MultiPolygon,
+  so a map draws one feature per class instead of one per polygon.
+"""
+import hashlib
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+from biomet.paths import cache_path
+
+METRIC_CRS = "EPSG:3857"
+
+
+def _code_column(gdf):
+    return "label" if "label" in gdf.columns else "LC_Class"
+
+
+def contiguous_groups(geoms, codes):
+    """Component label per polygon; same-class polygons that touch share a label."""
+    tree = shapely.STRtree(geoms)
+    i, j = tree.query(geoms, predicate="intersects")
+    keep = codes[i] == codes[j]
+    n = len(geoms)
+    adj = coo_matrix((np.ones(keep.sum(), dtype=np.int8), (i[keep], j[keep])), shape=(n, n))
+    return connected_components(adj, directed=False)[1]
+
+
+def dissolve_patches(gdf, code_col=None):
+    """Merge contiguous same-class polygons; returns patches in EPSG:4326.
+
+    Columns: ``code``, ``n_polygons``, ``area_ha``, ``perimeter_m`` and
+    ``shape_index`` (perimeter / (2 * sqrt(pi * area)), 1 for a circle).
+    """
+    code_col = code_col or _code_column(gdf)
+    gdf = gdf[gdf[code_col].notna()]
+    gdf = gdf.set_crs(epsg=4326, allow_override=gdf.crs is None).to_crs(METRIC_CRS)
+    geoms = shapely.make_valid(gdf.geometry.values)
+    codes = gdf[code_col].astype(int).to_numpy()
+    labels = contiguous_groups(geoms, codes)
+
+    order = np.argsort(labels, kind="stable")
+    starts = np.flatnonzero(np.r_[True, np.diff(labels[order]) != 0])
+    sizes = np.diff(np.r_[starts, len(order)])
+    parts = np.split(order, starts[1:])
+    # Singletons (most patches) keep their geometry; only real groups are unioned
+    patch_geoms = [geoms[p[0]] if len(p) == 1 else shapely.union_all(geoms[p]) for p in parts]
+
+    patches = gpd.GeoDataFrame({
+        "code": codes[order[starts]], "n_polygons": sizes,
+    }, geometry=patch_geoms, crs=METRIC_CRS)
+    area = patches.geometry.area.to_numpy()
+    perimeter = patches.geometry.length.to_numpy()
+    patches["area_ha"] = area / 10_000
+    patches["perimeter_m"] = perimeter
+    patches["shape_index"] = perimeter / (2 * np.sqrt(np.pi * np.maximum(area, 1e-9)))
+    return patches.to_crs(epsg=4326)
+
+
+def _cached(kind, path):
+    stamp = f"{path}:{path.stat().st_mtime_ns}"
+    return cache_path("patches", f"{kind}_{hashlib.sha1(stamp.encode()).hexdigest()[:16]}.parquet")
+
+
+def load_patches(path):
+    """Patches of one land-cover GeoJSON, through a GeoParquet cache; None if missing or empty."""
+    if not path.exists():
+        return None
+    cached = _cached("patches", path)
+    if cached.exists():
+        return gpd.read_parquet(cached)
+    gdf = gpd.read_file(path)
+    if gdf.empty or _code_column(gdf) not in gdf.columns:
+        return None
+    patches = dissolve_patches(gdf)
+    patches.to_parquet(cached)
+    return patches
+
+
+def class_layer(patches):
+    """One MultiPolygon per class (patches of a class are disjoint, so no union needed)."""
+    parts = shapely.get_parts(patches.geometry.values, return_index=True)
+    codes = patches["code"].to_numpy()[parts[1]]
+    polys = pd.Series(list(parts[0])).groupby(codes).agg(list)
+    out = gpd.GeoDataFrame({"code": polys.index.astype(int)},
+                           geometry=[shapely.multipolygons(p) for p in polys], crs=patches.crs)
+    stats = patch_metrics(patches)
+    return out.join(stats[["patches", "area_ha"]], on="code")
+
+
+def load_class_layer(path, names=None):
+    """Cached per-class layer of one land-cover GeoJSON; None if missing or empty."""
+    if not path.exists():
+        return None
+    cached = _cached("classes", path)
+    if cached.exists():
+        layer = gpd.read_parquet(cached)
+    else:
+        patches = load_patches(path)
+        if patches is None:
+            return None
+        layer = class_layer(patches)
+        layer.to_parquet(cached)
+    if names is not None:
+        layer["name"] = [names.get(c, f"Unknown ({c})") for c in layer["code"]]
+    return layer
+
+
+def patch_metrics(patches):
+    """Per-class patch count, area, perimeter and mean shape index."""
+    g = patches.groupby("code")
+    return pd.DataFrame({
+        "patches": g.size(),
+        "area_ha": g["area_ha"].sum(),
+        "mean_patch_ha": g["area_ha"].mean(),
+        "perimeter_km": g["perimeter_m"].sum() / 1000,
+        "mean_shape_index": g["shape_index"].mean(),
+    })
@@ -0,0 +1,92 @@
+"""On-demand SHAP explanations of the fire-readiness model.
+
+Explanations are computed by a background worker with a tree explainer and
+persisted under ``.biomet_cache/shap/<model version>/<YYYY-MM>.npz``. A month
+is explained for all of its cells at once (one batched explainer call), so any
+later request for that (version, month, cell) is a file read.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import shap
+
+from biomet.anomaly import save_npz
+from biomet.fire_model import align_features, build_features, la_inputs
+from biomet.paths import cache_path
+
+AGGREGATE = "All cells"
+
+
+class ShapService:
+    def __init__(self, bundle, data_dir, max_workers=1):
+        self.bundle = bundle
+        self.version = bundle["version"]
+        self.feature_names = bundle["feature_names"]
+        self.explainer = shap.TreeExplainer(bundle["model"])
+        _, self.cells, self.shared, self.local = la_inputs(data_dir)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="shap")
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _path(self, date):
+        return cache_path("shap", self.version, f"{pd.Timestamp(date):%Y-%m}.npz")
+
+    def _compute(self, date):
+        path = self._path(date)
+        if path.exists():
+            return path
+        X, names = build_features(self.cells, [pd.Timestamp(date)], self.shared, self.local)
+        X = align_features(X, names, self.feature_names)
+        values = self.explainer.shap_values(X).astype(np.float32)
+        base = float(np.ravel(self.explainer.expected_value)[0])
+        save_npz(path, compress=True, values=values, data=X, base=base,
+                 cells=self.cells["cell"].to_numpy().astype(str))
+        return path
+
+    def submit(self, date):
+        """Queue a month for explanation; returns the (shared) future."""
+        key = pd.Timestamp(date)
+        with self._lock:
+            fut = self._pending.get(key)
+            if fut is None:
+                fut = self._executor.submit(self._compute, key)
+                fut.add_done_callback(lambda _f, k=key: self._forget(k))
+                self._pending[key] = fut
+            return fut
+
+    def _forget(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def prefetch(self, dates):
+        """Queue the months of ``dates`` that have inputs and are not explained yet."""
+        for d in dates:
+            # Months outside the data would be explained from NaN features and cached
+            if pd.Timestamp(d) in self.shared.index and not self._path(d).exists():
+                self.submit(d)
+
+    def cached(self, date, cell=AGGREGATE):
+        """Explanation for ``cell`` (or the cell average) if already computed."""
+        path = self._path(date)
+        if not path.exists():
+            return None
+        with np.load(path) as z:
+            values, data, base, cells = z["values"], z["data"], float(z["base"]), list(z["cells"])
+        if cell == AGGREGATE:
+            # SHAP values are additive, so the cell mean explains the mean prediction
+            sv, x = values.mean(axis=0), np.nanmean(data, axis=0)
+        else:
+            i = cells.index(cell)
+            sv, x = values[i], data[i]
+        return shap.Explanation(values=sv, base_values=base, data=x,
+                                feature_names=self.feature_names)
+
+    def explain(self, date, cell=AGGREGATE, timeout=None):
+        """Cached explanation, computing it in the background worker if needed."""
+        expl = self.cached(date, cell)
+        if expl is None:
+            self.submit(date).result(timeout=timeout)
+            expl = self.cached(date, cell)
+        return expl
@@ -0,0 +1,174 @@
+"""Population exposure to fire readiness on the LA grid.
+
+``LA/population_data_{pos}.csv`` gives one head count per 3x3 grid position.
+Each count is spread over the readiness cells of its position
+(``grid.assign_positions``) in proportion to the cell's built-up share, taken
+from the LA land-cover class stack (MODIS ``Urban and built-up`` / ``Urban
+areas``). Positions without any built-up pixels fall back to their land
+share, and without a class stack every cell of a position gets an equal
+share. The shipped ``Land_use_{pos}.csv`` tables carry no areas, so they
+cannot be used for the weighting. The readiness grid stops short of the top
+row of positions; their head counts are kept apart as ``unmapped``.
+
+``ExposureGrid`` then turns a ``Date x cell`` readiness matrix (the layout of
+``Annual_Fire_Readiness.csv`` and of ``fire_model.predict_la``) into:
+
+- population-weighted readiness per month;
+- people above each readiness threshold;
+- the top-risk cells by exposed population.
+
+Each of these is one broadcast over the whole ``months x cells (x
+thresholds)`` array.
+
+    python -m biomet.exposure --top 3
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from biomet.grid import GRID_SIZE_DEG, assign_positions, cells_from_columns, positions
+from biomet.loaders import load_positions
+from biomet.paths import BASE_DIR
+from biomet.rasterize import ensure_class_stack
+
+LA_DIR = BASE_DIR / "LA"
+BUILT_CLASSES = {13, 18}     # Urban and built-up, Urban areas
+WATER_CLASSES = {11, 17}     # Permanent wetlands, Water
+THRESHOLDS = (20, 30, 50)    # readiness (%) for the people-above counts
+
+
+def load_population(folder=LA_DIR, positions=positions):
+    """Latest head count per grid position (``population_data_{pos}.csv``)."""
+    loaded = load_positions(folder, "population_data_{pos}.csv", positions)
+    loaded.raise_for_errors()
+    counts = {}
+    for pos, df in loaded.items():
+        years = df.drop(columns=["Position"], errors="ignore").apply(pd.to_numeric, errors="coerce")
+        latest = years.ffill(axis=1).iloc[:, -1] if not years.empty else pd.Series(dtype=float)
+        counts[pos] = float(latest.sum())
+    return pd.Series(counts, name="Population")
+
+
+def cell_shares(cells, stack=None, year=None):
+    """Built-up and land (non-water) share of each readiness cell; NaN without a stack."""
+    out = pd.DataFrame({"built": np.nan, "land": np.nan}, index=cells.index)
+    if stack is None:
+        return out
+    year = stack.years[-1] if year is None else year
+    half = GRID_SIZE_DEG / 2
+    boxes = zip(cells["lon"] - half, cells["lat"] - half, cells["lon"] + half, cells["lat"] + half)
+    frac = stack.cell_fractions(year, stack.zones_for_boxes(list(boxes)), len(cells))
+    frac.index = cells.index
+    out["built"] = frac[[c for c in frac.columns if c in BUILT_CLASSES]].sum(axis=1)
+    out["land"] = 1 - frac[[c for c in frac.columns if c in WATER_CLASSES]].sum(axis=1)
+    # Cells outside the stack have no classified pixels
+    out.loc[frac.sum(axis=1) == 0, ["built", "land"]] = np.nan
+    return out
+
+
+def cell_population(cells, population, shares):
+    """Head count per cell: each position's count split by built-up share.
+
+    Falls back to the land share, then to an equal split, for positions whose
+    cells have no built-up (or no land) pixels or lie outside the stack.
+    """
+    pos = cells["position"].to_numpy()
+    weights = np.zeros(len(cells))
+    for column in ("built", "land", None):
+        w = np.ones(len(cells)) if column is None else shares[column].fillna(0).to_numpy()
+        total = pd.Series(w).groupby(pos).transform("sum").to_numpy()
+        todo = (pd.Series(weights).groupby(pos).transform("sum").to_numpy() == 0) & (total > 0)
+        weights[todo] = w[todo] / total[todo]
+    return weights * population.reindex(pos).fillna(0).to_numpy()
+
+
+class ExposureGrid:
+    """Readiness cells with their head counts; ``cells`` has cell/lat/lon/position/population."""
+
+    def __init__(self, cells, unmapped=None):
+        self.cells = cells.reset_index(drop=True)
+        self.population = self.cells["population"].to_numpy(dtype=float)
+        # Head count of positions without any readiness cell
+        self.unmapped = unmapped if unmapped is not None else pd.Series(dtype=float, name="Population")
+
+    @classmethod
+    def from_site(cls, matrix, folder=LA_DIR, stack=None):
+        """Exposure grid for the cells of a readiness ``matrix`` (default stack: the LA one)."""
+        cells = cells_from_columns(matrix.columns)
+        cells["position"] = assign_positions(cells["lat"], cells["lon"])
+        stack = ensure_class_stack("LA") if stack is None else stack
+        shares = cell_shares(cells, stack)
+        population = load_population(folder)
+        cells["built"] = shares["built"].to_numpy()
+        cells["population"] = cell_population(cells, population, shares)
+        return cls(cells, population[~population.index.isin(cells["position"])])
+
+    def _values(self, matrix):
+        """``(dates, months x cells readiness)`` aligned to ``self.cells``."""
+        values = matrix[self.cells["cell"]].to_numpy(dtype=float)
+        return pd.DatetimeIndex(matrix["Date"]), values
+
+    def summary(self, matrix, thresholds=THRESHOLDS):
+        """Per month: population-weighted readiness and people at or above each threshold."""
+        dates, r = self._values(matrix)
+        pop = self.population
+        ok = ~np.isnan(r)
+        weighted = np.where(ok, r, 0) @ pop / np.maximum(ok @ pop, 1)
+        thr = np.asarray(thresholds, dtype=float)
+        above = np.einsum("tck,c->tk", (np.where(ok, r, -np.inf)[:, :, None] >= thr), pop)
+        out = pd.DataFrame(above, index=dates, columns=[f"People ≥ {t:g}%" for t in thr])
+        out.insert(0, "Population-weighted readiness (%)", weighted)
+        out.index.name = "Date"
+        return out
+
+    def people_months(self, matrix, thresholds=THRESHOLDS):
+        """Total people-months at or above each threshold over the matrix's months."""
+        return self.summary(matrix, thresholds).iloc[:, 1:].sum().rename("People-months")
+
+    def cell_exposure(self, matrix):
+        """``Date x cell`` readiness-weighted head count (people x readiness / 100)."""
+        dates, r = self._values(matrix)
+        out = pd.DataFrame(r * self.population / 100, index=dates, columns=self.cells["cell"].to_numpy())
+        out.index.name = "Date"
+        return out
+
+    def top_cells(self, matrix, k=5):
+        """The ``k`` cells with the largest readiness-weighted head count, per month."""
+        exposure = self.cell_exposure(matrix)
+        e = np.nan_to_num(exposure.to_numpy(), nan=-np.inf)
+        k = min(k, e.shape[1])
+        top = np.argpartition(-e, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(top, np.argsort(-np.take_along_axis(e, top, axis=1), axis=1), axis=1)
+        _, r = self._values(matrix)
+        rows = np.repeat(np.arange(len(e)), k)
+        idx = top.ravel()
+        return pd.DataFrame({
+            "Date": exposure.index[rows], "Rank": np.tile(np.arange(1, k + 1), len(e)),
+            "Cell": self.cells["cell"].to_numpy()[idx], "Position": self.cells["position"].to_numpy()[idx],
+            "Population": self.population[idx].round(), "Readiness (%)": r[rows, idx],
+            "Exposed population": e[rows, idx],
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Population exposure to LA fire readiness")
+    parser.add_argument("--top", type=int, default=5, help="top-risk cells per month")
+    parser.add_argument("--out", help="CSV for the monthly summary (default: print)")
+    args = parser.parse_args()
+    matrix = pd.read_csv(LA_DIR / "Annual_Fire_Readiness.csv", parse_dates=["Date"])
+    grid = ExposureGrid.from_site(matrix)
+    summary = grid.summary(matrix)
+    if args.out:
+        summary.to_csv(args.out)
+        print(f"{len(summary)} months written to {args.out}")
+    else:
+        print(summary.round(1).tail(12).to_string())
+    print(grid.people_months(matrix).round().to_string())
+    if grid.unmapped.sum():
+        print(f"Outside the readiness grid: {', '.join(grid.unmapped.index)} ({grid.unmapped.sum():,.0f} people)")
+    print(grid.top_cells(matrix, args.top).tail(args.top).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
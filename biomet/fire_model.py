@@ -0,0 +1,227 @@
+"""CPU fire-readiness model: vectorised feature matrix, training and batch inference.
+
+Rows of the feature matrix are every (month, cell) pair, date-major, so a
+``Date x cell`` readiness matrix (the layout of ``Annual_Fire_Readiness.csv``
+that the map consumes) is just ``predictions.reshape(n_dates, n_cells)``.
+
+    python -m biomet.fire_model train
+    python -m biomet.fire_model predict --site LA  --out LA_model_readiness.csv
+    python -m biomet.fire_model predict --site MOH --out MOH_model_readiness.csv
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import HistGradientBoostingRegressor
+
+from biomet.grid import assign_positions, cells_from_columns, positions, site_cells
+from biomet.loaders import load_positions
+from biomet.paths import BASE_DIR, cache_path
+from biomet.sparse_features import load_family_table
+
+TARGET = "Fire Readiness (%)"
+# Outputs and bookkeeping columns of the monthly tables, never model inputs
+NON_FEATURES = {"Month", "Date", TARGET, "Fire Area (m2)"}
+LOCAL_PREFIX = "local_"
+MODEL_PARAMS = {"max_iter": 300, "learning_rate": 0.05, "max_leaf_nodes": 31,
+                "l2_regularization": 1.0, "random_state": 0}
+
+# MOH site (same constants as the Motor Oil Hellas page)
+MOH_SITE = {"lat": 37.75, "lon": 22.41036, "radius_m": 5500}
+
+
+def _month_index(values):
+    return pd.DatetimeIndex(pd.to_datetime(values)).to_period("M").to_timestamp()
+
+
+# --- Input tables ---
+def _model_inputs(table):
+    df = table.to_frame()
+    return df.drop(columns=[c for c in df.columns if c in NON_FEATURES]).astype(np.float32)
+
+
+def load_shared_features(path):
+    """Monthly site-wide features (e.g. ``LA_Fire_Readiness.csv``) indexed by month."""
+    return _model_inputs(load_family_table(path))
+
+
+def load_la_local(data_dir):
+    """Monthly per-position aggregates of the daily ``environmental_data_{pos}.csv``."""
+    frames = []
+    loaded = load_positions(data_dir, "environmental_data_{pos}.csv", positions, parse_dates=["date"])
+    loaded.raise_for_errors()
+    for pos, df in loaded.items():
+        monthly = df.groupby(_month_index(df["date"])).agg({
+            "precipitation_mean": "mean", "temperature_mean": "mean",
+            "avg_moisture": "mean", "drought": "mean", "fire_area_m2": "sum",
+        })
+        monthly.columns = [LOCAL_PREFIX + c for c in monthly.columns]
+        monthly["position"] = pos
+        frames.append(monthly)
+    if not frames:
+        return None
+    local = pd.concat(frames)
+    local.index.name = "Date"
+    return local.set_index("position", append=True).astype(np.float32)
+
+
+def load_moh_local(data_dir):
+    """Per-position monthly wide tables of a site (``MOH/{pos}.csv``)."""
+    table = load_family_table({pos: data_dir / f"{pos}.csv" for pos in positions})
+    local = _model_inputs(table)
+    local["position"] = table.keys
+    return local.set_index("position", append=True)
+
+
+# --- Feature matrix ---
+def build_features(cells, dates, shared=None, local=None):
+    """Feature matrix for all ``dates x cells`` in one vectorised pass.
+
+    ``shared`` is indexed by month and broadcast to every cell; ``local`` is
+    indexed by (month, position) and gathered through ``cells["position"]``.
+    Returns ``(X, feature_names)`` with ``X`` float32 and date-major rows.
+    """
+    dates = pd.DatetimeIndex(dates)
+    n_d, n_c = len(dates), len(cells)
+    month = dates.month.to_numpy()
+    blocks = [
+        np.repeat(np.column_stack([np.sin(2*np.pi*month/12), np.cos(2*np.pi*month/12)]), n_c, axis=0),
+        np.tile(cells[["lat", "lon"]].to_numpy(), (n_d, 1)),
+    ]
+    names = ["month_sin", "month_cos", "lat", "lon"]
+    if shared is not None:
+        blocks.append(np.repeat(shared.reindex(dates).to_numpy(np.float32), n_c, axis=0))
+        names += list(shared.columns)
+    if local is not None:
+        keys = pd.MultiIndex.from_arrays([
+            np.repeat(dates, n_c), np.tile(cells["position"].to_numpy(), n_d)
+        ])
+        local_cols = [c for c in local.columns if c not in names]
+        blocks.append(local[local_cols].reindex(keys).to_numpy(np.float32))
+        names += local_cols
+    return np.hstack(blocks).astype(np.float32), names
+
+
+def align_features(X, names, feature_names):
+    """Reorder columns to ``feature_names``; features absent from ``X`` become NaN."""
+    out = np.full((X.shape[0], len(feature_names)), np.nan, dtype=np.float32)
+    where = {n: i for i, n in enumerate(names)}
+    src = np.array([where.get(n, -1) for n in feature_names])
+    ok = src >= 0
+    out[:, ok] = X[:, src[ok]]
+    return out
+
+
+# --- Training & inference ---
+def model_version(X, y, params):
+    h = hashlib.sha1()
+    h.update(X.tobytes()); h.update(y.tobytes()); h.update(repr(sorted(params.items())).encode())
+    return h.hexdigest()[:12]
+
+
+def la_inputs(data_dir):
+    """Cells, months and feature tables of the LA readiness grid."""
+    matrix = pd.read_csv(data_dir / "Annual_Fire_Readiness.csv", parse_dates=["Date"])
+    cells = cells_from_columns(matrix.columns)
+    cells["position"] = assign_positions(cells["lat"], cells["lon"])
+    shared = load_shared_features(data_dir / "LA_Fire_Readiness.csv")
+    return matrix, cells, shared, load_la_local(data_dir)
+
+
+def la_input_files(data_dir):
+    """The LA tables the model is trained on."""
+    return ([data_dir / "Annual_Fire_Readiness.csv", data_dir / "LA_Fire_Readiness.csv"]
+            + [data_dir / f"environmental_data_{pos}.csv" for pos in positions])
+
+
+def _model_path(data_dir, params):
+    """Model file keyed on the size and mtime of the training tables and the parameters."""
+    h = hashlib.sha1(repr(sorted(params.items())).encode())
+    for p in la_input_files(data_dir):
+        if p.exists():
+            h.update(f"{p.name}:{p.stat().st_size}:{p.stat().st_mtime_ns}|".encode())
+    return cache_path("models", f"la_fire_readiness-{h.hexdigest()[:12]}.joblib")
+
+
+def train_la(data_dir=BASE_DIR / "LA", params=None):
+    """Fit the readiness model on every (month, cell) of ``Annual_Fire_Readiness.csv``."""
+    params = {**MODEL_PARAMS, **(params or {})}
+    path = _model_path(data_dir, params)
+    matrix, cells, shared, local = la_inputs(data_dir)
+    X, names = build_features(cells, matrix["Date"], shared, local)
+    y = matrix[cells["cell"]].to_numpy(np.float32).ravel()
+    model = HistGradientBoostingRegressor(**params).fit(X, y)
+    bundle = {"model": model, "feature_names": names,
+              "version": model_version(X, y, params), "params": params}
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.stem + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            joblib.dump(bundle, fh)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    # Models of earlier inputs are never loaded again
+    for old in path.parent.glob("la_fire_readiness*.joblib"):
+        if old != path:
+            old.unlink(missing_ok=True)
+    return bundle
+
+
+def load_or_train_la(data_dir=BASE_DIR / "LA"):
+    """Stored model for the current LA inputs, retrained when any training table changed."""
+    path = _model_path(data_dir, MODEL_PARAMS)
+    if path.exists():
+        return joblib.load(path)
+    return train_la(data_dir)
+
+
+def predict_matrix(bundle, cells, dates, shared=None, local=None):
+    """Readiness for every (month, cell) as a ``Date`` + cell-column frame."""
+    dates = pd.DatetimeIndex(dates)
+    X, names = build_features(cells, dates, shared, local)
+    X = align_features(X, names, bundle["feature_names"])
+    pred = np.clip(bundle["model"].predict(X), 0, 100).reshape(len(dates), len(cells))
+    out = pd.DataFrame(pred, columns=cells["cell"].to_numpy())
+    out.insert(0, "Date", dates)
+    return out
+
+
+def predict_la(bundle, data_dir=BASE_DIR / "LA", shared=None):
+    """LA grid readiness for every month of ``shared`` (new months included)."""
+    _, cells, la_shared, local = la_inputs(data_dir)
+    shared = la_shared if shared is None else shared
+    return predict_matrix(bundle, cells, shared.index, shared, local)
+
+
+def predict_moh(bundle, data_dir=BASE_DIR / "MOH", site=MOH_SITE):
+    """Readiness for a new site whose inputs are per-position monthly tables."""
+    local = load_moh_local(data_dir)
+    cells = site_cells(site["lat"], site["lon"], site["radius_m"])
+    dates = local.index.get_level_values("Date").unique().sort_values()
+    return predict_matrix(bundle, cells, dates, local=local)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train / run the fire-readiness model")
+    parser.add_argument("command", choices=["train", "predict"])
+    parser.add_argument("--site", choices=["LA", "MOH"], default="LA")
+    parser.add_argument("--out", default=None, help="CSV path for predictions")
+    args = parser.parse_args()
+    if args.command == "train":
+        bundle = train_la()
+        print(f"Trained model {bundle['version']} on {len(bundle['feature_names'])} features")
+        return
+    bundle = load_or_train_la()
+    df = predict_la(bundle) if args.site == "LA" else predict_moh(bundle)
+    out = args.out or BASE_DIR / args.site / f"{args.site}_model_readiness.csv"
+    df.to_csv(out, index=False)
+    print(f"Wrote {df.shape[0]} months x {df.shape[1] - 1} cells to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Batched seasonal forecasts of monthly fire readiness for every grid cell.
+
+Each cell's series is fitted by least squares with a harmonic regression:
+
+    readiness = b0 + b1 * t + sum_k (a_k sin(2 pi k m / 12) + c_k cos(2 pi k m / 12))
+
+Here ``t`` is the months since the first month (in decades) and ``m`` is
+the calendar month, with ``k = 1..HARMONICS``. The model only needs the
+sufficient statistics of each cell: ``X'X`` (cells x p x p), ``X'y``,
+``y'y`` and the count. A new month therefore adds one outer product per
+cell (``HarmonicModel.update``), and a refit is a batched ``p x p`` solve
+over all cells.
+
+Forecasts for 1..``HORIZON`` months ahead come with ``level`` prediction
+intervals from the residual variance and the leverage of the future design
+rows. Everything is clipped to the 0-100 % range. The model leaves out
+autocorrelation between months, so the intervals are on the narrow side.
+
+``sync`` stores the statistics of a readiness file under
+``.biomet_cache/forecast`` and folds in only the months appended since the
+last call, the same way as ``anomaly.sync``.
+
+    python -m biomet.forecast LA --horizon 6
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.stats import t as student_t
+
+from biomet.anomaly import SOURCES, cell_columns, rows_hash_of, save_npz
+from biomet.paths import cache_path
+
+HARMONICS = 2      # annual + semi-annual cycle
+HORIZON = 6        # months ahead
+LEVEL = 0.9        # prediction-interval coverage
+
+
+class HarmonicModel:
+    """Per-cell sufficient statistics of the trend + harmonics regression."""
+
+    def __init__(self, cells, origin, xtx, xty, yty, n, last, harmonics=HARMONICS):
+        self.cells = list(cells)
+        self.origin = pd.Timestamp(origin)
+        self.xtx, self.xty, self.yty, self.n = xtx, xty, yty, n
+        self.last = pd.Timestamp(last)
+        self.harmonics = harmonics
+
+    @property
+    def n_params(self):
+        return 2 + 2 * self.harmonics
+
+    def design(self, dates):
+        """``months x p`` design rows: intercept, trend (decades), harmonics."""
+        dates = pd.DatetimeIndex(dates)
+        t = ((dates.year - self.origin.year) * 12 + dates.month - self.origin.month).to_numpy() / 120
+        angle = 2 * np.pi * (dates.month.to_numpy() - 1) / 12
+        cols = [np.ones(len(dates)), t]
+        for k in range(1, self.harmonics + 1):
+            cols += [np.sin(k * angle), np.cos(k * angle)]
+        return np.column_stack(cols)
+
+    @classmethod
+    def fit(cls, matrix, harmonics=HARMONICS):
+        """Statistics of every month of a ``Date x cell`` matrix (missing values skipped per cell)."""
+        cells = cell_columns(matrix)
+        dates = pd.DatetimeIndex(matrix["Date"])
+        p = 2 + 2 * harmonics
+        model = cls(cells, dates[0], np.zeros((len(cells), p, p)), np.zeros((len(cells), p)),
+                    np.zeros(len(cells)), np.zeros(len(cells)), dates[-1], harmonics)
+        X = model.design(dates)
+        y = matrix[cells].to_numpy(np.float64)
+        ok = ~np.isnan(y)
+        y0 = np.where(ok, y, 0)
+        model.xtx = np.einsum("tc,tp,tq->cpq", ok.astype(float), X, X)
+        model.xty = y0.T @ X
+        model.yty = (y0 ** 2).sum(axis=0)
+        model.n = ok.sum(axis=0).astype(float)
+        return model
+
+    def update(self, date, values):
+        """Add one month (``values`` in ``cells`` order) to the statistics, O(cells x p^2)."""
+        date = pd.Timestamp(date)
+        if date <= self.last:
+            raise ValueError(f"{date.date()} is not after the last month ({self.last.date()})")
+        x = self.design([date])[0]
+        y = np.asarray(values, dtype=np.float64)
+        ok = ~np.isnan(y)
+        self.xtx[ok] += np.outer(x, x)
+        self.xty[ok] += y[ok, None] * x
+        self.yty[ok] += y[ok] ** 2
+        self.n[ok] += 1
+        self.last = date
+
+    def coefficients(self):
+        """``cells x p`` least-squares coefficients (one batched solve)."""
+        ridge = 1e-9 * np.eye(self.n_params)
+        return np.linalg.solve(self.xtx + ridge, self.xty[..., None])[..., 0]
+
+    def forecast(self, horizon=HORIZON, level=LEVEL):
+        """Long table: Date, Cell, Horizon, Forecast, Lower, Upper for 1..``horizon`` months ahead."""
+        dates = pd.date_range(self.last + pd.DateOffset(months=1), periods=horizon, freq="MS")
+        X0 = self.design(dates)
+        b = self.coefficients()
+        point = b @ X0.T                                               # cells x horizon
+        rss = self.yty - 2 * (b * self.xty).sum(1) + np.einsum("cp,cpq,cq->c", b, self.xtx, b)
+        dof = np.maximum(self.n - self.n_params, 1)
+        sigma2 = np.maximum(rss, 0) / dof
+        inv = np.linalg.inv(self.xtx + 1e-9 * np.eye(self.n_params))
+        leverage = np.einsum("hp,cpq,hq->ch", X0, inv, X0)
+        half = student_t.ppf((1 + level) / 2, dof)[:, None] * np.sqrt(sigma2[:, None] * (1 + leverage))
+        valid = (self.n > self.n_params)[:, None]
+        c, h = np.meshgrid(np.arange(len(self.cells)), np.arange(horizon), indexing="ij")
+        clip = lambda a: np.where(valid, np.clip(a, 0, 100), np.nan).ravel()
+        return pd.DataFrame({
+            "Date": dates[h.ravel()], "Cell": np.asarray(self.cells, dtype=object)[c.ravel()],
+            "Horizon": h.ravel() + 1, "Forecast": clip(point), "Lower": clip(point - half),
+            "Upper": clip(point + half),
+        })
+
+    # --- Storage ---
+    def save(self, path, rows_hash):
+        save_npz(path, cells=np.asarray(self.cells), origin=np.datetime64(self.origin, "ns"),
+                 xtx=self.xtx, xty=self.xty, yty=self.yty, n=self.n, last=np.datetime64(self.last, "ns"),
+                 harmonics=self.harmonics, rows_hash=rows_hash)
+
+    @classmethod
+    def load(cls, path):
+        """``(model, rows_hash)`` from a saved state file."""
+        with np.load(path) as f:
+            model = cls(f["cells"].tolist(), f["origin"][()], f["xtx"], f["xty"], f["yty"], f["n"],
+                        f["last"][()], int(f["harmonics"]))
+            return model, str(f["rows_hash"])
+
+
+def sync(name, matrix=None, harmonics=HARMONICS):
+    """Model of a readiness source, updated with the months added since the last call.
+
+    ``name`` is a key of ``SOURCES`` (or any name when ``matrix`` is given).
+    Returns ``(model, months added)``; a full refit reports every month.
+    """
+    if matrix is None:
+        matrix = pd.read_csv(SOURCES[name], parse_dates=["Date"])
+    matrix = matrix.sort_values("Date", ignore_index=True)
+    path = cache_path("forecast", f"{name}.npz")
+    cells = cell_columns(matrix)
+    if path.exists():
+        model, rows_hash = HarmonicModel.load(path)
+        old = matrix[matrix["Date"] <= model.last]
+        if model.cells == cells and model.harmonics == harmonics and rows_hash_of(old, cells) == rows_hash:
+            new = matrix[matrix["Date"] > model.last]
+            for date, values in zip(new["Date"], new[cells].to_numpy(np.float64)):
+                model.update(date, values)
+            if len(new):
+                model.save(path, rows_hash_of(matrix, cells))
+            return model, len(new)
+    model = HarmonicModel.fit(matrix, harmonics)
+    model.save(path, rows_hash_of(matrix, cells))
+    return model, len(matrix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seasonal fire-readiness forecasts for every grid cell")
+    parser.add_argument("source", choices=list(SOURCES))
+    parser.add_argument("--horizon", type=int, default=HORIZON, help="months ahead")
+    parser.add_argument("--level", type=float, default=LEVEL, help="prediction-interval coverage")
+    parser.add_argument("--out", help="CSV for the forecasts (default: print a summary)")
+    args = parser.parse_args()
+    model, added = sync(args.source)
+    t0 = time.perf_counter()
+    fc = model.forecast(args.horizon, args.level)
+    elapsed = time.perf_counter() - t0
+    print(f"{added} month(s) added; {len(model.cells)} cells forecast {args.horizon} months ahead "
+          f"in {elapsed * 1000:.1f} ms")
+    if args.out:
+        fc.to_csv(args.out, index=False)
+        print(f"{len(fc)} rows written to {args.out}")
+    else:
+        print(fc.groupby("Date")[["Forecast", "Lower", "Upper"]].mean().round(2).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Ecosystem fragmentation, intactness and corridor tables from land-cover patches.
+
+Replaces the offline ``high_integrity.csv`` / ``rapid_decline.csv`` /
+``corridors_2018.csv`` exports: every table is derived from the dissolved
+patches of the ``export_land_cover_polygons_*`` files for any pair of years.
+
+FFI (fragmentation index) of a patch is its compactness, ``1 / shape_index``:
+1 for a disc, towards 0 for a ragged or sliver patch, and 0 when the ecosystem
+has disappeared. ``FFI_Drop = FFI_<y2> - FFI_<y1>``, so a negative drop means
+the ecosystem fragmented.
+
+    python -m biomet.fragmentation Stanlow 2001 2018 --lat 53.2822 --lon -2.8623
+"""
+import argparse
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import shapely
+from scipy.spatial import cKDTree
+
+from biomet.dissolve import METRIC_CRS, load_patches
+from biomet.paths import cache_path
+from biomet.rasterize import SITES, site_years
+
+# CORINE natural / semi-natural classes (same set as the site pages)
+ECOSYSTEM_CLASSES = {141, 243, 244, 311, 312, 313, 321, 322, 323, 324, 331, 332, 333, 334, 335,
+                     411, 412, 421, 422, 423}
+RAPID_DECLINE_DROP = -0.15       # FFI_Drop at or below this is a rapid decline
+HIGH_INTEGRITY_FFI = 0.5         # compact patches that did not rapidly decline
+CORRIDOR_GAP_M     = 500         # separate patches closer than this can be linked
+EARTH_RADIUS_KM    = 6371.0088
+
+
+def ffi(shape_index):
+    """FFI of patches from their shape index: ``1 / shape_index`` (1 = disc, towards 0 = ragged)."""
+    return 1 / np.asarray(shape_index, dtype=float)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def source_path(site, year):
+    cfg = SITES[site]
+    return cfg["folder"] / cfg["pattern"].format(year=year)
+
+
+def available_years(site):
+    """Years of ``site`` whose land-cover export has at least one patch."""
+    return [y for y in site_years(site)
+            if (p := load_patches(source_path(site, y))) is not None and len(p)]
+
+
+def ecosystem_patches(site, year, center, eco_codes=ECOSYSTEM_CLASSES):
+    """Ecosystem patches of one year with FFI, centroid and distance to ``center`` (lat, lon)."""
+    patches = load_patches(source_path(site, year))
+    if patches is None:
+        return None
+    patches = patches[patches["code"].isin(eco_codes)].reset_index(drop=True)
+    cent = patches.geometry.to_crs(METRIC_CRS).centroid
+    ll = cent.to_crs(epsg=4326)
+    return pd.DataFrame({
+        "patch": patches.index.to_numpy(), "code": patches["code"].to_numpy(),
+        "area_ha": patches["area_ha"].to_numpy(), "FFI": ffi(patches["shape_index"]),
+        "lat": ll.y.to_numpy(), "lon": ll.x.to_numpy(), "x": cent.x.to_numpy(), "y": cent.y.to_numpy(),
+        "distance_km": haversine_km(ll.y.to_numpy(), ll.x.to_numpy(), *center),
+    })
+
+
+def _match_ecosystem(a, b):
+    """Each ``a`` patch matched to the nearest ``b`` patch of the same ecosystem."""
+    out = pd.DataFrame({"code": a["code"].to_numpy(), "patch_1": a["patch"].to_numpy(),
+                        "FFI_1": a["FFI"].to_numpy(), "lat_1": a["lat"].to_numpy(),
+                        "lon_1": a["lon"].to_numpy(), "distance_1": a["distance_km"].to_numpy()})
+    if len(b) == 0:
+        # Ecosystem gone: zero intactness, no centroid to drift to
+        out["patch_2"], out["FFI_2"] = -1, 0.0
+        out[["lat_2", "lon_2", "distance_2"]] = np.nan
+        return out
+    _, idx = cKDTree(b[["x", "y"]].to_numpy()).query(a[["x", "y"]].to_numpy())
+    m = b.iloc[idx]
+    out["patch_2"], out["FFI_2"] = m["patch"].to_numpy(), m["FFI"].to_numpy()
+    out["lat_2"], out["lon_2"], out["distance_2"] = m["lat"].to_numpy(), m["lon"].to_numpy(), m["distance_km"].to_numpy()
+    return out
+
+
+def _cache_file(kind, site, *args):
+    stamp = "|".join(f"{p}:{p.stat().st_mtime_ns}" for y in site_years(site)
+                     if (p := source_path(site, y)).exists())
+    key = hashlib.sha1(f"{stamp}|{args!r}".encode()).hexdigest()[:16]
+    return cache_path("fragmentation", f"{site}_{kind}_{key}.parquet")
+
+
+def compare_years(site, y1, y2, center, eco_codes=ECOSYSTEM_CLASSES, max_workers=4):
+    """Per-patch FFI, centroid drift and distance change between two years (cached)."""
+    eco_codes = sorted(eco_codes)
+    cached = _cache_file("compare", site, y1, y2, tuple(center), eco_codes)
+    if cached.exists():
+        return pd.read_parquet(cached)
+    a, b = ecosystem_patches(site, y1, center, eco_codes), ecosystem_patches(site, y2, center, eco_codes)
+    codes = sorted(set(a["code"]))
+    # Ecosystems are independent; cKDTree queries release the GIL
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        frames = list(ex.map(lambda c: _match_ecosystem(a[a["code"] == c], b[b["code"] == c]), codes))
+    cmp = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if len(cmp):
+        cmp["drift_km"] = haversine_km(cmp["lat_1"], cmp["lon_1"], cmp["lat_2"], cmp["lon_2"])
+        cmp["FFI_Drop"] = cmp["FFI_2"] - cmp["FFI_1"]
+    cmp.to_parquet(cached)
+    return cmp
+
+
+def ecosystem_summary(cmp, names=None):
+    """Per-ecosystem patch count, mean FFI in both years, mean drift and FFI drop."""
+    g = cmp.groupby("code")
+    out = pd.DataFrame({"Patches": g.size(), "FFI_1": g["FFI_1"].mean(), "FFI_2": g["FFI_2"].mean(),
+                        "Mean drift (km)": g["drift_km"].mean(), "FFI_Drop": g["FFI_Drop"].mean()})
+    out.insert(0, "Ecosystem", [(names or {}).get(c, str(c)) for c in out.index])
+    return out.reset_index(drop=True)
+
+
+def high_integrity(cmp):
+    keep = (cmp["FFI_2"] >= HIGH_INTEGRITY_FFI) & (cmp["FFI_Drop"] > RAPID_DECLINE_DROP)
+    return cmp[keep].sort_values("FFI_2", ascending=False)
+
+
+def rapid_decline(cmp):
+    return cmp[cmp["FFI_Drop"] <= RAPID_DECLINE_DROP].sort_values("FFI_Drop")
+
+
+def corridors(site, year, center, eco_codes=ECOSYSTEM_CLASSES, max_gap_m=CORRIDOR_GAP_M):
+    """Pairs of separate ecosystem patches within ``max_gap_m`` of each other (cached)."""
+    eco_codes = sorted(eco_codes)
+    cached = _cache_file("corridors", site, year, tuple(center), eco_codes, max_gap_m)
+    if cached.exists():
+        return pd.read_parquet(cached)
+    patches = load_patches(source_path(site, year))
+    patches = patches[patches["code"].isin(eco_codes)].reset_index(drop=True)
+    info = ecosystem_patches(site, year, center, eco_codes)
+    geoms = patches.geometry.to_crs(METRIC_CRS).values
+    i, j = shapely.STRtree(geoms).query(geoms, predicate="dwithin", distance=max_gap_m)
+    i, j = i[i < j], j[i < j]
+    gap = shapely.distance(geoms[i], geoms[j])
+    i, j, gap = i[gap > 0], j[gap > 0], gap[gap > 0]
+    a, b = info.iloc[i], info.iloc[j]
+    out = pd.DataFrame({
+        "patch_A": i, "code_A": a["code"].to_numpy(), "lat_A": a["lat"].to_numpy(), "lon_A": a["lon"].to_numpy(),
+        "patch_B": j, "code_B": b["code"].to_numpy(), "lat_B": b["lat"].to_numpy(), "lon_B": b["lon"].to_numpy(),
+        "gap_km": gap / 1000,
+        "distance_km": haversine_km(a["lat"].to_numpy(), a["lon"].to_numpy(), b["lat"].to_numpy(), b["lon"].to_numpy()),
+    }).sort_values("gap_km", ignore_index=True)
+    out.to_parquet(cached)
+    return out
+
+
+def display_table(df, y1, y2, names=None):
+    """Rename engine columns to the ``<name>_<year>`` layout of the former CSV exports."""
+    name = lambda c: (names or {}).get(c, str(c))
+    if "patch_1" in df.columns:
+        out = pd.DataFrame({
+            "Ecosystem": df["code"].map(name),
+            f"FFI_{y1}": df["FFI_1"], f"Lat_{y1}": df["lat_1"], f"Lon_{y1}": df["lon_1"],
+            f"Distance_{y1} (km)": df["distance_1"],
+            f"FFI_{y2}": df["FFI_2"], f"Lat_{y2}": df["lat_2"], f"Lon_{y2}": df["lon_2"],
+            f"Distance_{y2} (km)": df["distance_2"],
+            "Centroid drift (km)": df["drift_km"], "FFI_Drop": df["FFI_Drop"],
+        })
+    else:
+        out = df.assign(code_A=df["code_A"].map(name), code_B=df["code_B"].map(name)).rename(columns={
+            "patch_A": "Polygon_A", "code_A": "Ecosystem_A", "patch_B": "Polygon_B", "code_B": "Ecosystem_B",
+            "gap_km": "Gap_km", "distance_km": "Distance_km"})
+    return out.reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fragmentation / corridor tables for a site")
+    parser.add_argument("site", choices=list(SITES))
+    parser.add_argument("y1", type=int)
+    parser.add_argument("y2", type=int)
+    parser.add_argument("--lat", type=float, required=True)
+    parser.add_argument("--lon", type=float, required=True)
+    args = parser.parse_args()
+    center = (args.lat, args.lon)
+    cmp = compare_years(args.site, args.y1, args.y2, center)
+    print(ecosystem_summary(cmp).round(3).to_string())
+    print(f"high integrity: {len(high_integrity(cmp))}, rapid decline: {len(rapid_decline(cmp))}, "
+          f"corridors {args.y2}: {len(corridors(args.site, args.y2, center))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Study-area grids shared by the site pages and the analytics engines."""
+import math
+
+import numpy as np
+import pandas as pd
+
+positions = [
+    "top_left", "top_center", "top_right",
+    "left_center", "center", "right_center",
+    "bottom_left", "bottom_center", "bottom_right"
+]
+
+# LA fire readiness grid (same constants as the Fire Hazard page)
+LA_BOUNDS     = {"min_lon": -118.7, "max_lon": -118.0,
+                 "min_lat":  34.0,  "max_lat":  34.5}
+GRID_SIZE_DEG = 0.045
+
+
+def create_nine_centers(lat, lon, radius):
+    earth_radius = 6378137
+    delta_lat = (radius*math.sqrt(2))/earth_radius*(180/math.pi)
+    delta_lon = delta_lat/math.cos(math.radians(lat))
+    return [
+        (lat+2*delta_lat, lon-2*delta_lon), (lat+2*delta_lat, lon), (lat+2*delta_lat, lon+2*delta_lon),
+        (lat, lon-2*delta_lon), (lat, lon), (lat, lon+2*delta_lon),
+        (lat-2*delta_lat, lon-2*delta_lon),(lat-2*delta_lat, lon),(lat-2*delta_lat, lon+2*delta_lon)
+    ]
+
+
+def cells_from_columns(columns):
+    """Parse ``"lat_lon"`` matrix column names into a cell table."""
+    cols = [c for c in columns if c != "Date"]
+    latlon = pd.Series(cols).str.split("_", expand=True).astype(float)
+    return pd.DataFrame({"cell": cols, "lat": latlon[0].values, "lon": latlon[1].values})
+
+
+def assign_positions(lat, lon, bounds=LA_BOUNDS):
+    """Vectorised 3x3 partition of ``bounds`` into the named grid positions."""
+    lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+    col = np.clip(((lon - bounds["min_lon"]) / (bounds["max_lon"] - bounds["min_lon"]) * 3).astype(int), 0, 2)
+    row = np.clip(((bounds["max_lat"] - lat) / (bounds["max_lat"] - bounds["min_lat"]) * 3).astype(int), 0, 2)
+    return np.asarray(positions)[row * 3 + col]
+
+
+def site_cells(lat, lon, radius_m):
+    """Cell table for the nine square regions of a site page."""
+    centers = create_nine_centers(lat, lon, radius_m)
+    return pd.DataFrame({
+        "cell":     positions,
+        "lat":      [c[0] for c in centers],
+        "lon":      [c[1] for c in centers],
+        "position": positions,
+    })
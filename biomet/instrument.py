@@ -0,0 +1,166 @@
+"""Opt-in timing / memory / payload instrumentation for the Streamlit pages.
+
+Enabled with ``BIOMET_INSTRUMENT=1`` in the environment or ``?debug=1`` in
+the page URL; otherwise every helper is a cheap no-op. Peak memory is traced
+(``tracemalloc``, process-wide) only when ``BIOMET_INSTRUMENT`` is set at
+process start; ``?debug=1`` records timings and payloads only.
+
+* ``panel(label)`` is a drop-in for ``st.expander(label)`` that also times the
+  panel body; ``span(name)`` times any block; ``@timed()`` times a loader
+  (put it above ``st.cache_*`` so cache hits show up as ~0 ms).
+* ``map_payload`` / ``payload`` record bytes sent to the browser (folium HTML,
+  Plotly JSON).
+* ``debug_sidebar(page)`` renders this rerun's breakdown in the sidebar and
+  appends it to ``.biomet_cache/metrics/spans.prom``::
+
+      biomet_span_seconds{page="Stanlow",span="Map",kind="panel"} 0.412 1760000000000
+"""
+import functools
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+import streamlit as st
+
+from biomet.paths import cache_path
+
+METRICS_FILE = ("metrics", "spans.prom")
+_SPANS = "_biomet_spans"
+_DEPTH = "_biomet_span_depth"      # spans open in this session's rerun
+TRACE_MEMORY = os.environ.get("BIOMET_INSTRUMENT", "").lower() in ("1", "true", "yes")
+# The tracer's peak is process-wide: every reset first folds it into all open
+# spans of every session, so overlapping reruns never lose each other's peaks.
+_traced = []
+_traced_lock = threading.Lock()
+if TRACE_MEMORY:
+    tracemalloc.start()
+
+
+def enabled():
+    if TRACE_MEMORY:
+        return True
+    try:
+        return st.query_params.get("debug") == "1"
+    except Exception:
+        return False
+
+
+def _records():
+    return st.session_state.setdefault(_SPANS, [])
+
+
+def _fold_peak():
+    """Fold the tracer's peak into every open span and restart it (call with the lock held)."""
+    peak = tracemalloc.get_traced_memory()[1]
+    for s in _traced:
+        s["peak"] = max(s["peak"], peak - s["start_mem"])
+    tracemalloc.reset_peak()
+
+
+@contextmanager
+def span(name, kind="block"):
+    """Time (and, when tracing memory, record the peak of) the enclosed block."""
+    if not enabled():
+        yield
+        return
+    depth = st.session_state.get(_DEPTH, 0)
+    st.session_state[_DEPTH] = depth + 1
+    rec = None
+    if TRACE_MEMORY:
+        with _traced_lock:
+            _fold_peak()
+            rec = {"start_mem": tracemalloc.get_traced_memory()[0], "peak": 0}
+            _traced.append(rec)
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - t0
+        st.session_state[_DEPTH] = depth
+        if rec is not None:
+            with _traced_lock:
+                _fold_peak()
+                _traced.remove(rec)
+        _records().append({"span": name, "kind": kind, "depth": depth, "seconds": seconds,
+                           "peak_bytes": rec["peak"] if rec else None, "payload_bytes": 0})
+
+
+@contextmanager
+def panel(label, **expander_kwargs):
+    """``st.expander`` whose body is recorded as a ``panel`` span."""
+    with st.expander(label, **expander_kwargs) as exp, span(label, kind="panel"):
+        yield exp
+
+
+def timed(name=None):
+    """Decorator recording each call of a loader as a ``loader`` span."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name or fn.__name__, kind="loader"):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def payload(name, nbytes):
+    """Record ``nbytes`` sent to the browser for ``name``."""
+    if enabled():
+        _records().append({"span": name, "kind": "payload", "depth": None, "seconds": 0.0,
+                           "peak_bytes": 0, "payload_bytes": int(nbytes)})
+
+
+def map_payload(name, m):
+    """Record the size of a folium map's HTML (renders it once more, only when enabled)."""
+    if enabled():
+        payload(name, len(m.get_root().render().encode()))
+
+
+def figure_payload(name, fig):
+    """Record the size of a Plotly figure's JSON (serialised only when enabled)."""
+    if enabled():
+        payload(name, len(fig.to_json().encode()))
+
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def write_metrics(page, records):
+    """Append records to the metrics file in Prometheus text format (with timestamps)."""
+    ts = int(time.time() * 1000)
+    lines = []
+    for r in records:
+        labels = f'page="{_escape(page)}",span="{_escape(r["span"])}",kind="{r["kind"]}"'
+        if r["kind"] == "payload":
+            lines.append(f"biomet_payload_bytes{{{labels}}} {r['payload_bytes']} {ts}")
+        else:
+            lines.append(f"biomet_span_seconds{{{labels}}} {r['seconds']:.6f} {ts}")
+            if r["peak_bytes"] is not None:
+                lines.append(f"biomet_span_peak_bytes{{{labels}}} {r['peak_bytes']} {ts}")
+    with open(cache_path(*METRICS_FILE), "a") as fh:
+        fh.write("\n".join(lines) + "\n")
+
+
+def debug_sidebar(page):
+    """Show this rerun's spans in the sidebar, persist them, and reset for the next rerun."""
+    if not enabled():
+        return
+    records = st.session_state.pop(_SPANS, [])
+    if not records:
+        return
+    write_metrics(page, records)
+    df = pd.DataFrame(records)
+    df["ms"] = (df["seconds"] * 1000).round(1)
+    df["peak MB"] = (pd.to_numeric(df["peak_bytes"]) / 1e6).round(2)
+    df["payload kB"] = (df["payload_bytes"] / 1e3).round(1)
+    with st.sidebar:
+        st.markdown("### Debug: this rerun")
+        # Only outermost spans: nested ones (panels in a column, loaders in a panel) are inside them
+        top = df[(df["kind"] != "payload") & (df["depth"] == 0)]
+        st.metric("Instrumented time", f"{top['seconds'].sum():.2f} s")
+        st.dataframe(df[["span", "kind", "ms", "peak MB", "payload kB"]], hide_index=True)
+        st.caption(f"Appended to {cache_path(*METRICS_FILE)}")
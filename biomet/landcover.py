@@ -0,0 +1,70 @@
+"""Land-cover pieces shared by the site pages (and timed by the benchmarks).
+
+- ``landcover_layer``: the "Land Cover" map overlay, one dissolved feature
+  per class coloured as water / ecosystem / other.
+- ``growth_table``: the "Impactful Activities Growth" table, the area of the
+  industrial classes in two years. The areas come from the rasterized class
+  stack (``ClassStack.class_areas``) or, without one, from the polygons
+  (``polygon_areas``).
+"""
+import folium
+import numpy as np
+import pandas as pd
+
+from biomet.dissolve import load_class_layer
+
+IMPACT_KEYWORDS = ("Refinery", "Petrochemical", "Industrial", "Port", "Airport",
+                   "Landfill", "Factory", "Mining", "Construction", "Military")
+EXCLUDED_ACTIVITIES = {"sport and leisure"}
+
+
+def landcover_layer(path, names, water_classes, ecosystem_classes, show=True):
+    """``FeatureGroup`` with the dissolved classes of one land-cover GeoJSON (empty if missing)."""
+    fg = folium.FeatureGroup(name="Land Cover", show=show)
+    layer = load_class_layer(path, names)
+    if layer is not None:
+        layer["area_ha"] = layer["area_ha"].round(1)
+        folium.GeoJson(
+            layer,
+            style_function=lambda feat: {
+                "fillColor": ("blue" if feat["properties"]["code"] in water_classes else
+                              "green" if feat["properties"]["code"] in ecosystem_classes else "gray"),
+                "color": "black", "weight": 0.3, "fillOpacity": 0.5},
+            tooltip=folium.GeoJsonTooltip(fields=["name", "patches", "area_ha"],
+                                          aliases=["Class", "Patches", "Area (ha)"])
+        ).add_to(fg)
+    return fg
+
+
+def polygon_areas(gdf, names):
+    """Area (ha) per class name of a land-cover GeoDataFrame (``Class Name`` or coded ``label``)."""
+    gdf = gdf.to_crs(epsg=3857)
+    if "Class Name" in gdf.columns:
+        label = gdf["Class Name"]
+    elif "label" in gdf.columns:
+        label = gdf["label"].astype(int).map(lambda c: names.get(c, f"Unknown ({c})"))
+    else:
+        label = pd.Series("Unknown", index=gdf.index)
+    return (gdf.geometry.area / 10_000).groupby(label.to_numpy()).sum()
+
+
+def impact_areas(areas, names=None):
+    """Areas of the ``IMPACT_KEYWORDS`` classes, summed per name.
+
+    ``areas`` is indexed by class code (named through ``names``) or, with
+    ``names=None``, already by class name.
+    """
+    labels = (pd.Series([names.get(c, f"Unknown ({c})") for c in areas.index], index=areas.index)
+              if names is not None else pd.Series(areas.index.astype(str), index=areas.index))
+    mask = labels.str.lower().str.contains("|".join(k.lower() for k in IMPACT_KEYWORDS), na=False)
+    return areas[mask].groupby(labels[mask]).sum()
+
+
+def growth_table(areas1, areas2, y1, y2, names=None):
+    """Activity, ``<y1> ha``, ``<y2> ha``, Growth (ha) and % change of the impactful classes."""
+    dfg = pd.concat([impact_areas(areas1, names).rename(f"{y1} ha"),
+                     impact_areas(areas2, names).rename(f"{y2} ha")], axis=1).fillna(0)
+    dfg["Growth (ha)"] = dfg[f"{y2} ha"] - dfg[f"{y1} ha"]
+    dfg["% change"] = (dfg["Growth (ha)"] / dfg[f"{y1} ha"].replace(0, np.nan) * 100).fillna(0)
+    dfg = dfg.rename_axis("Activity").reset_index()
+    return dfg[~dfg["Activity"].str.lower().isin(EXCLUDED_ACTIVITIES)].reset_index(drop=True)
@@ -0,0 +1,82 @@
+"""Concurrent loading of per-position input files.
+
+Site folders hold one file per grid position (``species_iucn_gbif_results_{pos}.csv``,
+``environmental_risks_{pos}.csv``, ``environmental_data_{pos}.csv``, ...).
+``load_positions`` fans the reads out over a bounded thread pool (file I/O
+and the C CSV parser release the GIL) and returns the results in
+``positions`` order, so a cold first load costs roughly the slowest single
+file instead of the sum. Failures are collected per file rather than
+swallowed by a bare ``except``.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import pandas as pd
+
+MAX_WORKERS = 8
+
+
+@dataclass
+class Loaded:
+    """Per-key results of a fan-out read."""
+    results: dict = field(default_factory=dict)   # key -> reader output, in request order
+    missing: list = field(default_factory=list)   # keys whose file does not exist
+    errors: dict = field(default_factory=dict)    # key -> "file: ErrorType: message"
+
+    def get(self, key, default=None):
+        return self.results.get(key, default)
+
+    def items(self):
+        return self.results.items()
+
+    def raise_for_errors(self):
+        if self.errors:
+            raise OSError("Failed to read " + "; ".join(self.errors.values()))
+
+    def warn(self):
+        """Show one Streamlit warning per file that failed to load."""
+        import streamlit as st
+        for msg in self.errors.values():
+            st.warning(f"Could not load {msg}")
+
+
+def _script_ctx():
+    # Worker threads need the session's context to use st.cache_* helpers
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return None
+    return get_script_run_ctx(suppress_warning=True)
+
+
+def load_files(paths, reader=pd.read_csv, max_workers=MAX_WORKERS, **kwargs):
+    """``reader(path, **kwargs)`` for every ``{key: path}`` concurrently."""
+    paths = {k: Path(p) for k, p in paths.items()}
+    out = Loaded(missing=[k for k, p in paths.items() if not p.exists()])
+    todo = {k: p for k, p in paths.items() if k not in out.missing}
+    if not todo:
+        return out
+    ctx = _script_ctx()
+
+    def read(path):
+        if ctx is not None:
+            from streamlit.runtime.scriptrunner import add_script_run_ctx
+            add_script_run_ctx(threading.current_thread(), ctx)
+        return reader(path, **kwargs)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(todo))) as pool:
+        futures = {k: pool.submit(read, p) for k, p in todo.items()}
+        for k, fut in futures.items():
+            try:
+                out.results[k] = fut.result()
+            except Exception as e:
+                out.errors[k] = f"{todo[k].name}: {type(e).__name__}: {e}"
+    return out
+
+
+def load_positions(folder, pattern, positions, reader=pd.read_csv, max_workers=MAX_WORKERS, **kwargs):
+    """Read ``folder / pattern.format(pos=pos)`` for every grid position concurrently."""
+    return load_files({pos: Path(folder) / pattern.format(pos=pos) for pos in positions},
+                      reader, max_workers, **kwargs)
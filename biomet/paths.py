@@ -0,0 +1,14 @@
+"""Repository-relative data and cache locations."""
+import os
+from pathlib import Path
+
+BASE_DIR  = Path(__file__).resolve().parent.parent
+# Derived artifacts (models, caches, rasters) live outside the data folders
+CACHE_DIR = Path(os.environ.get("BIOMET_CACHE_DIR", BASE_DIR / ".biomet_cache"))
+
+
+def cache_path(*parts):
+    """Path under CACHE_DIR, creating the parent folder."""
+    path = CACHE_DIR.joinpath(*parts)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
@@ -0,0 +1,108 @@
+"""Raster analytics on memory-mapped class grids.
+
+Grids are plain 2-D integer/bool arrays (row 0 = north) opened with
+``np.load(mmap_mode="r")``; ``bounds`` is ``(west, south, east, north)`` in
+degrees, the same order as ``GeoDataFrame.total_bounds``. Every statistic is a
+single ``np.bincount`` over the flattened pixels.
+"""
+import math
+
+import folium
+import numpy as np
+import pandas as pd
+
+
+def open_grid(path):
+    """Memory-mapped, read-only view of a ``.npy`` grid."""
+    return np.load(path, mmap_mode="r")
+
+
+def pixel_area_ha(bounds, shape):
+    """Approximate pixel area (ha) of a lat/lon grid, at the centre latitude."""
+    west, south, east, north = bounds
+    rows, cols = shape
+    width_m  = (east - west) * 111_320 * math.cos(math.radians((south + north) / 2))
+    height_m = (north - south) * 110_574
+    return width_m * height_m / (rows * cols) / 10_000
+
+
+def class_counts(grid, n_classes=None):
+    flat = np.asarray(grid).ravel().astype(np.int64)
+    return np.bincount(flat, minlength=n_classes or 0)
+
+
+def class_areas(grid, area_ha, labels=None):
+    """Area per class code present in ``grid``."""
+    counts = class_counts(grid)
+    codes = np.flatnonzero(counts)
+    df = pd.DataFrame({"Class": codes, "Pixels": counts[codes], "Area (ha)": counts[codes] * area_ha})
+    if labels:
+        df.insert(1, "Name", [labels.get(int(c), f"Unknown ({c})") for c in codes])
+    return df
+
+
+def transition_counts(before, after, labels=None):
+    """(from x to) pixel counts between two grids of the same shape."""
+    a = np.asarray(before).ravel().astype(np.int64)
+    b = np.asarray(after).ravel().astype(np.int64)
+    k = int(max(a.max(), b.max())) + 1
+    m = np.bincount(a * k + b, minlength=k * k).reshape(k, k)
+    keep = np.flatnonzero(m.sum(axis=1) + m.sum(axis=0))
+    names = [labels.get(int(c), str(c)) if labels else int(c) for c in keep]
+    return pd.DataFrame(m[np.ix_(keep, keep)], index=names, columns=names)
+
+
+def change_map(before, after):
+    """0 = unchanged, 1 = gained (absent -> present), 2 = lost, 3 = class swap."""
+    a, b = np.asarray(before), np.asarray(after)
+    out = np.zeros(a.shape, dtype=np.uint8)
+    changed = a != b
+    out[changed & (a == 0)] = 1
+    out[changed & (b == 0)] = 2
+    out[changed & (a != 0) & (b != 0)] = 3
+    return out
+
+
+def box_zones(shape, bounds, boxes):
+    """Zone id per pixel for axis-aligned ``boxes`` (west, south, east, north); -1 outside."""
+    rows, cols = shape
+    west, south, east, north = bounds
+    zones = np.full(shape, -1, dtype=np.int32)
+    for k, (bw, bs, be, bn) in enumerate(boxes):
+        c0 = int(np.clip(math.floor((bw - west) / (east - west) * cols), 0, cols))
+        c1 = int(np.clip(math.ceil((be - west) / (east - west) * cols), 0, cols))
+        r0 = int(np.clip(math.floor((north - bn) / (north - south) * rows), 0, rows))
+        r1 = int(np.clip(math.ceil((north - bs) / (north - south) * rows), 0, rows))
+        zones[r0:r1, c0:c1] = k
+    return zones
+
+
+def zonal_counts(grid, zones, n_zones, n_classes=None):
+    """(zones x classes) pixel counts with one bincount.
+
+    ``n_classes`` fixes the number of columns (2 for boolean masks); by
+    default it is the largest value in ``grid`` plus one.
+    """
+    g = np.asarray(grid).ravel().astype(np.int64)
+    z = zones.ravel()
+    ok = z >= 0
+    k = n_classes if n_classes is not None else int(g.max()) + 1
+    return np.bincount(z[ok] * k + g[ok], minlength=n_zones * k).reshape(n_zones, k)
+
+
+def colorize(grid, colors):
+    """RGBA image from a ``{value: (r, g, b, a)}`` lookup; other values transparent."""
+    g = np.asarray(grid).astype(np.int64)
+    lut = np.zeros((max(int(g.max()), max(colors)) + 1, 4), dtype=np.uint8)
+    for value, rgba in colors.items():
+        lut[value] = rgba
+    return lut[g]
+
+
+def image_overlay(rgba, bounds, name, show=True, opacity=0.7):
+    """Single ``ImageOverlay`` for a whole grid (one PNG instead of many polygons)."""
+    west, south, east, north = bounds
+    return folium.raster_layers.ImageOverlay(
+        image=rgba, bounds=[[south, west], [north, east]], name=name,
+        opacity=opacity, show=show, interactive=False,
+    )
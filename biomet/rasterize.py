@@ -0,0 +1,374 @@
+"""Offline rasterizer: land-cover polygons -> per-year uint16 class grids.
+
+Each site's ``export_land_cover_polygons_*`` years are burned into one
+``years x rows x cols`` stack on a common EPSG:3857 grid (the CRS the pages
+already measure areas in), stored as a memory-mappable ``.npy`` plus a JSON
+sidecar with the affine transform. Area, fraction and change queries then run
+on a few MB of integers instead of reprojecting geometries. The sidecar also
+records the export mtimes and ``res``; ``ensure_class_stack`` rebuilds the
+stack when they change (a re-exported or newly added year).
+
+    python -m biomet.rasterize Stanlow --res 50
+    python -m biomet.rasterize all --report
+
+The Brazil exports are already pixel polygons: each feature is a run of
+same-class MODIS pixels whose ``id`` (``"+28051+20908"``) is the column/row
+of its first pixel on the 500 m sinusoidal lattice. Those are burned onto that
+native lattice instead, which reproduces the source raster exactly.
+"""
+import argparse
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Transformer
+
+from biomet.paths import BASE_DIR, cache_path
+from biomet.raster import class_counts, open_grid
+
+CRS = "EPSG:3857"
+DEFAULT_RES = 50.0
+NODATA = 0
+# Native CRS of the Earth Engine MODIS pixel exports (equal-area)
+SINUSOIDAL = "+proj=sinu +R=6371007.181 +units=m +no_defs"
+# Global MODIS grid in that CRS: upper-left corner and pixel sizes (native 463 m, or 500 m resampled)
+MODIS_ORIGIN = (-20015109.354, 10007554.677)
+MODIS_RES = (463.312716525, 500.0)
+
+SITES = {
+    "Stanlow": {"folder": BASE_DIR / "stanlow area risk",
+                "pattern": "export_land_cover_polygons_Stanlow_ChangeNow_{year}.geojson",
+                "years": [1998, 2001, 2007, 2012, 2018]},
+    "Paris":   {"folder": BASE_DIR / "Paris",
+                "pattern": "export_land_cover_polygons_Paris_ChangeNow_{year}.geojson",
+                "years": [1998, 2001, 2007, 2012, 2018]},
+    "MOH":     {"folder": BASE_DIR / "MOH",
+                "pattern": "export_land_cover_polygons_Motor_oil_landcov_{year}.geojson",
+                "years": [1990, 2000, 2006, 2012, 2018]},
+    "LA":      {"folder": BASE_DIR / "LA",
+                "pattern": "export_land_cover_polygonsLA.geojson",
+                "years": [2018]},          # single undated MODIS export
+    "Brazil":  {"folder": BASE_DIR / "Biodiversity_brazil",
+                "pattern": "BrazilAmazon_{year}.geojson",
+                "pixel_ids": True},     # no "years": every export matching the pattern
+}
+
+
+class ClassStack:
+    """``years x rows x cols`` uint16 class codes with a GDAL-order affine transform."""
+
+    def __init__(self, grids, years, transform, crs=CRS):
+        self.grids = grids
+        self.years = list(years)
+        self.transform = tuple(transform)   # (res, 0, west, 0, -res, north)
+        self.crs = crs
+
+    @property
+    def res(self):
+        return self.transform[0]
+
+    @property
+    def pixel_area_ha(self):
+        return self.transform[0] * -self.transform[4] / 10_000
+
+    @property
+    def bounds(self):
+        """(west, south, east, north) in the stack CRS."""
+        a, _, c, _, e, f = self.transform
+        rows, cols = self.grids.shape[1:]
+        return (c, f + e * rows, c + a * cols, f)
+
+    def grid(self, year):
+        return self.grids[self.years.index(year)]
+
+    def class_areas(self, year):
+        """Area (ha) per class code for one year."""
+        counts = class_counts(self.grid(year))
+        codes = np.flatnonzero(counts)
+        codes = codes[codes != NODATA]
+        return pd.Series(counts[codes] * self.pixel_area_ha, index=codes, name=year)
+
+    def area_table(self):
+        """Class x year area table (ha)."""
+        return pd.concat([self.class_areas(y) for y in self.years], axis=1).fillna(0)
+
+    def cell_fractions(self, year, zones, n_zones):
+        """(zones x classes) class fractions of each zone (e.g. grid cells)."""
+        g = np.asarray(self.grid(year)).ravel().astype(np.int64)
+        z = zones.ravel()
+        ok = (z >= 0) & (g != NODATA)
+        # Only the codes present get a column: zones x codes counts, not zones x 65536
+        codes, g = np.unique(g[ok], return_inverse=True)
+        counts = np.bincount(z[ok] * len(codes) + g, minlength=n_zones * len(codes))
+        counts = counts.reshape(n_zones, len(codes))
+        frac = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+        return pd.DataFrame(frac, columns=codes)
+
+    def change(self, y1, y2, from_codes=None, to_codes=None):
+        """Boolean change mask between two years, optionally restricted by class."""
+        a, b = np.asarray(self.grid(y1)), np.asarray(self.grid(y2))
+        mask = (a != b) & (a != NODATA) & (b != NODATA)
+        if from_codes is not None:
+            mask &= np.isin(a, list(from_codes))
+        if to_codes is not None:
+            mask &= np.isin(b, list(to_codes))
+        return mask
+
+    def zones_for_boxes(self, boxes):
+        """Zone id per pixel for lon/lat ``boxes`` (west, south, east, north); -1 outside."""
+        a, _, c, _, e, f = self.transform
+        rows, cols = self.grids.shape[1:]
+        zones = np.full((rows, cols), -1, dtype=np.int32)
+        for k, geom in enumerate(gpd.GeoSeries([shapely.box(*b) for b in boxes], crs="EPSG:4326").to_crs(self.crs)):
+            w, s, e_, n = geom.bounds
+            c0, c1 = np.clip([int((w - c) // a), int(-(-(e_ - c) // a))], 0, cols)
+            r0, r1 = np.clip([int((f - n) // -e), int(-(-(f - s) // -e))], 0, rows)
+            zones[r0:r1, c0:c1] = k
+        return zones
+
+    def lonlat_grid(self, year):
+        """Nearest-neighbour resample of one year onto a lon/lat grid: ``(grid, bounds)``.
+
+        ``ImageOverlay`` needs an image aligned with lon/lat, which a projected
+        stack only approximately is; bounds are (west, south, east, north).
+        """
+        rows, cols = self.grids.shape[1:]
+        a, _, c, _, e, f = self.transform
+        west, south, east, north = gpd.GeoSeries([shapely.box(*self.bounds)], crs=self.crs).to_crs(4326).total_bounds
+        lon = west + (east - west) * (np.arange(cols) + 0.5) / cols
+        lat = north - (north - south) * (np.arange(rows) + 0.5) / rows
+        x, y = Transformer.from_crs(4326, self.crs, always_xy=True).transform(*np.meshgrid(lon, lat))
+        ci, ri = np.floor((x - c) / a).astype(np.int64), np.floor((y - f) / e).astype(np.int64)
+        ok = (ci >= 0) & (ci < cols) & (ri >= 0) & (ri < rows)
+        out = np.full((rows, cols), NODATA, dtype=np.uint16)
+        out[ok] = np.asarray(self.grid(year))[ri[ok], ci[ok]]
+        return out, (west, south, east, north)
+
+    # --- Storage ---
+    def save(self, stem, **extra):
+        """Store grids and metadata (plus ``extra`` keys); readers mapping the old grids keep them."""
+        stem = Path(stem)
+        _publish(stem.with_suffix(".npy"), lambda fh: np.save(fh, np.ascontiguousarray(self.grids)))
+        meta = {"years": self.years, "transform": self.transform, "crs": self.crs, **extra}
+        _publish(stem.with_suffix(".json"), lambda fh: fh.write(json.dumps(meta).encode()))
+
+    @classmethod
+    def load(cls, stem):
+        with open(f"{stem}.json") as fh:
+            meta = json.load(fh)
+        return cls(open_grid(f"{stem}.npy"), meta["years"], meta["transform"], meta["crs"])
+
+
+def _publish(dst, write):
+    """Run ``write(file)`` on a unique temporary file next to ``dst``, then atomically replace ``dst``."""
+    fd, tmp = tempfile.mkstemp(dir=dst.parent, prefix=dst.stem + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            write(fh)
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def burn(gdf, code_col, transform, shape):
+    """Burn polygon class codes into a uint16 grid (pixel-centre rule)."""
+    a, _, c, _, e, f = transform
+    rows, cols = shape
+    out = np.full(shape, NODATA, dtype=np.uint16)
+    xs = c + a * (np.arange(cols) + 0.5)
+    ys = f + e * (np.arange(rows) + 0.5)
+    geoms = gdf.geometry.values
+    shapely.prepare(geoms)
+    codes = gdf[code_col].to_numpy()
+    # Each polygon only tests the pixel centres inside its own bounding box
+    for geom, code, (w, s, east, n) in zip(geoms, codes, shapely.bounds(geoms)):
+        c0, c1 = np.searchsorted(xs, [w, east])
+        r0, r1 = np.searchsorted(-ys, [-n, -s])
+        if c0 >= c1 or r0 >= r1:
+            continue
+        X, Y = np.meshgrid(xs[c0:c1], ys[r0:r1])
+        inside = shapely.contains_xy(geom, X, Y)
+        out[r0:r1, c0:c1][inside] = code
+    return out
+
+
+def decode_pixel_ids(ids):
+    """``"+28051+20908"`` -> (col, row) integer arrays."""
+    parts = pd.Series(ids, dtype=str).str.extract(r"^([+-]\d+)([+-]\d+)$")
+    return parts[0].astype(int).to_numpy(), parts[1].astype(int).to_numpy()
+
+
+def pixel_lattice(gdf):
+    """``(res, x0, y0)`` of the lattice the pixel ids index, fitted on single-pixel features."""
+    col, row = decode_pixel_ids(gdf["id"])
+    b = gdf.geometry.bounds.to_numpy()
+    one = gdf["count"].to_numpy() == 1
+    res = np.median(b[one, 2] - b[one, 0])
+    return res, np.median(b[one, 0] - col[one] * res), np.median(b[one, 3] + row[one] * res)
+
+
+def read_landcover(path, pixel_ids=False):
+    """Polygons of one export with an integer ``code`` column, in the burn CRS (None if empty)."""
+    gdf = gpd.read_file(path)
+    code_col = "label" if "label" in gdf.columns else "LC_Class"
+    if gdf.empty or code_col not in gdf.columns:
+        return None
+    gdf = gdf[gdf[code_col].notna()].copy()
+    gdf["code"] = gdf[code_col].astype(int)
+    crs = SINUSOIDAL if pixel_ids else CRS
+    return gdf.set_crs(epsg=4326, allow_override=gdf.crs is None).to_crs(crs)
+
+
+def on_modis_lattice(res, x0, y0, tol=0.01):
+    """True if a fitted ``(res, x0, y0)`` lattice is the MODIS sinusoidal grid."""
+    for r in MODIS_RES:
+        offsets = (np.array([x0, y0]) - MODIS_ORIGIN) / r
+        if abs(res - r) <= tol * r and np.all(np.abs(offsets - np.round(offsets)) <= 0.05):
+            return True
+    return False
+
+
+def is_pixel_export(gdf):
+    """True for Earth Engine pixel-run exports on the MODIS lattice.
+
+    Besides ``"+col+row"`` ids and a pixel ``count``, the lattice fitted on the
+    single-pixel features must be the MODIS grid. Pixel-run exports of other
+    rasters (the ~100 m CORINE ones) are burned on the EPSG:3857 grid.
+    """
+    if "id" not in gdf.columns or "count" not in gdf.columns or gdf.empty:
+        return False
+    if not pd.Series(gdf["id"], dtype=str).str.fullmatch(r"[+-]\d+[+-]\d+").all():
+        return False
+    sinu = gdf.set_crs(epsg=4326, allow_override=gdf.crs is None).to_crs(SINUSOIDAL)
+    if not (sinu["count"] == 1).any():
+        return False
+    return on_modis_lattice(*pixel_lattice(sinu))
+
+
+def pattern_years(folder, pattern):
+    """Years with an export in ``folder``, from a ``{year}`` file pattern."""
+    rx = re.compile(re.escape(pattern).replace(re.escape("{year}"), r"(\d{4})") + "$")
+    years = (rx.match(p.name) for p in Path(folder).glob(pattern.replace("{year}", "*")))
+    return sorted(int(m.group(1)) for m in years if m)
+
+
+def site_years(site):
+    """Listed years of ``site``, or every export matching its pattern when none are listed."""
+    cfg = SITES[site]
+    return list(cfg["years"]) if "years" in cfg else pattern_years(cfg["folder"], cfg["pattern"])
+
+
+def read_year(site, year):
+    cfg = SITES[site]
+    path = cfg["folder"] / cfg["pattern"].format(year=year)
+    if not path.exists():
+        return None
+    return read_landcover(path, cfg.get("pixel_ids"))
+
+
+def _pixel_transform(gdfs):
+    """Transform snapped to the native pixel lattice of id-keyed exports."""
+    res, x0, y0 = pixel_lattice(next(iter(gdfs.values())))
+    w, s, e, n = np.array([g.total_bounds for g in gdfs.values()]).T
+    c0, c1 = np.round((np.array([w.min(), e.max()]) - x0) / res).astype(int)
+    r0, r1 = np.round((y0 - np.array([n.max(), s.min()])) / res).astype(int)
+    return (res, 0.0, x0 + c0 * res, 0.0, -res, y0 - r0 * res), (r1 - r0, c1 - c0)
+
+
+def rasterize(gdfs, pixel_ids=False, res=DEFAULT_RES):
+    """Burn ``{year: polygons}`` (from ``read_landcover``) onto one common grid."""
+    if pixel_ids:
+        transform, (rows, cols) = _pixel_transform(gdfs)
+        grids = np.stack([burn(g, "code", transform, (rows, cols)) for g in gdfs.values()])
+        return ClassStack(grids, list(gdfs), transform, SINUSOIDAL)
+    w, s, e, n = np.array([g.total_bounds for g in gdfs.values()]).T
+    west, south, east, north = w.min(), s.min(), e.max(), n.max()
+    cols, rows = int(np.ceil((east - west) / res)), int(np.ceil((north - south) / res))
+    transform = (res, 0.0, west, 0.0, -res, north)
+    grids = np.stack([burn(g, "code", transform, (rows, cols)) for g in gdfs.values()])
+    return ClassStack(grids, list(gdfs), transform)
+
+
+def rasterize_site(site, res=DEFAULT_RES):
+    """Burn every available year of ``site``; returns ``(stack, vector_gdfs)``."""
+    gdfs = {y: g for y in site_years(site) if (g := read_year(site, y)) is not None}
+    if not gdfs:
+        raise FileNotFoundError(f"No land-cover polygons for {site}")
+    return rasterize(gdfs, SITES[site].get("pixel_ids", False), res), gdfs
+
+
+def accuracy_report(stack, gdfs):
+    """Raster vs vector area per (year, class)."""
+    rows = []
+    for y, gdf in gdfs.items():
+        vec = gdf.geometry.area.groupby(gdf["code"]).sum() / 10_000
+        ras = stack.class_areas(y)
+        for code in vec.index.union(ras.index):
+            v, r = float(vec.get(code, 0.0)), float(ras.get(code, 0.0))
+            rows.append({"Year": y, "Class": int(code), "Vector (ha)": v, "Raster (ha)": r,
+                         "Error (%)": (r - v) / v * 100 if v else np.nan})
+    return pd.DataFrame(rows)
+
+
+def stack_stem(site):
+    return cache_path("rasters", f"{site}_classes")
+
+
+def load_class_stack(site):
+    """Previously built stack for ``site`` (memory-mapped), or None."""
+    stem = stack_stem(site)
+    if not stem.with_suffix(".npy").exists():
+        return None
+    return ClassStack.load(stem)
+
+
+def source_stamp(site):
+    """``{year: mtime_ns}`` of the exports of ``site`` that exist."""
+    cfg = SITES[site]
+    paths = {y: cfg["folder"] / cfg["pattern"].format(year=y) for y in site_years(site)}
+    return {str(y): p.stat().st_mtime_ns for y, p in paths.items() if p.exists()}
+
+
+def ensure_class_stack(site, res=DEFAULT_RES):
+    """Stored stack for ``site``, (re)built when its exports or ``res`` changed since the last build."""
+    stem = stack_stem(site)
+    stamp = {"sources": source_stamp(site), "res": res}
+    meta_path = stem.with_suffix(".json")
+    if meta_path.exists() and stem.with_suffix(".npy").exists():
+        meta = json.loads(meta_path.read_text())
+        if {k: meta.get(k) for k in stamp} == stamp:
+            return ClassStack.load(stem)
+    stack, _ = rasterize_site(site, res)
+    stack.save(stem, **stamp)
+    return load_class_stack(site)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rasterize land-cover polygons into class stacks")
+    parser.add_argument("site", choices=list(SITES) + ["all"])
+    parser.add_argument("--res", type=float, default=DEFAULT_RES,
+                        help="pixel size in metres (EPSG:3857); pixel-id sites keep their native lattice")
+    parser.add_argument("--report", action="store_true", help="print the raster-vs-vector area report")
+    args = parser.parse_args()
+    for site in (SITES if args.site == "all" else [args.site]):
+        stack, gdfs = rasterize_site(site, args.res)
+        stack.save(stack_stem(site), sources=source_stamp(site), res=args.res)
+        print(f"{site}: years {stack.years}, grid {stack.grids.shape[1:]}, "
+              f"{stack.grids.nbytes / 1e6:.1f} MB -> {stack_stem(site)}.npy")
+        if args.report:
+            rep = accuracy_report(stack, gdfs)
+            tot = rep.groupby("Year")[["Vector (ha)", "Raster (ha)"]].sum()
+            tot["Error (%)"] = (tot["Raster (ha)"] - tot["Vector (ha)"]) / tot["Vector (ha)"] * 100
+            print(tot.round(2).to_string())
+            print(f"  median |class error|: {rep['Error (%)'].abs().median():.2f}%")
+
+
+if __name__ == "__main__":
+    main()
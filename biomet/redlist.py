@@ -0,0 +1,257 @@
+"""Offline IUCN Red List enrichment of occurrence tables.
+
+Rows of ``species_iucn_gbif_results_*.csv`` whose ``Assessment ID`` is
+``Not Found`` are filled from a local Red List snapshot: every CSV in
+``RedList/``, either an IUCN export (``scientificName``, ``redlistCategory``,
+``populationTrend``, ``assessmentId``) or a table in the species-table
+layout. ``python -m biomet.redlist seed`` writes such a snapshot from the rows
+that are already assessed in any site's tables.
+
+Names are matched on the ``taxonomy.normalize`` binomial key, hashed to
+uint64 and looked up with ``np.searchsorted``. Every spelling resolved so far
+is kept, by the hash of the raw name, in a store under
+``.biomet_cache/redlist`` keyed on the snapshot files. A run therefore only
+normalizes and looks up names it has not seen before, and the snapshot is
+parsed only when such names turn up. A new or edited snapshot starts a
+fresh store. The store is a folder of parquet parts: each batch of new names
+is one small part, and the parts are merged into one every
+``COMPACT_PARTS`` batches.
+
+    python -m biomet.redlist seed
+    python -m biomet.redlist run "stanlow area risk" Paris MOH LA
+"""
+import argparse
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from biomet.paths import BASE_DIR, cache_path
+from biomet.taxonomy import normalize
+
+SNAPSHOT_DIR = BASE_DIR / "RedList"
+SEED_FILE = SNAPSHOT_DIR / "snapshot_from_tables.csv"
+FIELDS = ["Assessment ID", "Red List Category", "Population Trend"]
+# IUCN export column -> species-table column
+IUCN_COLUMNS = {"scientificName": "Species Name", "assessmentId": "Assessment ID",
+                "redlistCategory": "Red List Category", "populationTrend": "Population Trend"}
+MISSING_ID = "Not Found"
+SPECIES_PATTERN = "species_iucn_gbif_results_*.csv"
+COMPACT_PARTS = 16     # store parts before they are merged into one
+
+
+def hash_keys(keys):
+    """uint64 hash per name or key (0 where missing)."""
+    keys = pd.Series(keys, dtype=object)
+    hashes = pd.util.hash_array(keys.fillna("").to_numpy(dtype=object))
+    return np.where(keys.isna().to_numpy(), 0, hashes).astype(np.uint64)
+
+
+def snapshot_files():
+    return sorted(SNAPSHOT_DIR.glob("*.csv"))
+
+
+def _stamp(files):
+    raw = "|".join(f"{p.name}:{p.stat().st_size}:{p.stat().st_mtime_ns}" for p in files)
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def read_snapshot(files):
+    """Snapshot rows (``Species Name`` + ``FIELDS``), newest file winning per name."""
+    parts = []
+    for p in sorted(files, key=lambda p: p.stat().st_mtime_ns, reverse=True):
+        df = pd.read_csv(p, dtype=str).rename(columns=IUCN_COLUMNS)
+        missing = set(["Species Name"] + FIELDS) - set(df.columns)
+        if missing:
+            raise ValueError(f"{p.name}: Red List snapshot lacks {', '.join(sorted(missing))}")
+        parts.append(df[["Species Name"] + FIELDS])
+    snap = pd.concat(parts, ignore_index=True)
+    snap = snap[snap["Assessment ID"].notna() & (snap["Assessment ID"] != MISSING_ID)]
+    snap["hash"] = hash_keys(normalize(snap["Species Name"]))
+    return snap[snap["hash"] != 0].drop_duplicates("hash")
+
+
+class RedListStore:
+    """Hashed raw name -> Red List fields for every spelling resolved so far.
+
+    ``hashes`` is kept sorted; names missing from the snapshot are stored
+    too (with empty fields), so they are not looked up again either.
+    """
+
+    def __init__(self, files):
+        self.files = list(files)
+        self.folder = cache_path("redlist", f"resolved-{_stamp(self.files)}", "part").parent
+        self._snapshot = None
+        self._lock = threading.Lock()
+        # Parts this store has read or written (the only ones a compaction may delete)
+        self._parts = sorted(self.folder.glob("*.parquet"))
+        if self._parts:
+            stored = pd.concat([pd.read_parquet(p) for p in self._parts], ignore_index=True)
+            stored = stored.drop_duplicates("hash").sort_values("hash", kind="stable")
+            self.hashes = stored["hash"].to_numpy(dtype=np.uint64)
+            self.fields = stored[FIELDS].reset_index(drop=True)
+        else:
+            self.hashes = np.empty(0, dtype=np.uint64)
+            self.fields = pd.DataFrame({f: pd.Series(dtype=object) for f in FIELDS})
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def snapshot(self):
+        if self._snapshot is None:
+            snap = read_snapshot(self.files).sort_values("hash")
+            self._snapshot = (snap["hash"].to_numpy(dtype=np.uint64), snap[FIELDS].reset_index(drop=True))
+        return self._snapshot
+
+    def _add(self, new, names):
+        """Resolve unseen spellings (``new`` hashes of ``names``) against the snapshot and persist them."""
+        snap_hashes, snap_fields = self.snapshot()
+        keys = hash_keys(normalize(names))
+        pos = np.searchsorted(snap_hashes, keys)
+        pos_ok = np.minimum(pos, max(len(snap_hashes) - 1, 0))
+        found = (keys != 0) & (pos < len(snap_hashes)) & (snap_hashes[pos_ok] == keys) if len(snap_hashes) else \
+            np.zeros(len(new), dtype=bool)
+        fields = pd.DataFrame({f: np.full(len(new), np.nan, dtype=object) for f in FIELDS})
+        fields.loc[found, FIELDS] = snap_fields.iloc[pos_ok[found]].to_numpy()
+        hashes = np.concatenate([self.hashes, new])
+        order = np.argsort(hashes, kind="stable")
+        self.hashes = hashes[order]
+        self.fields = pd.concat([self.fields, fields], ignore_index=True).iloc[order].reset_index(drop=True)
+        if len(self._parts) + 1 >= COMPACT_PARTS:
+            merged = self._write_part(pd.DataFrame({"hash": self.hashes}).join(self.fields))
+            for p in self._parts:
+                p.unlink(missing_ok=True)
+            self._parts = [merged]
+        else:
+            self._parts.append(self._write_part(pd.DataFrame({"hash": new}).join(fields)))
+        return int(found.sum())
+
+    def _write_part(self, df):
+        """Write one store part through a unique temporary file; returns its path."""
+        dst = self.folder / f"part-{uuid.uuid4().hex}.parquet"
+        fd, tmp = tempfile.mkstemp(dir=self.folder, suffix=".parquet.tmp")
+        os.close(fd)
+        try:
+            df.to_parquet(tmp)
+            os.replace(tmp, dst)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        return dst
+
+    def lookup(self, names):
+        """``FIELDS`` per name (NaN where the snapshot has no assessment); resolves new names first."""
+        names = pd.Series(names, dtype=object)
+        hashes = hash_keys(names)
+        with self._lock:
+            uniq, first = np.unique(hashes, return_index=True)
+            unseen = (uniq != 0) & ~np.isin(uniq, self.hashes)
+            if unseen.any():
+                self._add(uniq[unseen], names.iloc[first[unseen]])
+            pos = np.minimum(np.searchsorted(self.hashes, hashes), max(len(self.hashes) - 1, 0))
+            out = self.fields.iloc[pos].reset_index(drop=True) if len(self.hashes) else \
+                pd.DataFrame({f: np.full(len(hashes), np.nan, dtype=object) for f in FIELDS})
+        out.loc[hashes == 0, FIELDS] = np.nan
+        return out
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def default_store():
+    """Process-wide store for the current snapshot files, or None without a snapshot."""
+    files = snapshot_files()
+    if not files:
+        return None
+    stamp = _stamp(files)
+    with _stores_lock:
+        if stamp not in _stores:
+            _stores[stamp] = RedListStore(files)
+        return _stores[stamp]
+
+
+def enrich(df, name_col="Species Name", store=None):
+    """Copy of a species table with unassessed rows filled from the snapshot.
+
+    Rows that already carry an assessment keep it; only the distinct names of
+    the table (its categories) are looked up.
+    """
+    store = default_store() if store is None else store
+    if store is None or name_col not in df.columns or df.empty:
+        return df
+    cat = pd.Categorical(df[name_col])
+    info = store.lookup(cat.categories)
+    codes = np.where(cat.codes < 0, len(info), cat.codes)   # missing names -> trailing NaN slot
+    found = np.r_[info["Assessment ID"].notna().to_numpy(), False][codes]
+    if "Assessment ID" in df.columns:
+        ids = df["Assessment ID"].to_numpy(dtype=object)
+        fill = found & (pd.isna(ids) | (ids == MISSING_ID))
+    else:
+        fill = found
+    if not fill.any():
+        return df
+    out = {}
+    for f in FIELDS:
+        current = df[f].to_numpy(dtype=object).copy() if f in df.columns else np.full(len(df), np.nan, dtype=object)
+        current[fill] = np.r_[info[f].to_numpy(dtype=object), np.nan][codes[fill]]
+        out[f] = current
+    return df.assign(**out)
+
+
+def enriched(path, **kwargs):
+    """Reader for ``load_positions``: the shared species table of ``path``, enriched."""
+    from biomet.shared import frame
+    return enrich(frame(path, **kwargs))
+
+
+# --- Batch stage ---
+def species_files(folders):
+    return [p for folder in folders for p in sorted((BASE_DIR / folder).glob(SPECIES_PATTERN))]
+
+
+def seed(folders):
+    """Write ``SEED_FILE`` (IUCN export layout) from the already-assessed rows of the tables."""
+    tables = pd.concat([pd.read_csv(p, dtype=str) for p in species_files(folders)], ignore_index=True)
+    known = tables[tables["Assessment ID"].notna() & (tables["Assessment ID"] != MISSING_ID)]
+    known = known.drop_duplicates("Species Name").sort_values("Species Name")
+    SNAPSHOT_DIR.mkdir(exist_ok=True)
+    known.rename(columns={v: k for k, v in IUCN_COLUMNS.items()})[list(IUCN_COLUMNS)].to_csv(SEED_FILE, index=False)
+    return len(known)
+
+
+def run(folders):
+    """Resolve every species-table name of ``folders`` and report the coverage."""
+    store = default_store()
+    if store is None:
+        raise SystemExit(f"No Red List snapshot in {SNAPSHOT_DIR}")
+    t0 = time.perf_counter()
+    tables = [pd.read_csv(p, dtype=str) for p in species_files(folders)]
+    names = pd.concat([t["Species Name"] for t in tables], ignore_index=True).astype("category")
+    before = len(store)
+    store.lookup(names.cat.categories)
+    filled = sum(int((enrich(t, store=store)["Assessment ID"] != t["Assessment ID"]).sum()) for t in tables)
+    missing = sum(int((t["Assessment ID"] == MISSING_ID).sum()) for t in tables)
+    print(f"{len(tables)} tables, {len(names):,} rows, {len(names.cat.categories):,} distinct names")
+    print(f"{len(store) - before:,} new names resolved ({len(store):,} in store)")
+    print(f"{filled:,} of {missing:,} unassessed rows filled in {time.perf_counter() - t0:.2f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline Red List enrichment of the species tables")
+    parser.add_argument("command", choices=["seed", "run"])
+    parser.add_argument("folders", nargs="*", default=["stanlow area risk", "Paris", "MOH", "LA"])
+    args = parser.parse_args()
+    if args.command == "seed":
+        print(f"{seed(args.folders):,} assessed species written to {SEED_FILE}")
+    else:
+        run(args.folders)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""Region onboarding: a registry of monitored regions and an incremental artifact pipeline.
+
+A region is a folder of yearly land-cover exports named by a ``{year}``
+pattern (``BrazilAmazon_{year}.geojson``). ``register_region`` validates the
+folder and records the region in ``regions.json``; ``RegionPipeline`` then
+precomputes, in a background worker, one artifact set per (region, year)
+under ``.biomet_cache/regions/<slug>/``:
+
+* ``<year>.json`` - mean patch FFI (``fragmentation.ffi``), patch count, class areas (ha) and richness,
+* ``<year>.png``  - the colour-coded class map as one lon/lat image overlay
+  (bounds in the JSON).
+
+Each artifact records a stamp of its inputs (export mtime, richness table,
+palette). A refresh only queues years whose stamp is missing or outdated, so
+a newly arrived (or re-exported) year is processed on its own and the series
+is assembled from the per-year files.
+"""
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from folium.utilities import write_png
+
+from biomet.dissolve import load_patches
+from biomet.fragmentation import ffi
+from biomet.paths import BASE_DIR, cache_path
+from biomet.raster import colorize
+from biomet.rasterize import is_pixel_export, pattern_years, rasterize, read_landcover
+
+REGISTRY_FILE = BASE_DIR / "regions.json"
+ARTIFACT_VERSION = 2    # bump when a per-year metric changes, so stored years are rebuilt
+DEFAULT_REGIONS = {
+    "Brazilian Amazon": {
+        "folder": "Biodiversity_brazil", "pattern": "BrazilAmazon_{year}.geojson",
+        "center": [-3.5, -62.0], "zoom": 5, "pixel_ids": True,
+        "site": "Brazil",                   # rasterize.SITES entry with a prebuilt class stack
+        "richness_file": "Paris/processed_species_iucn_gbif_results_center.csv",
+    },
+}
+
+
+def _write_atomic(path, data):
+    """Write ``data`` (bytes) to a unique temporary file next to ``path``, then replace ``path``."""
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+# --- Registry ---
+_registry_lock = threading.Lock()
+
+
+@contextmanager
+def _locked_registry(timeout=10.0, stale=60.0):
+    """Hold the registry lock: a thread lock plus an exclusive lock file for other processes."""
+    lock = REGISTRY_FILE.with_name(REGISTRY_FILE.name + ".lock")
+    with _registry_lock:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                # A lock left behind by a crashed process is taken over
+                try:
+                    if time.time() - lock.stat().st_mtime > stale:
+                        lock.unlink(missing_ok=True)
+                        continue
+                except FileNotFoundError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Region registry is locked ({lock})")
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            lock.unlink(missing_ok=True)
+
+
+def _resolve(path):
+    path = Path(path)
+    return path if path.is_absolute() else BASE_DIR / path
+
+
+def slug(name):
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+
+def load_registry():
+    """``{name: config}`` of the built-in regions plus the registered ones."""
+    regions = {k: dict(v, name=k) for k, v in DEFAULT_REGIONS.items()}
+    if REGISTRY_FILE.exists():
+        regions.update({k: dict(v, name=k) for k, v in json.loads(REGISTRY_FILE.read_text()).items()})
+    return regions
+
+
+def region_years(cfg):
+    """Years with an export in the region folder, from the ``{year}`` pattern."""
+    return pattern_years(_resolve(cfg["folder"]), cfg["pattern"])
+
+
+def year_file(cfg, year):
+    return _resolve(cfg["folder"]) / cfg["pattern"].format(year=year)
+
+
+def register_region(name, folder, pattern, center, zoom=6, richness_file=None):
+    """Validate a region folder and add it to the registry; returns its config."""
+    name = name.strip()
+    if not name:
+        raise ValueError("Region name is required")
+    if name in load_registry():
+        raise ValueError(f"Region '{name}' already exists")
+    if "{year}" not in pattern:
+        raise ValueError("File pattern must contain {year}, e.g. MyRegion_{year}.geojson")
+    if not _resolve(folder).is_dir():
+        raise ValueError(f"Folder not found: {folder}")
+    if richness_file and not _resolve(richness_file).exists():
+        raise ValueError(f"Richness table not found: {richness_file}")
+    cfg = {"folder": str(folder), "pattern": pattern, "center": [float(c) for c in center],
+           "zoom": int(zoom), "richness_file": richness_file or None}
+    years = region_years(cfg)
+    if not years:
+        raise ValueError(f"No files matching {pattern} in {folder}")
+    import geopandas as gpd
+    cfg["pixel_ids"] = is_pixel_export(gpd.read_file(year_file(cfg, years[0]), rows=100))
+
+    with _locked_registry():
+        # Re-read under the lock so a concurrent registration is kept
+        stored = json.loads(REGISTRY_FILE.read_text()) if REGISTRY_FILE.exists() else {}
+        if name in stored:
+            raise ValueError(f"Region '{name}' already exists")
+        stored[name] = cfg
+        _write_atomic(REGISTRY_FILE, json.dumps(stored, indent=2).encode())
+    return dict(cfg, name=name)
+
+
+# --- Per-year artifacts ---
+def _artifact(cfg, year, ext):
+    return cache_path("regions", slug(cfg["name"]), f"{year}.{ext}")
+
+
+def _stamp(cfg, year, colors):
+    src = year_file(cfg, year)
+    rich = cfg.get("richness_file")
+    rich_mtime = _resolve(rich).stat().st_mtime_ns if rich and _resolve(rich).exists() else None
+    return {"version": ARTIFACT_VERSION, "source": str(src), "mtime_ns": src.stat().st_mtime_ns,
+            "richness_mtime_ns": rich_mtime, "pixel_ids": bool(cfg.get("pixel_ids", False)),
+            "palette": sorted((int(k), list(v)) for k, v in colors.items())}
+
+
+def _richness(cfg, year):
+    rich = cfg.get("richness_file")
+    if not rich or not _resolve(rich).exists():
+        return None
+    df = pd.read_csv(_resolve(rich))
+    row = df[df["Year"] == year]
+    return float(row["Richness"].iloc[0]) if not row.empty else None
+
+
+def build_year(cfg, year, colors):
+    """Compute and store the artifacts of one region year; returns the JSON record."""
+    path = year_file(cfg, year)
+    stamp = _stamp(cfg, year, colors)
+    patches = load_patches(path)
+    record = {"year": year, "stamp": stamp, "ffi": None, "patches": 0, "class_areas": {},
+              "richness": _richness(cfg, year), "bounds": None}
+    if patches is not None:
+        # Same definition as the site fragmentation tables (mean patch FFI, 0-1)
+        record["ffi"] = round(float(ffi(patches["shape_index"]).mean()), 3)
+        record["patches"] = len(patches)
+        areas = patches.groupby("code")["area_ha"].sum()
+        record["class_areas"] = {str(int(c)): float(a) for c, a in areas.items()}
+    gdf = read_landcover(path, cfg.get("pixel_ids", False))
+    if gdf is not None:
+        grid, bounds = rasterize({year: gdf}, cfg.get("pixel_ids", False)).lonlat_grid(year)
+        grid = np.where(np.isin(grid, list(colors)), grid, 0)
+        _write_atomic(_artifact(cfg, year, "png"), write_png(colorize(grid, colors)))
+        record["bounds"] = [float(b) for b in bounds]
+    # Written last: its presence means the year is complete
+    _write_atomic(_artifact(cfg, year, "json"), json.dumps(record).encode())
+    return record
+
+
+def load_year(cfg, year):
+    path = _artifact(cfg, year, "json")
+    return json.loads(path.read_text()) if path.exists() else None
+
+
+def overlay_png(cfg, year):
+    """Path of the pre-rendered class map of a year, or None."""
+    path = _artifact(cfg, year, "png")
+    return path if path.exists() else None
+
+
+def stale_years(cfg, colors):
+    """Years whose export has no artifacts yet or changed since they were built."""
+    out = []
+    for year in region_years(cfg):
+        rec = load_year(cfg, year)
+        if rec is None or rec["stamp"] != json.loads(json.dumps(_stamp(cfg, year, colors))):
+            out.append(year)
+    return out
+
+
+def series(cfg):
+    """Year / FFI / Richness / Patches for every processed year."""
+    recs = [r for y in region_years(cfg) if (r := load_year(cfg, y)) is not None]
+    return pd.DataFrame({"Year": [r["year"] for r in recs], "FFI": [r["ffi"] for r in recs],
+                         "Richness": [r["richness"] for r in recs], "Patches": [r["patches"] for r in recs]},
+                        columns=["Year", "FFI", "Richness", "Patches"])
+
+
+def class_area_table(cfg):
+    """Class x year area (ha) of the processed years."""
+    recs = [r for y in region_years(cfg) if (r := load_year(cfg, y)) is not None]
+    cols = {r["year"]: pd.Series({int(c): a for c, a in r["class_areas"].items()}, dtype=float) for r in recs}
+    return pd.DataFrame(cols).fillna(0).sort_index()
+
+
+# --- Background pipeline ---
+class RegionPipeline:
+    """Background worker building region-year artifacts, one job per stale year."""
+
+    def __init__(self, colors, max_workers=1):
+        self.colors = colors
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="regions")
+        self._pending = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def submit(self, cfg, year):
+        key = (cfg["name"], year)
+        with self._lock:
+            fut = self._pending.get(key)
+            if fut is None:
+                self._errors.pop(key, None)
+                fut = self._executor.submit(build_year, cfg, year, self.colors)
+                fut.add_done_callback(lambda f, k=key: self._done(k, f))
+                self._pending[key] = fut
+            return fut
+
+    def _done(self, key, fut):
+        with self._lock:
+            self._pending.pop(key, None)
+            if fut.exception() is not None:
+                self._errors[key] = f"{type(fut.exception()).__name__}: {fut.exception()}"
+
+    def refresh(self, cfg):
+        """Queue the region's stale years (only new or changed exports); returns them."""
+        years = [y for y in stale_years(cfg, self.colors) if (cfg["name"], y) not in self._errors]
+        for y in years:
+            self.submit(cfg, y)
+        return years
+
+    def pending(self, cfg):
+        with self._lock:
+            return sorted(y for (n, y) in self._pending if n == cfg["name"])
+
+    def errors(self, cfg):
+        with self._lock:
+            return {y: msg for (n, y), msg in self._errors.items() if n == cfg["name"]}
+
+    def retry(self, cfg):
+        with self._lock:
+            for key in [k for k in self._errors if k[0] == cfg["name"]]:
+                del self._errors[key]
+        return self.refresh(cfg)
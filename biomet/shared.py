@@ -0,0 +1,114 @@
+"""Read-only datasets shared by every session and server process.
+
+Immutable inputs (CSV tables, workbook sheets, land-cover GeoJSON) are
+converted once per host into uncompressed Arrow IPC files under
+``.biomet_cache/shared`` and memory-mapped on read. The bytes then sit once
+in the OS page cache however many sessions or server processes attach, and
+numeric columns come back as zero-copy, read-only views.
+
+Each process keeps one mapped ``pyarrow.Table`` per file
+(``st.cache_resource``); every call hands out a fresh DataFrame over it, so
+pages can keep adding derived columns without touching the shared data.
+Mapped numeric columns are read-only: writing into them in place raises, so
+``.copy()`` first where a table has to be edited. Conversions are
+keyed on the source's path, size and mtime and are published with an atomic
+rename, so concurrent workers never read a half-written file and an edited
+source is picked up on the next call.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+
+from biomet.paths import cache_path
+
+
+def _key(src, tag):
+    info = os.stat(src)
+    raw = f"{os.path.abspath(src)}|{info.st_size}|{info.st_mtime_ns}|{tag}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+
+def _arrow_safe(df):
+    """Object columns Arrow cannot type (mixed numbers and text) are kept as text."""
+    out = {}
+    for col in df.columns[df.dtypes == object]:
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            out[col] = df[col].map(lambda v: v if pd.isna(v) else str(v))
+    return df.assign(**out) if out else df
+
+
+def _publish(write, dst):
+    """Run ``write(tmp_path)`` and atomically move the result to ``dst``."""
+    fd, tmp = tempfile.mkstemp(dir=dst.parent, suffix=".tmp")
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _write_table(df, path):
+    table = pa.Table.from_pandas(_arrow_safe(df))
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+@st.cache_resource(show_spinner=False)
+def _mapped(path):
+    # One memory map per file and process; pyarrow Tables are immutable
+    return pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+
+
+def _to_frame(table):
+    return table.to_pandas(split_blocks=True)
+
+
+def frame(src, reader=pd.read_csv, **kwargs):
+    """``reader(src, **kwargs)`` as a DataFrame backed by the shared mapped copy."""
+    tag = f"{reader.__module__}.{reader.__qualname__}|{sorted(kwargs.items())!r}"
+    dst = cache_path("shared", f"{os.path.basename(src)}-{_key(src, tag)}.arrow")
+    if not dst.exists():
+        _publish(lambda tmp: _write_table(reader(src, **kwargs), tmp), dst)
+    return _to_frame(_mapped(dst))
+
+
+def workbook(src):
+    """Every sheet of an Excel workbook, like ``pd.read_excel(src, sheet_name=None)``."""
+    stem = cache_path("shared", f"{os.path.basename(src)}-{_key(src, 'workbook')}")
+    index = stem.with_name(f"{stem.name}.json")
+    if not index.exists():
+        sheets = pd.read_excel(src, sheet_name=None)
+        for n, df in enumerate(sheets.values()):
+            _publish(lambda tmp, df=df: _write_table(df, tmp), stem.with_name(f"{stem.name}-{n}.arrow"))
+        _publish(lambda tmp: Path(tmp).write_text(json.dumps(list(sheets))), index)
+    names = json.loads(index.read_text())
+    return {name: _to_frame(_mapped(stem.with_name(f"{stem.name}-{n}.arrow"))) for n, name in enumerate(names)}
+
+
+@st.cache_resource(show_spinner=False)
+def _geoframe(dst):
+    import geopandas as gpd
+    return gpd.read_feather(dst)
+
+
+def geoframe(src, **kwargs):
+    """``gpd.read_file(src)`` parsed once per host (GeoArrow) and once per process.
+
+    Geometries have to be Python objects, so each process holds one copy;
+    callers get a shallow copy of it.
+    """
+    import geopandas as gpd
+    dst = cache_path("shared", f"{os.path.basename(src)}-{_key(src, repr(sorted(kwargs.items())))}.arrow")
+    if not dst.exists():
+        _publish(lambda tmp: gpd.read_file(src, **kwargs).to_feather(tmp), dst)
+    return _geoframe(dst).copy(deep=False)
@@ -0,0 +1,161 @@
+"""Sparse storage of the wide taxonomic-family count blocks.
+
+``LA_Fire_Readiness.csv`` and the MOH ``{position}.csv`` tables carry a few
+dozen climate / land-cover columns followed by hundreds of per-family
+observation counts that are mostly zero. ``FamilyTable`` keeps the context
+columns dense and the family block as a CSR matrix, and is cached on disk as
+a single ``.npz`` next to the other derived artifacts.
+"""
+import hashlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from biomet.loaders import load_files
+from biomet.paths import cache_path
+
+LAND_COVER_COLUMNS = {
+    "Evergreen needleleaf forest", "Evergreen broadleaf forest", "Deciduous needleleaf forest",
+    "Deciduous broadleaf forest", "Mixed forest", "Wooded grassland", "Other wooded land",
+    "Open shrubland", "Savanna", "Grassland", "Permanent wetlands", "Cropland",
+    "Urban and built-up", "Cropland/natural vegetation mosaic", "Snow and ice",
+    "Barren or sparsely vegetated", "Water", "Urban areas",
+}
+CACHE_FORMAT = 2   # bump when the .npz layout changes, so older caches are rebuilt
+CONTEXT_COLUMNS = LAND_COVER_COLUMNS | {
+    "Month", "Date", "Fire Area (m2)", "Fire Readiness (%)", "Population",
+    "Vegetation Count", "Regional Fuel Content",
+}
+
+
+def is_family_column(name):
+    return name not in CONTEXT_COLUMNS and not name.startswith(("Max ", "Min ", "Avg "))
+
+
+class FamilyTable:
+    """Dense context columns + sparse (rows x families) counts, rows keyed by (date, key)."""
+
+    def __init__(self, dense, counts, families, keys=None):
+        self.dense = dense                      # DataFrame indexed by month
+        self.counts = sp.csr_matrix(counts, dtype=np.float32)
+        self.families = list(families)
+        self.keys = np.asarray(keys if keys is not None else [""] * len(dense), dtype=str)
+
+    @property
+    def nbytes(self):
+        c = self.counts
+        return int(self.dense.memory_usage(deep=True).sum()
+                   + c.data.nbytes + c.indices.nbytes + c.indptr.nbytes)
+
+    # --- Aggregations ---
+    def totals_per_row(self):
+        """Total family observations per (date, key) row."""
+        return pd.Series(np.asarray(self.counts.sum(axis=1)).ravel(), index=self.dense.index)
+
+    def totals_per_family(self, rows=None):
+        c = self.counts if rows is None else self.counts[rows]
+        return pd.Series(np.asarray(c.sum(axis=0)).ravel(), index=self.families)
+
+    def group_totals(self, by):
+        """(groups x families) sums for an array of row labels, via one sparse product."""
+        codes, uniques = pd.factorize(np.asarray(by))
+        G = sp.csr_matrix((np.ones(len(codes), np.float32), (codes, np.arange(len(codes)))),
+                          shape=(len(uniques), len(codes)))
+        return pd.DataFrame((G @ self.counts).toarray(), index=uniques, columns=self.families)
+
+    def family_frame(self, families):
+        """Dense frame of just the requested family columns."""
+        idx = [self.families.index(f) for f in families]
+        return pd.DataFrame(self.counts[:, idx].toarray(), index=self.dense.index, columns=families)
+
+    def to_frame(self):
+        """Fully dense frame (model inputs); avoid for display paths."""
+        fam = pd.DataFrame(self.counts.toarray(), index=self.dense.index, columns=self.families)
+        return pd.concat([self.dense, fam], axis=1)
+
+    # --- Storage ---
+    def save(self, path):
+        c = self.counts
+        numeric = [col for col in self.dense.columns
+                   if pd.api.types.is_numeric_dtype(self.dense[col]) or pd.api.types.is_bool_dtype(self.dense[col])]
+        text = [col for col in self.dense.columns if col not in numeric]
+        texts = self.dense[text].astype(object)
+        np.savez_compressed(
+            path, data=c.data, indices=c.indices, indptr=c.indptr, shape=np.array(c.shape),
+            families=np.array(self.families, dtype=str), keys=self.keys,
+            index=self.dense.index.values,
+            dense=self.dense[numeric].to_numpy(np.float64), dense_columns=np.array(numeric, dtype=str),
+            # Original dtypes, restored on load so cached and parsed tables match
+            dense_dtypes=np.array([str(self.dense[col].dtype) for col in numeric], dtype=str),
+            text=texts.fillna("").to_numpy(dtype=str).reshape(len(texts), len(text)),
+            text_missing=texts.isna().to_numpy(bool), text_columns=np.array(text, dtype=str),
+            column_order=np.array(list(self.dense.columns), dtype=str),
+        )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as z:
+            counts = sp.csr_matrix((z["data"], z["indices"], z["indptr"]), shape=tuple(z["shape"]))
+            index = pd.DatetimeIndex(z["index"], name="Date")
+            dense = pd.DataFrame(z["dense"], columns=list(z["dense_columns"]), index=index)
+            dense = dense.astype(dict(zip(z["dense_columns"], z["dense_dtypes"])))
+            text = pd.DataFrame(z["text"].astype(object), columns=list(z["text_columns"]), index=index)
+            text = text.mask(z["text_missing"].astype(bool))
+            dense = pd.concat([dense, text], axis=1)[list(z["column_order"])]
+            return cls(dense, counts, list(z["families"]), z["keys"])
+
+
+def clean_feature_name(name):
+    """``"('Asteraceae',)"`` -> ``"Asteraceae"``; other names unchanged."""
+    name = str(name)
+    return name[2:-3] if name.startswith("('") and name.endswith("',)") else name
+
+
+def from_csv(path, key=""):
+    return from_frame(pd.read_csv(path), key)
+
+
+def from_frame(df, key=""):
+    date_col = "Date" if "Date" in df.columns else "Month"
+    df = df.dropna(subset=[date_col])
+    df.index = pd.DatetimeIndex(pd.to_datetime(df[date_col]).dt.to_period("M").dt.to_timestamp(), name="Date")
+    df.columns = [clean_feature_name(c) for c in df.columns]
+    fam = [c for c in df.columns if is_family_column(c)]
+    counts = sp.csr_matrix(df[fam].apply(pd.to_numeric, errors="coerce").fillna(0).to_numpy(np.float32))
+    dense = df.drop(columns=fam + [c for c in ("Month", "Date") if c in df.columns])
+    return FamilyTable(dense, counts, fam, [key] * len(df))
+
+
+def concat(tables):
+    """Stack tables row-wise, aligning the union of their families."""
+    families = sorted(set().union(*(t.families for t in tables)))
+    col = {f: i for i, f in enumerate(families)}
+    blocks = []
+    for t in tables:
+        c = t.counts.tocoo()
+        remap = np.array([col[f] for f in t.families], dtype=np.int64)
+        blocks.append(sp.csr_matrix((c.data, (c.row, remap[c.col])), shape=(c.shape[0], len(families))))
+    return FamilyTable(pd.concat([t.dense for t in tables]), sp.vstack(blocks).tocsr(),
+                       families, np.concatenate([t.keys for t in tables]))
+
+
+def load_family_table(paths):
+    """Load one CSV, or a {key: path} mapping of per-cell CSVs, through the npz cache."""
+    if not isinstance(paths, dict):
+        paths = {"": paths}
+    requested = {k: Path(p) for k, p in paths.items()}
+    paths = {k: p for k, p in requested.items() if p.exists()}
+    if not paths:
+        raise FileNotFoundError("No family table found: " + ", ".join(str(p) for p in requested.values()))
+    stamp = f"v{CACHE_FORMAT}|" + "|".join(f"{k}:{p}:{p.stat().st_mtime_ns}" for k, p in sorted(paths.items()))
+    cached = cache_path("families", hashlib.sha1(stamp.encode()).hexdigest()[:16] + ".npz")
+    if cached.exists():
+        return FamilyTable.load(cached)
+    # Per-cell files are read concurrently, then converted in key order
+    loaded = load_files(paths)
+    loaded.raise_for_errors()
+    table = concat([from_frame(df, k) for k, df in loaded.items()])
+    table.save(cached)
+    return table
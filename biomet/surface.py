@@ -0,0 +1,192 @@
+"""Continuous fire-readiness surfaces from the coarse LA readiness grid.
+
+The readiness matrix has one value per 0.045° cell and month. Every pixel
+of a finer lon/lat raster (``RES`` degrees) is interpolated from its ``K``
+nearest cell centres by inverse-distance weighting. The neighbours and
+weights depend only on the geometry, so they are found once with a
+``cKDTree`` and kept as a sparse ``pixels x cells`` matrix. All months are
+then a single sparse product with the ``months x cells`` matrix.
+
+Water pixels (the LA class stack's water and wetland classes) and pixels
+farther than one cell from any cell centre are left empty (NaN). The
+``months x rows x cols`` float32 result is stored under
+``.biomet_cache/surfaces``, keyed on the matrix contents and the
+parameters, and memory-mapped on later loads. Showing a month is then one
+colour lookup of one stored slice.
+
+    python -m biomet.surface --res 0.0025
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.spatial import cKDTree
+
+from biomet.grid import GRID_SIZE_DEG, cells_from_columns
+from biomet.paths import BASE_DIR, cache_path
+from biomet.raster import image_overlay, open_grid
+from biomet.rasterize import ensure_class_stack
+
+RES = 0.0025                 # raster pixel size (degrees)
+K = 8                        # neighbouring cells per pixel
+POWER = 2.0                  # IDW distance exponent
+WATER_CLASSES = {11, 17}     # Permanent wetlands, Water
+# Same ramp as the grid layer of the fire page (yellow -> red)
+RAMP = ((255, 255, 0), (255, 0, 0))
+
+
+def pixel_centers(bounds, res):
+    """``(lon, lat)`` 2-D arrays of the pixel centres of a lon/lat raster (row 0 = north)."""
+    west, south, east, north = bounds
+    cols, rows = int(round((east - west) / res)), int(round((north - south) / res))
+    lon = west + (np.arange(cols) + 0.5) * (east - west) / cols
+    lat = north - (np.arange(rows) + 0.5) * (north - south) / rows
+    return np.meshgrid(lon, lat)
+
+
+def idw_weights(cell_lon, cell_lat, lon, lat, k=K, power=POWER, max_dist=GRID_SIZE_DEG):
+    """Sparse ``pixels x cells`` IDW weights and the pixels within ``max_dist`` of a cell.
+
+    Distances are in degrees of latitude, with longitude scaled by the cosine
+    of the mean latitude.
+    """
+    scale = np.cos(np.radians(np.mean(cell_lat)))
+    tree = cKDTree(np.column_stack([np.asarray(cell_lon) * scale, cell_lat]))
+    k = min(k, len(cell_lon))
+    dist, idx = tree.query(np.column_stack([lon.ravel() * scale, lat.ravel()]), k=k)
+    dist, idx = dist.reshape(-1, k), idx.reshape(-1, k)
+    w = 1.0 / np.maximum(dist, 1e-9) ** power
+    w /= w.sum(axis=1, keepdims=True)
+    rows = np.repeat(np.arange(len(w)), k)
+    weights = sp.csr_matrix((w.ravel(), (rows, idx.ravel())), shape=(len(w), len(cell_lon)))
+    return weights, dist[:, 0] <= max_dist
+
+
+def water_mask(stack, lon, lat, year=None):
+    """True where the class stack has water at the pixel centres (False outside the stack)."""
+    grid, (west, south, east, north) = stack.lonlat_grid(stack.years[-1] if year is None else year)
+    rows, cols = grid.shape
+    c = np.floor((lon - west) / (east - west) * cols).astype(np.int64)
+    r = np.floor((north - lat) / (north - south) * rows).astype(np.int64)
+    inside = (c >= 0) & (c < cols) & (r >= 0) & (r < rows)
+    out = np.zeros(lon.shape, dtype=bool)
+    out[inside] = np.isin(grid[r[inside], c[inside]], list(WATER_CLASSES))
+    return out
+
+
+class ReadinessSurface:
+    """``months x rows x cols`` interpolated readiness (NaN = masked) over ``bounds``."""
+
+    def __init__(self, surfaces, dates, bounds):
+        self.surfaces = surfaces
+        self.dates = pd.DatetimeIndex(dates)
+        self.bounds = tuple(bounds)    # (west, south, east, north)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def month(self, date):
+        """Surface of one month, or None if the month is not in the matrix."""
+        i = self.dates.get_indexer([pd.Timestamp(date)])[0]
+        return None if i < 0 else np.asarray(self.surfaces[i])
+
+    def rgba(self, date, vmin=0, vmax=100, alpha=255):
+        """RGBA image of one month on the ``RAMP`` colour scale; masked pixels transparent."""
+        grid = self.month(date)
+        if grid is None:
+            return None
+        t = np.clip((np.nan_to_num(grid, nan=vmin) - vmin) / (vmax - vmin), 0, 1)[..., None]
+        lo, hi = np.array(RAMP, dtype=float)
+        out = np.empty(grid.shape + (4,), dtype=np.uint8)
+        out[..., :3] = np.rint(lo + (hi - lo) * t)
+        out[..., 3] = np.where(np.isnan(grid), 0, alpha)
+        return out
+
+    def overlay(self, date, name="Readiness Surface", vmin=0, vmax=100, **kwargs):
+        """``ImageOverlay`` of one month, or None."""
+        img = self.rgba(date, vmin, vmax)
+        return None if img is None else image_overlay(img, self.bounds, name=name, **kwargs)
+
+
+def _publish(dst, write):
+    """Run ``write(file)`` on a unique temporary file next to ``dst``, then atomically replace ``dst``."""
+    fd, tmp = tempfile.mkstemp(dir=dst.parent, prefix=dst.stem + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            write(fh)
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _key(matrix, cells, params):
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(matrix[cells["cell"]].to_numpy(np.float64)).tobytes())
+    h.update(pd.DatetimeIndex(matrix["Date"]).asi8.tobytes())
+    h.update(json.dumps(params, sort_keys=True).encode())
+    return h.hexdigest()[:16]
+
+
+def build_surface(matrix, res=RES, k=K, power=POWER, stack=None, mask_water=True):
+    """Interpolated readiness of every month of a ``Date x cell`` matrix (stored, then mapped).
+
+    ``stack`` defaults to the LA class stack; ``mask_water=False`` keeps water pixels.
+    """
+    cells = cells_from_columns(matrix.columns)
+    half = GRID_SIZE_DEG / 2
+    bounds = (cells["lon"].min() - half, cells["lat"].min() - half,
+              cells["lon"].max() + half, cells["lat"].max() + half)
+    if mask_water and stack is None:
+        stack = ensure_class_stack("LA")
+    params = {"res": res, "k": k, "power": power,
+              "stack": list(stack.transform) + stack.years if mask_water else None}
+    stem = cache_path("surfaces", f"readiness-{_key(matrix, cells, params)}")
+    meta_path = stem.with_suffix(".json")
+    if meta_path.exists():
+        meta = json.loads(meta_path.read_text())
+        return ReadinessSurface(open_grid(stem.with_suffix(".npy")), meta["dates"], meta["bounds"])
+
+    lon, lat = pixel_centers(bounds, res)
+    weights, reach = idw_weights(cells["lon"].to_numpy(), cells["lat"].to_numpy(), lon, lat, k, power)
+    if mask_water:
+        reach &= ~water_mask(stack, lon, lat).ravel()
+    values = matrix[cells["cell"]].to_numpy(np.float64)
+    ok = ~np.isnan(values)
+    # Missing cell values drop out of a pixel's weights for that month
+    num = weights @ np.where(ok, values, 0).T
+    den = weights @ ok.T.astype(np.float64)
+    out = np.full(num.shape, np.nan, dtype=np.float32)
+    keep = reach[:, None] & (den > 0)
+    out[keep] = (num / np.where(den > 0, den, 1))[keep]
+    surfaces = np.ascontiguousarray(out.T.reshape(len(values), *lon.shape))
+    _publish(stem.with_suffix(".npy"), lambda fh: np.save(fh, surfaces))
+    dates = [d.isoformat() for d in pd.DatetimeIndex(matrix["Date"])]
+    # Written last: its presence marks a complete entry
+    meta = json.dumps({"dates": dates, "bounds": bounds, **params}).encode()
+    _publish(meta_path, lambda fh: fh.write(meta))
+    return ReadinessSurface(open_grid(stem.with_suffix(".npy")), dates, bounds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Interpolate LA fire readiness to continuous surfaces")
+    parser.add_argument("--res", type=float, default=RES, help="pixel size (degrees)")
+    parser.add_argument("--k", type=int, default=K, help="neighbouring cells per pixel")
+    parser.add_argument("--power", type=float, default=POWER, help="IDW distance exponent")
+    args = parser.parse_args()
+    matrix = pd.read_csv(BASE_DIR / "LA" / "Annual_Fire_Readiness.csv", parse_dates=["Date"])
+    t0 = time.perf_counter()
+    surface = build_surface(matrix, args.res, args.k, args.power)
+    n, rows, cols = surface.surfaces.shape
+    valid = np.isfinite(surface.surfaces[0]).mean()
+    print(f"{n} months x {rows} x {cols} px ({valid:.0%} valid) in {time.perf_counter() - t0:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
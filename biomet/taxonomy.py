@@ -0,0 +1,150 @@
+"""Synonym-aware taxonomic matching of occurrence tables against invasive registers.
+
+Names are reduced to a normalized binomial key (``normalize``): lower-case
+``genus epithet`` with author strings, ranks below species, hybrid marks and
+stray whitespace dropped, so ``"Ailanthus altissima (Mill.) Swingle"`` and
+``"ailanthus  altissima"`` meet on ``"ailanthus altissima"``. Genus-only
+names (``"Agrostis L."``) get no key and never match.
+
+``TaxonIndex`` compiles the registers (``Invasives/registers/*.csv`` plus
+the GISD export in ``MOH``) and the synonym table (``Invasives/synonyms.csv``,
+``synonym,accepted``) into a hashed ``pd.Index`` of accepted keys. Both sides
+are resolved through the synonyms before the lookup. Matching works on the
+categories of a categorical species column, so each distinct name is
+normalized and looked up once however many occurrence rows carry it.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from biomet.paths import BASE_DIR
+
+INVASIVES_DIR = BASE_DIR / "Invasives"
+SYNONYMS_FILE = INVASIVES_DIR / "synonyms.csv"
+# Register name -> CSV with one scientific name per row; any CSV dropped into
+# Invasives/registers is picked up under its file stem
+EXTRA_REGISTERS = {"gisd": BASE_DIR / "MOH" / "Invasive_Species_Info.csv"}
+NAME_COLUMNS = ("Scientific Name", "ScientificName", "scientific_name", "Species Name")
+
+_BINOMIAL = re.compile(r"^\s*([A-Za-z][a-z-]+)\s+(?:×\s*|x\s+)?([a-z][a-z-]+)")
+
+
+def normalize(names):
+    """Normalized ``genus epithet`` key per name (NaN where there is no binomial)."""
+    s = pd.Series(names, dtype=object).astype("string")
+    s = s.str.replace("\xa0", " ", regex=False).str.replace("\xad", "", regex=False)
+    parts = s.str.extract(_BINOMIAL)
+    return (parts[0].str.lower() + " " + parts[1].str.lower()).astype(object)
+
+
+def _name_column(df):
+    for col in NAME_COLUMNS:
+        if col in df.columns:
+            return col
+    raise ValueError(f"No scientific-name column in register (expected one of {', '.join(NAME_COLUMNS)})")
+
+
+def register_files():
+    """``{register name: path}`` of every available register."""
+    files = {p.stem: p for p in sorted((INVASIVES_DIR / "registers").glob("*.csv"))}
+    files.update({k: p for k, p in EXTRA_REGISTERS.items() if p.exists()})
+    return files
+
+
+class TaxonIndex:
+    """Accepted-name keys of one or more registers, with a synonym resolver."""
+
+    def __init__(self, registers, synonyms=None):
+        """``registers``: ``{name: iterable of scientific names}``; ``synonyms``: ``{synonym: accepted}``."""
+        syn = pd.Series(synonyms or {}, dtype=object)
+        self.synonyms = pd.Series(normalize(syn.values).values, index=normalize(syn.index).values).dropna()
+        self.synonyms = self.synonyms[~self.synonyms.index.duplicated()]
+        rows = []
+        for reg, names in registers.items():
+            names = pd.Series(list(names), dtype=object)
+            rows.append(pd.DataFrame({"key": self.resolve(normalize(names)).values, "register": reg}))
+        table = pd.concat(rows, ignore_index=True).dropna(subset=["key"]) if rows else \
+            pd.DataFrame(columns=["key", "register"])
+        grouped = table.groupby("key", sort=True)
+        self.keys = pd.Index(grouped.size().index)
+        # Display name: the accepted binomial, without author strings
+        self.names = grouped["key"].first().str.capitalize().to_numpy(dtype=object)
+        self.registers = grouped["register"].agg(lambda r: ", ".join(sorted(set(r)))).to_numpy(dtype=object)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def resolve(self, keys):
+        """Accepted key for each normalized key (keys without a synonym pass through)."""
+        keys = pd.Series(keys, dtype=object)
+        accepted = keys.map(self.synonyms)
+        return accepted.where(accepted.notna(), keys)
+
+    def lookup(self, names):
+        """Position in the index for each name, -1 where it is not listed."""
+        return self.keys.get_indexer(self.resolve(normalize(names)))
+
+    def match(self, names):
+        """``Invasive Name`` / ``Registers`` per row of ``names`` (NaN where not listed).
+
+        Only the distinct names (the categories) are normalized and looked up;
+        rows are mapped back through the category codes.
+        """
+        cat = pd.Categorical(names)
+        pos = self.lookup(cat.categories)
+        hit = np.r_[pos, -1][cat.codes]           # code -1 (missing name) -> not listed
+        found = hit >= 0
+        out = pd.DataFrame({"Invasive Name": np.full(len(hit), np.nan, dtype=object),
+                            "Registers": np.full(len(hit), np.nan, dtype=object)},
+                           index=getattr(names, "index", None))
+        out.loc[found, "Invasive Name"] = self.names[hit[found]]
+        out.loc[found, "Registers"] = self.registers[hit[found]]
+        return out
+
+
+def load_index(registers=None):
+    """``TaxonIndex`` of the named registers (default: all) with the local synonym table."""
+    files = register_files()
+    unknown = set(registers or ()) - set(files)
+    if unknown:
+        raise ValueError(f"Unknown invasive register(s): {', '.join(sorted(unknown))}")
+    names = {}
+    for reg in registers or files:
+        df = pd.read_csv(files[reg])
+        names[reg] = df[_name_column(df)].dropna()
+    synonyms = None
+    if SYNONYMS_FILE.exists():
+        syn = pd.read_csv(SYNONYMS_FILE).dropna()
+        synonyms = dict(zip(syn["synonym"], syn["accepted"]))
+    return TaxonIndex(names, synonyms)
+
+
+def invasive_occurrences(tables, index, name_col="Species Name"):
+    """Rows of per-position species tables whose taxon is listed in ``index``.
+
+    ``tables`` is ``{position: DataFrame}``; returns those rows with
+    ``Position``, ``Invasive Name`` and ``Registers`` added, whatever their
+    observation counts.
+    """
+    frames = [df.assign(Position=pos) for pos, df in tables.items() if name_col in df.columns]
+    if not frames:
+        return pd.DataFrame(columns=["Position", name_col, "Invasive Name", "Registers"])
+    occ = pd.concat(frames, ignore_index=True)
+    occ[name_col] = occ[name_col].astype("category")
+    hits = index.match(occ[name_col])
+    return occ.loc[hits["Invasive Name"].notna()].join(hits)
+
+
+def invasive_detections(occurrences, name_col="Species Name"):
+    """One row per cell, taxon and year with at least one record, from ``invasive_occurrences``.
+
+    Returns Position / Species Name / Invasive Name / Registers / Year /
+    Observations, read from the ``Observations_<year>`` columns.
+    """
+    cols = ["Position", name_col, "Invasive Name", "Registers", "Year", "Observations"]
+    obs = [c for c in occurrences.columns if c.startswith("Observations_")]
+    long = occurrences.melt(id_vars=cols[:4], value_vars=obs, var_name="Year", value_name="Observations")
+    long["Year"] = long["Year"].str.removeprefix("Observations_").astype(int)
+    long = long[long["Observations"] > 0]
+    return long[cols].sort_values(["Position", "Invasive Name", "Year"], ignore_index=True)
@@ -0,0 +1,170 @@
+"""Client-side year slider over pre-rendered yearly land-cover overlays.
+
+Every year of a series is rendered once into a colour-coded lon/lat PNG
+(``stack_overlays`` for the ``rasterize`` class stacks; onboarded regions
+already have them through ``regions.overlay_png``). ``year_slider_map``
+embeds all of them in one folium map together with a ``YearSlider``
+control, so picking, playing or swiping between years happens entirely in
+the browser: the map is built once, cached, and shown with
+``returned_objects=[]``, so a year switch triggers no rerun.
+
+The control has a year slider, a play button, and a compare mode. In compare
+mode a second year is shown left of a draggable divider and the slider year
+to the right of it.
+"""
+import hashlib
+import json
+
+import folium
+from branca.element import MacroElement
+from folium.template import Template
+from folium.utilities import write_png
+
+from biomet.paths import cache_path
+from biomet.raster import colorize, image_overlay
+
+
+def stack_overlays(site, stack, colors):
+    """``{year: (png path, bounds)}`` of every year of a class stack, rendered once.
+
+    Files are keyed on the stack's years/transform and the palette, so a
+    rebuilt stack or a new palette renders a fresh set.
+    """
+    meta = json.dumps([stack.years, list(stack.transform), sorted((int(k), list(v)) for k, v in colors.items())])
+    tag = hashlib.sha1(meta.encode()).hexdigest()[:12]
+    index = cache_path("overlays", site, f"{tag}.json")
+    if index.exists():
+        return {int(y): (index.with_name(f"{y}-{tag}.png"), b) for y, b in json.loads(index.read_text()).items()}
+    out = {}
+    for year in stack.years:
+        grid, bounds = stack.lonlat_grid(year)
+        png = index.with_name(f"{year}-{tag}.png")
+        png.write_bytes(write_png(colorize(grid, colors)))
+        out[year] = (png, [float(b) for b in bounds])
+    index.write_text(json.dumps({y: b for y, (_, b) in out.items()}))   # written last
+    return out
+
+
+class YearSlider(MacroElement):
+    """Leaflet control switching between yearly ``ImageOverlay`` layers in the browser."""
+
+    _template = Template("""
+        {% macro header(this, kwargs) %}
+        <style>
+            .year-slider {background: #fff; padding: 6px 8px; font: 12px sans-serif; min-width: 220px;}
+            .year-slider input[type=range] {width: 100%;}
+            .ys-swipe {position: absolute; top: 50%; left: 0; width: 100%; margin: 0; z-index: 450;
+                       background: transparent; pointer-events: none; -webkit-appearance: none; appearance: none;}
+            .ys-swipe::-webkit-slider-thumb {pointer-events: auto; -webkit-appearance: none; width: 14px;
+                       height: 40px; background: #fff; border: 1px solid #555; border-radius: 3px; cursor: ew-resize;}
+            .ys-swipe::-moz-range-thumb {pointer-events: auto; width: 14px; height: 40px; background: #fff;
+                       border: 1px solid #555; border-radius: 3px; cursor: ew-resize;}
+            .ys-divider {position: absolute; top: 0; bottom: 0; width: 2px; margin-left: -1px;
+                         background: #fff; box-shadow: 0 0 3px #333; z-index: 440; pointer-events: none;}
+        </style>
+        {% endmacro %}
+
+        {% macro script(this, kwargs) %}
+        (function() {
+            var map = {{ this._parent.get_name() }};
+            var years = {{ this.years|tojson }};
+            var layers = [{% for layer in this.layers %}{{ layer.get_name() }},{% endfor %}];
+            var opacity = {{ this.opacity|tojson }};
+            var state = {year: years.length - 1, base: 0, compare: false, swipe: 0.5, timer: null};
+
+            var ctl = L.control({position: {{ this.position|tojson }}});
+            ctl.onAdd = function() {
+                var div = L.DomUtil.create('div', 'leaflet-bar year-slider');
+                div.innerHTML =
+                    '<div><button type="button" class="ys-play">&#9654;</button> <b class="ys-label"></b></div>' +
+                    '<input type="range" class="ys-year" min="0" max="' + (years.length - 1) + '" step="1">' +
+                    '<label><input type="checkbox" class="ys-compare"> Compare with </label>' +
+                    '<select class="ys-base">' + years.map(function(y, i) {
+                        return '<option value="' + i + '">' + y + '</option>'; }).join('') + '</select>';
+                L.DomEvent.disableClickPropagation(div);
+                L.DomEvent.disableScrollPropagation(div);
+                return div;
+            };
+            ctl.addTo(map);
+            var box = ctl.getContainer();
+            var slider = box.querySelector('.ys-year'), label = box.querySelector('.ys-label');
+            var play = box.querySelector('.ys-play'), compare = box.querySelector('.ys-compare');
+            var base = box.querySelector('.ys-base');
+
+            var swipe = L.DomUtil.create('input', 'ys-swipe', map.getContainer());
+            swipe.type = 'range'; swipe.min = 0; swipe.max = 1; swipe.step = 'any'; swipe.value = state.swipe;
+            var divider = L.DomUtil.create('div', 'ys-divider', map.getContainer());
+            L.DomEvent.on(swipe, 'mousedown touchstart pointerdown dblclick', L.DomEvent.stopPropagation);
+
+            function clip() {
+                var x = map.getSize().x * state.swipe;
+                var cut = map.containerPointToLayerPoint([x, 0]).x;
+                var both = state.compare && state.base !== state.year;
+                divider.style.left = x + 'px';
+                layers.forEach(function(layer, i) {
+                    var img = layer.getElement();
+                    if (!img) { return; }
+                    if (!both) { img.style.clipPath = ''; return; }
+                    var px = cut - L.DomUtil.getPosition(img).x;
+                    img.style.clipPath = i === state.base
+                        ? 'inset(0 ' + Math.max(0, img.clientWidth - px) + 'px 0 0)'
+                        : 'inset(0 0 0 ' + Math.max(0, px) + 'px)';
+                });
+            }
+            function render() {
+                var both = state.compare && state.base !== state.year;
+                layers.forEach(function(layer, i) {
+                    layer.setOpacity(i === state.year || (both && i === state.base) ? opacity : 0);
+                });
+                label.textContent = both ? years[state.base] + ' | ' + years[state.year] : years[state.year];
+                slider.value = state.year;
+                base.value = state.base;
+                swipe.style.display = divider.style.display = both ? '' : 'none';
+                clip();
+            }
+            slider.addEventListener('input', function() { state.year = +slider.value; render(); });
+            base.addEventListener('change', function() { state.base = +base.value; render(); });
+            compare.addEventListener('change', function() { state.compare = compare.checked; render(); });
+            swipe.addEventListener('input', function() { state.swipe = +swipe.value; clip(); });
+            play.addEventListener('click', function() {
+                if (state.timer) {
+                    clearInterval(state.timer); state.timer = null; play.innerHTML = '&#9654;'; return;
+                }
+                play.innerHTML = '&#10073;&#10073;';
+                state.timer = setInterval(function() {
+                    state.year = (state.year + 1) % years.length; render();
+                }, {{ this.interval|tojson }});
+            });
+            map.on('move zoomend viewreset resize', clip);
+            render();
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, years, layers, opacity=0.7, interval=1000, position="bottomleft"):
+        super().__init__()
+        self._name = "YearSlider"
+        self.years = [int(y) for y in years]
+        self.layers = list(layers)
+        self.opacity = opacity
+        self.interval = interval
+        self.position = position
+
+
+def year_slider_map(overlays, location, zoom, opacity=0.7, tiles="CartoDB positron"):
+    """Folium map with every ``{year: (image, bounds)}`` overlay and a ``YearSlider``.
+
+    ``image`` is a PNG path or an RGBA array; all years are embedded, so
+    build the map once and cache it.
+    """
+    m = folium.Map(location=location, zoom_start=zoom, tiles=tiles)
+    years = sorted(overlays)
+    layers = []
+    for year in years:
+        image, bounds = overlays[year]
+        layer = image_overlay(str(image) if not hasattr(image, "shape") else image, bounds,
+                              name=f"Land cover {year}", opacity=opacity)
+        layer.add_to(m)
+        layers.append(layer)
+    YearSlider(years, layers, opacity=opacity).add_to(m)
+    return m
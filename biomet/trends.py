@@ -0,0 +1,214 @@
+"""Observation trends and local declines for every species at once.
+
+The per-position species tables (one count column per year, mostly zero) are stacked into one sparse species x (cell, year) count matrix,
+``SpeciesTensor``. Sampling effort differs between cells and years, so each
+series is fitted as a quasi-Poisson regression with the cell-year total of
+all observations as exposure::
+
+    log E[count] = a + b * (year - mean year) + log(effort)
+
+``b`` is the change in the species' share of the records per year
+(``Trend (%/yr) = exp(b) - 1``). All (species, cell) series are fitted
+together by batched IRLS on 2 x 2 normal equations. The standard error is
+scaled by the Pearson dispersion, and the p-values are corrected for
+multiple testing (Benjamini-Hochberg). ``local_declines`` keeps the
+significant, steep declines in the layout of the ``rapid_decline.csv``
+exports.
+
+    python -m biomet.trends Stanlow --out stanlow_species_declines.csv
+"""
+import argparse
+import re
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.stats import norm
+
+from biomet.loaders import load_positions
+from biomet.rasterize import SITES
+
+YEAR_COLUMN = re.compile(r"(?:Observations_)?(\d{4})")
+MIN_TOTAL = 10            # records of a series before it is fitted
+MIN_YEARS = 3             # years with records of a series before it is fitted
+ALPHA = 0.05              # false-discovery rate of the decline flags
+RAPID_DECLINE_RATE = -0.15  # Trend (%/yr) at or below this (with q < ALPHA) is a rapid decline
+POSITIONS = ["top_left", "top_center", "top_right", "left_center", "center",
+             "right_center", "bottom_left", "bottom_center", "bottom_right"]
+
+
+class SpeciesTensor:
+    """Sparse species x cell x year counts, stored as a (species, cell * n_years + year) CSR."""
+
+    def __init__(self, counts, species, cells, years):
+        self.counts = sp.csr_matrix(counts, dtype=np.float64)
+        self.species = pd.Index(species)
+        self.cells = list(cells)
+        self.years = np.asarray(years, dtype=int)
+
+    @property
+    def shape(self):
+        return len(self.species), len(self.cells), len(self.years)
+
+    @classmethod
+    def from_tables(cls, tables, name_col="Species Name", years=None):
+        """Tensor of ``{cell: species table}``; ``years`` restricts the year columns.
+
+        Year columns are ``Observations_<year>`` or, as in the LA tables, bare ``<year>``.
+        """
+        year_cols = {}
+        for df in tables.values():
+            for c in df.columns:
+                if m := YEAR_COLUMN.fullmatch(c):
+                    year_cols.setdefault(int(m.group(1)), set()).add(c)
+        obs_years = sorted(y for y in year_cols if years is None or y in set(years))
+        cells = list(tables)
+        frames = [df.assign(_cell=k) for k, df in enumerate(tables.values()) if name_col in df.columns]
+        occ = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame({name_col: [], "_cell": []})
+        occ = occ[occ[name_col].notna()]
+        names = occ[name_col].astype("category")
+        vals = np.zeros((len(occ), len(obs_years)))
+        for j, y in enumerate(obs_years):
+            for c in year_cols[y]:
+                if c in occ.columns:
+                    vals[:, j] += pd.to_numeric(occ[c], errors="coerce").fillna(0).to_numpy()
+        r, t = np.nonzero(vals)
+        ny = len(obs_years)
+        # Duplicate (species, cell, year) entries are summed by the COO -> CSR conversion
+        counts = sp.coo_matrix((vals[r, t], (names.cat.codes.to_numpy()[r], occ["_cell"].to_numpy()[r] * ny + t)),
+                               shape=(len(names.cat.categories), len(cells) * ny))
+        return cls(counts.tocsr(), names.cat.categories, cells, obs_years)
+
+    def effort(self):
+        """(cells x years) total records of all species."""
+        return np.asarray(self.counts.sum(axis=0)).reshape(len(self.cells), len(self.years))
+
+    def pooled(self):
+        """Tensor with all cells summed into one ``"all"`` cell."""
+        ns, nc, ny = self.shape
+        pool = sp.csr_matrix((np.ones(nc * ny), (np.arange(nc * ny), np.tile(np.arange(ny), nc))), shape=(nc * ny, ny))
+        return SpeciesTensor(self.counts @ pool, self.species, ["all"], self.years)
+
+
+def fit_trends(y, effort, t, max_iter=25, tol=1e-8):
+    """Batched quasi-Poisson IRLS of ``y`` (series x years) on ``t`` with ``log(effort)`` offset.
+
+    Years without effort are left out of a series. Returns ``(b, se, dispersion)``
+    per series; ``b`` is the log-linear slope.
+    """
+    m = (effort > 0).astype(float)
+    off = np.log(np.where(effort > 0, effort, 1.0))
+    mu = (y + 0.5) * m + (1 - m)
+    eta = np.log(mu)
+    b = np.zeros(len(y))
+    for _ in range(max_iter):
+        z = eta - off + (y - mu) / mu
+        w = mu * m
+        sw, st, stt = w.sum(1), (w * t).sum(1), (w * t * t).sum(1)
+        sz, stz = (w * z).sum(1), (w * t * z).sum(1)
+        det = np.maximum(sw * stt - st * st, 1e-12)
+        a_new = (stt * sz - st * stz) / det
+        b_new = (sw * stz - st * sz) / det
+        eta = np.clip(a_new[:, None] + b_new[:, None] * t + off, -30, 30)
+        mu = np.exp(eta)
+        done = np.max(np.abs(b_new - b)) < tol
+        b = b_new
+        if done:
+            break
+    n = m.sum(1)
+    pearson = (m * (y - mu) ** 2 / mu).sum(1)
+    dispersion = np.maximum(1.0, pearson / np.maximum(n - 2, 1))
+    w = mu * m
+    sw, st, stt = w.sum(1), (w * t).sum(1), (w * t * t).sum(1)
+    se = np.sqrt(dispersion * sw / np.maximum(sw * stt - st * st, 1e-12))
+    return b, se, dispersion
+
+
+def bh_qvalues(p):
+    """Benjamini-Hochberg adjusted p-values."""
+    p = np.asarray(p, dtype=float)
+    n = len(p)
+    if n == 0:
+        return p
+    order = np.argsort(p)
+    q = p[order] * n / np.arange(1, n + 1)
+    q = np.minimum.accumulate(q[::-1])[::-1]
+    out = np.empty(n)
+    out[order] = np.minimum(q, 1.0)
+    return out
+
+
+def species_trends(tensor, min_total=MIN_TOTAL, min_years=MIN_YEARS, alpha=ALPHA):
+    """Trend of every (species, cell) series with enough records.
+
+    Columns: Species Name, Position, Years, Observations, Years observed,
+    Trend (%/yr), z, p, q, Observed Trend (Increasing / Decreasing / Stable).
+    """
+    ns, nc, ny = tensor.shape
+    cols = ["Species Name", "Position", "Years", "Observations", "Years observed",
+            "Trend (%/yr)", "z", "p", "q", "Observed Trend"]
+    if ns == 0 or ny < 3:
+        return pd.DataFrame(columns=cols)
+    coo = tensor.counts.tocoo()
+    series = coo.row.astype(np.int64) * nc + coo.col // ny        # (species, cell) id of each entry
+    totals = np.bincount(series, weights=coo.data, minlength=ns * nc)
+    n_years = np.bincount(series, minlength=ns * nc)
+    keep = np.flatnonzero((totals >= min_total) & (n_years >= min_years))
+    if len(keep) == 0:
+        return pd.DataFrame(columns=cols)
+    # Dense block only for the fitted series
+    slot = np.full(ns * nc, -1)
+    slot[keep] = np.arange(len(keep))
+    sel = slot[series] >= 0
+    y = np.zeros((len(keep), ny))
+    y[slot[series[sel]], coo.col[sel] % ny] = coo.data[sel]
+    cell = keep % nc
+    effort = tensor.effort()[cell]
+    t = (tensor.years - tensor.years.mean())[None, :].astype(float)
+    b, se, _ = fit_trends(y, effort, t)
+    z = b / se
+    p = 2 * norm.sf(np.abs(z))
+    q = bh_qvalues(p)
+    trend = np.expm1(b)
+    label = np.where(q < alpha, np.where(b < 0, "Decreasing", "Increasing"), "Stable")
+    return pd.DataFrame({
+        "Species Name": tensor.species[keep // nc], "Position": np.asarray(tensor.cells, dtype=object)[cell],
+        "Years": f"{tensor.years[0]}–{tensor.years[-1]}", "Observations": totals[keep].astype(int),
+        "Years observed": n_years[keep], "Trend (%/yr)": trend * 100, "z": z, "p": p, "q": q,
+        "Observed Trend": label,
+    }, columns=cols).sort_values(["q", "Trend (%/yr)"], ignore_index=True)
+
+
+def local_declines(trends, alpha=ALPHA, rate=RAPID_DECLINE_RATE):
+    """Significant declines at or below ``rate`` per year, steepest first."""
+    sel = (trends["q"] < alpha) & (trends["Trend (%/yr)"] <= rate * 100)
+    return trends[sel].sort_values("Trend (%/yr)", ignore_index=True)
+
+
+def site_trends(folder, positions=POSITIONS, pooled=False, years=None):
+    """Trends of the species tables of one site folder (per cell, or all cells pooled)."""
+    tables = load_positions(folder, "species_iucn_gbif_results_{pos}.csv", positions)
+    tables.raise_for_errors()
+    tensor = SpeciesTensor.from_tables(dict(tables.items()), years=years)
+    return species_trends(tensor.pooled() if pooled else tensor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Species observation trends and local declines for a site")
+    parser.add_argument("site", choices=[s for s in SITES if s != "Brazil"])
+    parser.add_argument("--pooled", action="store_true", help="one trend per species over all cells")
+    parser.add_argument("--all", action="store_true", help="write every fitted trend, not only declines")
+    parser.add_argument("--out", help="CSV to write (default: print)")
+    args = parser.parse_args()
+    trends = site_trends(SITES[args.site]["folder"], pooled=args.pooled)
+    out = trends if args.all else local_declines(trends)
+    if args.out:
+        out.to_csv(args.out, index=False)
+        print(f"{len(out)} rows written to {args.out}")
+    else:
+        print(out.round(4).to_string(index=False))
+    print(f"{len(trends)} series fitted, {(trends['Observed Trend'] == 'Decreasing').sum()} significant declines")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Viewport-driven map layers: send only the features the user is looking at.
+
+``st_folium(..., returned_objects=["bounds", "zoom"])`` reports the visible
+box after every pan or zoom (the component already coalesces move events,
+250 ms). ``ViewportIndex`` answers such a box from an STRtree over the
+layer's geometries and returns a GeoJSON FeatureCollection of just the
+intersecting features, cut to the queried tiles, simplified to about one
+screen pixel at that zoom and without features smaller than a pixel.
+
+Boxes are snapped outwards to the slippy-map tile grid of the zoom level
+(``tile_key``) and answers are kept per tile key in a small LRU, so panning
+within the same tiles or returning to an earlier view costs nothing and
+the payload only changes when the tiles covering the view change.
+"""
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import shapely
+
+TILE_PX = 256
+MAX_LAT = 85.0511
+
+
+def _tile_xy(lon, lat, zoom):
+    n = 2 ** zoom
+    lat = max(-MAX_LAT, min(MAX_LAT, lat))
+    x = (lon + 180.0) / 360.0 * n
+    y = (1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n
+    return x, y
+
+
+def _tile_lonlat(x, y, zoom):
+    n = 2 ** zoom
+    lon = x / n * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    return lon, lat
+
+
+def initial_bounds(center, zoom, width=900, height=400):
+    """``(west, south, east, north)`` of a ``width x height`` px map at ``center``/``zoom``."""
+    x, y = _tile_xy(center[1], center[0], zoom)
+    dx, dy = width / TILE_PX / 2, height / TILE_PX / 2
+    west, north = _tile_lonlat(x - dx, y - dy, zoom)
+    east, south = _tile_lonlat(x + dx, y + dy, zoom)
+    return west, south, east, north
+
+
+def view_from_map(state, center, zoom):
+    """``(bounds, zoom)`` from an ``st_folium`` return value, falling back to the initial view."""
+    bounds, z = (state or {}).get("bounds"), (state or {}).get("zoom")
+    try:
+        sw, ne = bounds["_southWest"], bounds["_northEast"]
+        box = (sw["lng"], sw["lat"], ne["lng"], ne["lat"])
+        if None in box:
+            raise TypeError
+    except (TypeError, KeyError):
+        return initial_bounds(center, zoom), zoom
+    return box, int(round(z)) if z is not None else zoom
+
+
+def tile_key(bounds, zoom, pad=0):
+    """``(zoom, x0, y0, x1, y1)`` range of the tiles covering ``bounds``."""
+    west, south, east, north = bounds
+    x0, y0 = _tile_xy(max(west, -180.0), north, zoom)
+    x1, y1 = _tile_xy(min(east, 180.0), south, zoom)
+    top = 2 ** zoom - 1
+    return (zoom, max(int(x0) - pad, 0), max(int(y0) - pad, 0),
+            min(int(x1) + pad, top), min(int(y1) + pad, top))
+
+
+def key_bounds(key):
+    """Lon/lat box ``(west, south, east, north)`` of a tile key."""
+    zoom, x0, y0, x1, y1 = key
+    west, north = _tile_lonlat(x0, y0, zoom)
+    east, south = _tile_lonlat(x1 + 1, y1 + 1, zoom)
+    return west, south, east, north
+
+
+def pixel_degrees(zoom):
+    """Width of one screen pixel in degrees of longitude at ``zoom``."""
+    return 360.0 / (TILE_PX * 2 ** zoom)
+
+
+class ViewportIndex:
+    """STRtree over one EPSG:4326 layer, answering tile-key queries as GeoJSON.
+
+    ``properties`` are the columns copied into each feature. Answers are
+    cached per tile key (``max_entries`` most recent); the index is read-only
+    after construction, so one instance can be shared by every session.
+    """
+
+    def __init__(self, gdf, properties=(), max_entries=64):
+        gdf = gdf.set_crs(epsg=4326, allow_override=gdf.crs is None).to_crs(epsg=4326)
+        self.geoms = shapely.make_valid(gdf.geometry.values)
+        self.tree = shapely.STRtree(self.geoms)
+        extent = shapely.bounds(self.geoms)
+        self._size = np.maximum(extent[:, 2] - extent[:, 0], extent[:, 3] - extent[:, 1])
+        self.props = gdf[list(properties)].reset_index(drop=True)
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.geoms)
+
+    def query(self, key, min_px=1.0):
+        """FeatureCollection of the features intersecting the tiles of ``key``."""
+        entry = (key, min_px)
+        with self._lock:
+            if entry in self._cache:
+                self._cache.move_to_end(entry)
+                return self._cache[entry]
+        fc = self._query(key, min_px)
+        with self._lock:
+            self._cache[entry] = fc
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return fc
+
+    def _query(self, key, min_px):
+        tol = pixel_degrees(key[0])
+        box = key_bounds(key)
+        idx = np.sort(self.tree.query(shapely.box(*box), predicate="intersects"))
+        idx = idx[self._size[idx] >= min_px * tol]
+        # Large patches are cut to the tiles so zooming in does not ship whole polygons
+        geoms = shapely.clip_by_rect(self.geoms[idx], *box)
+        geoms = shapely.simplify(geoms, tol, preserve_topology=True)
+        geoms = shapely.set_precision(geoms, tol / 4)
+        records = self.props.iloc[idx].to_dict("records")
+        features = [{"type": "Feature", "geometry": shapely.geometry.mapping(g), "properties": p}
+                    for g, p in zip(geoms, records) if not g.is_empty]
+        return {"type": "FeatureCollection", "features": features}
+
+    def view(self, bounds, zoom, min_px=1.0):
+        """``(tile key, FeatureCollection)`` for an ``st_folium`` viewport."""
+        key = tile_key(bounds, zoom)
+        return key, self.query(key, min_px)
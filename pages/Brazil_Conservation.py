@@ -7,6 +7,15 @@ import plotly.express as px
 from pathlib import Path
 from streamlit_folium import st_folium
 
+from biomet.dissolve import load_patches, patch_metrics
+from biomet.instrument import debug_sidebar, figure_payload, map_payload, panel, span, timed
+from biomet.raster import colorize, image_overlay, transition_counts
+from biomet.rasterize import ClassStack, ensure_class_stack, source_stamp
+from biomet.regions import (RegionPipeline, class_area_table, load_registry, load_year, overlay_png,
+                            region_years, register_region, series, year_file)
+from biomet.timeslider import year_slider_map
+from biomet.viewport import ViewportIndex, view_from_map
+
 # --- PAGE CONFIG ---
 st.set_page_config(
     page_title='Reforestation & Biodiversity Monitoring',
@@ -26,97 +35,248 @@ st.markdown("""
 # --- TOP BAR & CONTROLS ---
 cols = st.columns([4, 1, 1, 1])
 cols[0].markdown("## Reforestation & Biodiversity Platform")
-if cols[1].button("Add Region"): st.info("Feature coming soon")
+if cols[1].button("Add Region"): st.session_state.add_region = True
 if cols[2].button("Settings"):   st.info("Feature coming soon")
 if cols[3].button("Help"):       st.info("Feature coming soon")
-# --- REGION SELECTION ---
-BASE_DIR = Path(__file__).resolve().parent.parent
-regions = {
-    'Brazilian Amazon': {
-        'data_folder': BASE_DIR / 'Biodiversity_brazil',
-        'geo_prefix':  'BrazilAmazon',
-        'center':      [-3.5, -62.0],
-        'zoom':        5
-    }
-}
-selected = st.selectbox("Select Region", list(regions.keys()), key="region")
-cfg = regions[selected]
-st.divider()
 
-# --- DATA PREPARATION ---
-years = list(range(2018, 2024))
-files = {y: cfg['data_folder'] / f"{cfg['geo_prefix']}_{y}.geojson" for y in years}
+# --- CLASSES & PALETTE ---
 eco_codes = [1,2,3,4,5,6,7,8,9,10,11,14,15,16,17]
 labels = {
     1:'Evergreen needleleaf',2:'Evergreen broadleaf',3:'Deciduous needleleaf',4:'Deciduous broadleaf',
     5:'Mixed forest',6:'Wooded grassland',7:'Other wooded land',8:'Open shrubland',9:'Savanna',
     10:'Grassland',11:'Wetlands',14:'Crop/veg mosaic',15:'Snow & ice',16:'Barren',17:'Water'
 }
+forest_codes = [1,2,3,4,5]
+# Same palette as the former per-polygon layer: water blue, shrub/savanna yellow, rest green
+eco_colors = {c: (0,0,255,180) if c==17 else ((255,255,0,180) if c in (8,9) else (0,128,0,180)) for c in eco_codes}
 
-# --- METRIC CALCULATIONS ---
-# Fractal Fragmentation Index (FFI) based on shape index: perimeter/(2*sqrt(pi*area))
-ffi = []
-for y in years:
-    path = files[y]
-    if path.exists():
-        gdf = gpd.read_file(path).to_crs(epsg=3857)
-        gdf['area'] = gdf.geometry.area
-        gdf['peri'] = gdf.geometry.length
-        gdf['SI'] = gdf['peri'] / (2 * np.sqrt(np.pi * gdf['area']))
-        ffi.append(gdf['SI'].mean().round(3))
-    else:
-        ffi.append(np.nan)
+def eco_style(feat):
+    r, g, b, _ = eco_colors.get(feat['properties']['code'], (128, 128, 128, 180))
+    return {'fillColor': f'#{r:02x}{g:02x}{b:02x}', 'color': 'black', 'weight': 0.2, 'fillOpacity': 0.6}
+
+@st.cache_resource
+def load_pipeline():
+    # One background worker per server process; artifacts are shared through the cache folder
+    return RegionPipeline(eco_colors)
+
+@timed()
+@st.cache_resource
+def load_stack(site, stamp):
+    # Pixel-id GeoJSONs decoded into a years x rows x cols LC_Class array (built once, then mmap);
+    # keyed on the export mtimes, so a new or re-exported year rebuilds it
+    return ensure_class_stack(site)
+
+@timed()
+@st.cache_resource
+def load_viewport_index(path):
+    # Dissolved patches of one year behind an STRtree; answers are cached per tile key
+    patches = load_patches(Path(path))
+    if patches is None:
+        return None
+    patches = patches.assign(name=[labels.get(c, str(c)) for c in patches['code']],
+                             area_ha=patches['area_ha'].round(1))
+    return ViewportIndex(patches, ['code', 'name', 'area_ha'])
+
+@timed()
+@st.cache_resource
+def load_year_slider_map(name, pngs):
+    cfg = load_registry()[name]
+    overlays = {y: (png, load_year(cfg, y)['bounds']) for y, png, _ in pngs}
+    return year_slider_map(overlays, cfg['center'], cfg['zoom'], opacity=0.6)
+
+@st.fragment
+def viewport_map(cfg, year):
+    # Pans and zooms rerun only this fragment; the previous view comes back through the map key
+    index = load_viewport_index(str(year_file(cfg, year)))
+    if index is None:
+        st.info(f"No land-cover features for {year}")
+        return
+    bounds, zoom = view_from_map(st.session_state.get("viewport_map"), cfg['center'], cfg['zoom'])
+    key, fc = index.view(bounds, zoom)
+    fg = folium.FeatureGroup(name=f"Ecosystems {year}")
+    folium.GeoJson(fc, style_function=eco_style,
+                   tooltip=folium.GeoJsonTooltip(fields=['name', 'area_ha'], aliases=['Class', 'Area (ha)'])
+                   ).add_to(fg)
+    m = folium.Map(location=cfg['center'], zoom_start=cfg['zoom'], tiles='CartoDB positron')
+    st_folium(m, width='100%', height=400, key="viewport_map",
+              returned_objects=["bounds", "zoom"], feature_group_to_add=fg)
+    map_payload("viewport map", m)
+    st.caption(f"{len(fc['features'])} of {len(index)} patches in view · zoom {key[0]}")
+
+@timed()
+@st.cache_data
+def change_overlay(site, stamp, y1, y2):
+    stack = load_stack(site, stamp)
+    changed = stack.change(y1, y2).astype(np.uint8)
+    lost = stack.change(y1, y2, from_codes=forest_codes)
+    changed[lost & ~np.isin(stack.grid(y2), forest_codes)] = 2
+    tmp = ClassStack(changed[None], [y2], stack.transform, stack.crs)
+    grid, bounds = tmp.lonlat_grid(y2)
+    return colorize(grid, {1: (255,165,0,200), 2: (220,0,0,230)}), bounds
+
+# --- ADD REGION ---
+if st.session_state.get("add_region"):
+    with st.form("add_region_form"):
+        st.markdown("#### Add Region")
+        fc = st.columns(3)
+        new_name    = fc[0].text_input("Region name")
+        new_folder  = fc[1].text_input("Data folder", help="Absolute, or relative to the app folder")
+        new_pattern = fc[2].text_input("File pattern", value="Region_{year}.geojson",
+                                       help="Yearly land-cover exports; {year} is replaced by the year")
+        fc = st.columns(4)
+        new_lat  = fc[0].number_input("Center latitude", -90.0, 90.0, 0.0)
+        new_lon  = fc[1].number_input("Center longitude", -180.0, 180.0, 0.0)
+        new_zoom = fc[2].number_input("Zoom", 1, 18, 6)
+        new_rich = fc[3].text_input("Richness table (optional)", help="CSV with Year and Richness columns")
+        bc = st.columns([1, 1, 6])
+        submitted = bc[0].form_submit_button("Register")
+        cancelled = bc[1].form_submit_button("Cancel")
+    if cancelled:
+        st.session_state.add_region = False
+        st.rerun()
+    if submitted:
+        try:
+            new_cfg = register_region(new_name, new_folder, new_pattern, (new_lat, new_lon),
+                                      new_zoom, new_rich.strip() or None)
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            queued = load_pipeline().refresh(new_cfg)
+            st.session_state.add_region = False
+            st.session_state.region = new_cfg['name']
+            st.success(f"Registered {new_cfg['name']}: processing {len(queued)} year(s) in the background")
 
-# Species Richness (sample load)
-rich_file = BASE_DIR / 'Paris' / 'processed_species_iucn_gbif_results_center.csv'
-if rich_file.exists():
-    df_r = pd.read_csv(rich_file)
-    rich = [float(df_r.loc[df_r.Year==y,'Richness']) if y in df_r.Year.values else np.nan for y in years]
-else:
-    rich = [np.nan]*len(years)
+# --- REGION SELECTION ---
+BASE_DIR = Path(__file__).resolve().parent.parent
+regions = load_registry()
+selected = st.selectbox("Select Region", list(regions.keys()), key="region")
+cfg = regions[selected]
+site = cfg.get('site')
+# Only years without artifacts (new or re-exported files) are queued
+pipeline = load_pipeline()
+pipeline.refresh(cfg)
+pending, failed = pipeline.pending(cfg), pipeline.errors(cfg)
+if pending:
+    pc = st.columns([6, 1])
+    pc[0].info(f"Processing {', '.join(map(str, pending))} in the background")
+    pc[1].button("Refresh")
+for y, msg in failed.items():
+    st.warning(f"{y}: processing failed ({msg})")
+if failed and st.button("Retry failed years"):
+    pipeline.retry(cfg)
+    st.rerun()
+st.divider()
+
+# --- DATA PREPARATION ---
+years = region_years(cfg)
+files = {y: year_file(cfg, y) for y in years}
+stack_key = tuple(sorted(source_stamp(site).items())) if site else None
+
+# --- METRIC CALCULATIONS ---
+# FFI (mean compactness 1 / shape index of dissolved same-class patches, as in
+# biomet.fragmentation; falls when patches fragment) and richness come from
+# the per-year artifacts of the region pipeline
+dfm = series(cfg)
+done = dfm['Year'].tolist()
 
-# Combined Density (plants, animals, fungi)
-density = [950, 1020, 980, 1050, 970, 1010]
+# Combined Density (plants, animals, fungi) - sample values for the demo region
+density = {2018: 950, 2019: 1020, 2020: 980, 2021: 1050, 2022: 970, 2023: 1010}
+dfm['Density'] = [density.get(y, np.nan) for y in done] if site == 'Brazil' else np.nan
 
 # --- LAYOUT: MAP ON TOP LEFT ---
 top_cols = st.columns([3, 1], gap="small")
-st.markdown("#### Indicator Trends (2018–2023)", unsafe_allow_html=True)
-dfm = pd.DataFrame({'Year': years, 'FFI': ffi, 'Richness': rich, 'Density': density})
+span_label = f"{done[0]}–{done[-1]}" if done else "no processed years"
+st.markdown(f"#### Indicator Trends ({span_label})", unsafe_allow_html=True)
 graph_cols = st.columns(3, gap="small")
 metrics = ['FFI', 'Richness', 'Density']
 for idx, metric in enumerate(metrics):
     fig = px.line(dfm, x='Year', y=metric, markers=True, title=metric)
     graph_cols[idx].plotly_chart(fig, use_container_width=True, height=300)
+    figure_payload(f"chart: {metric}", fig)
 top_cols[1].empty()
-with top_cols[0]:
-    st.subheader(f"2023 Ecosystem Map — {selected}")
-    path23 = files[2023]
-    if path23.exists():
-        lc = gpd.read_file(path23)
-        lc['code'] = lc.get('LC_Class', lc.get('label')).astype(int)
-        eco = lc[lc.code.isin(eco_codes)].to_crs(epsg=4326)
+with top_cols[0], span("Map", kind="column"):
+    latest = done[-1] if done else None
+    st.subheader(f"{latest or ''} Ecosystem Map — {selected}")
+    map_mode = st.radio("Map mode", ["Year overlays", "Year slider", "Features in view"], horizontal=True,
+                        label_visibility="collapsed",
+                        help="Year slider plays and swipes between years in the browser; features in view "
+                             "sends only the patches inside the visible area, simplified for the zoom level")
+    if latest is not None and map_mode == "Features in view":
+        view_year = st.select_slider("Year", done, value=latest, key="view_year")
+        viewport_map(cfg, view_year)
+    elif latest is not None and map_mode == "Year slider":
+        # Keyed on the artifact files, so a rebuilt year produces a fresh bundle
+        pngs = tuple((y, str(p), p.stat().st_mtime_ns) for y in done if (p := overlay_png(cfg, y)) is not None)
+        slider_map = load_year_slider_map(selected, pngs)
+        st_folium(slider_map, width='100%', height=400, returned_objects=[], key="year_slider_map")
+        map_payload("year slider map", slider_map)
+    elif latest is not None:
         m = folium.Map(location=cfg['center'], zoom_start=cfg['zoom'], tiles='CartoDB positron')
-        for _, r in eco.iterrows():
-            c = r.code; name = labels[c]
-            col = 'blue' if c==17 else ('yellow' if c in (8,9) else 'green')
-            folium.GeoJson(
-                r.geometry,
-                style_function=lambda feat, color=col: {'fillColor':color,'color':color,'weight':0.8,'fillOpacity':0.5},
-                highlight_function=lambda feat: {'weight':2,'fillOpacity':0.7},
-                tooltip=name
-            ).add_to(m)
-        st_folium(m, width='100%', height=400)
+        # One pre-rendered image per year instead of one GeoJson layer per polygon
+        for y in done:
+            png, bounds = overlay_png(cfg, y), load_year(cfg, y)['bounds']
+            if png is not None and bounds:
+                image_overlay(str(png), bounds, name=f"Ecosystems {y}", show=(y == latest), opacity=0.6).add_to(m)
+        if site and len(done) > 1 and {done[0], latest} <= set(load_stack(site, stack_key).years):
+            rgba, bounds = change_overlay(site, stack_key, done[0], latest)
+            image_overlay(rgba, bounds, name=f"Change {done[0]}→{latest}", show=False, opacity=0.9).add_to(m)
+        folium.LayerControl(collapsed=True).add_to(m)
+        st_folium(m, width='100%', height=400, returned_objects=[])
+        map_payload("map", m)
+        st.caption("Green: forest & grassland · Yellow: shrubland/savanna · Blue: water. "
+                   "Change layer — orange: class change, red: forest loss.")
+    elif years:
+        st.info("Map artifacts are being prepared")
     else:
-        st.error(f"Missing GeoJSON: {path23}")
+        st.error(f"No land-cover files matching {cfg['pattern']} in {cfg['folder']}")
 # Spacer column to keep layout
 # --- GRAPHS IMMEDIATELY BELOW MAP ---
 
 
+# --- DEFORESTATION & CLASS CHANGE ---
+with panel("Deforestation & Class Change", expanded=False):
+    if site:
+        # Pixel-level change from the region's class stack
+        stack = load_stack(site, stack_key)
+        cc = st.columns(2)
+        y1 = cc[0].selectbox("From year", stack.years, index=0, key="chg_from")
+        y2 = cc[1].selectbox("To year", stack.years, index=len(stack.years)-1, key="chg_to")
+        ha = stack.pixel_area_ha
+        before, after = np.isin(stack.grid(y1), forest_codes), np.isin(stack.grid(y2), forest_codes)
+        mc = st.columns(3)
+        mc[0].metric("Forest loss (ha)", f"{(before & ~after).sum() * ha:,.0f}")
+        mc[1].metric("Forest gain (ha)", f"{(~before & after).sum() * ha:,.0f}")
+        mc[2].metric("Any class change (ha)", f"{stack.change(y1, y2).sum() * ha:,.0f}")
+        trans = transition_counts(stack.grid(y1), stack.grid(y2), {**labels, 0: "No data"}) * ha
+        st.markdown(f"**Transitions {y1} → {y2} (ha, rows = from)**")
+        st.dataframe(trans.round(0), use_container_width=True)
+    elif len(done) > 1:
+        # Onboarded regions: net class areas from the per-year artifacts
+        areas = class_area_table(cfg)
+        cc = st.columns(2)
+        y1 = cc[0].selectbox("From year", done, index=0, key="chg_from")
+        y2 = cc[1].selectbox("To year", done, index=len(done)-1, key="chg_to")
+        forest = areas.loc[areas.index.isin(forest_codes)]
+        st.metric("Net forest change (ha)", f"{forest[y2].sum() - forest[y1].sum():,.0f}")
+        tbl = pd.DataFrame({f"{y1} ha": areas[y1], f"{y2} ha": areas[y2], "Change (ha)": areas[y2] - areas[y1]})
+        tbl.index = [labels.get(c, str(c)) for c in tbl.index]
+        st.dataframe(tbl.round(0), use_container_width=True)
+    else:
+        st.info("At least two processed years are needed")
+
+# --- PATCH METRICS ---
+with panel("Patch Metrics", expanded=False):
+    patch_years = [y for y in done if load_year(cfg, y)['patches']]
+    if patch_years:
+        py = st.selectbox("Year", patch_years, index=0, key="patch_year")
+        pm = patch_metrics(load_patches(files[py]))
+        pm.insert(0, 'Class', [labels.get(c, str(c)) for c in pm.index])
+        st.dataframe(pm.round(2), use_container_width=True, hide_index=True)
+    else:
+        st.info("No processed years yet")
+
 # --- FOOTER ---
 st.divider()
 st.markdown("© 2025 Biomet.life")
 
-
-
-
-
+debug_sidebar("Brazil")
@@ -4,6 +4,18 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import plotly.express as px
+from biomet.charts import line_chart
+from biomet.instrument import debug_sidebar, map_payload, panel, span, timed
+from biomet.loaders import load_positions
+from biomet.shared import frame, geoframe
+from biomet.redlist import enriched
+from biomet.explain import AGGREGATE, ShapService
+from biomet.fire_model import load_or_train_la, predict_la
+from biomet.exposure import ExposureGrid
+from biomet.surface import build_surface
+from biomet.anomaly import alert_table, sync
+from biomet import forecast
+from biomet.sparse_features import load_family_table
 import geopandas as gpd
 import folium
 import branca
@@ -78,35 +90,99 @@ positions = [
 # === Data loading ===
 BASE_DIR   = Path(__file__).resolve().parent.parent 
 DATA_DIR       = BASE_DIR / "LA"
-@st.cache_data
+@timed()
+@st.cache_resource
+def load_families():
+    # Context columns stay dense, the ~400 family-count columns are CSR
+    return load_family_table(DATA_DIR / "LA_Fire_Readiness.csv")
+
+@timed()
+@st.cache_resource
 def load_monthly():
-    path = DATA_DIR / "LA_Fire_Readiness.csv"
-    df = pd.read_csv(DATA_DIR / "LA_Fire_Readiness.csv", parse_dates=["Date"])
-    return df.dropna(subset=["Date"])
+    # Read-only from here on: one frame per process instead of a copy per rerun
+    table = load_families()
+    df = table.dense.copy()
+    df["Family Observations"] = table.totals_per_row().values
+    return df.reset_index()
 
-@st.cache_data
+@timed()
 def load_matrix():
+    # Memory-mapped and shared by every session and server process
     path = DATA_DIR / "Annual_Fire_Readiness.csv"
-    return pd.read_csv(path, parse_dates=["Date"])
-
+    return frame(path, parse_dates=["Date"])
+
+@timed()
+@st.cache_resource
+def load_fire_model():
+    return load_or_train_la(DATA_DIR)
+
+@timed()
+@st.cache_resource
+def load_model_matrix():
+    # Same Date x cell layout as Annual_Fire_Readiness.csv
+    return predict_la(load_fire_model(), DATA_DIR)
+
+@timed()
+@st.cache_resource
+def load_shap_service():
+    # One explainer + worker per server process, shared by every session
+    return ShapService(load_fire_model(), DATA_DIR)
+
+@timed()
+@st.cache_resource
+def load_exposure_grid():
+    # Head counts per readiness cell (population by position, weighted by built-up share)
+    return ExposureGrid.from_site(load_matrix(), DATA_DIR)
+
+@timed()
 @st.cache_data
-def load_shap():
-    df = pd.read_csv(DATA_DIR / "shap_values_with_dates.csv")
-    df["Date"] = pd.to_datetime(df["Date"])
-    return df
+def exposure_tables(source):
+    # Every month and threshold in one pass; cached per readiness source
+    matrix = load_model_matrix() if source == "Local model" else load_matrix()
+    grid = load_exposure_grid()
+    return grid.summary(matrix), grid.cell_exposure(matrix), grid.top_cells(matrix)
+
+@timed()
+@st.cache_resource
+def load_readiness_surface(source):
+    # All months interpolated in one batch; stored on disk and memory-mapped
+    matrix = load_model_matrix() if source == "Local model" else load_matrix()
+    return build_surface(matrix)
+
+def file_stamp(*paths):
+    # Cache key for loaders over files that grow in place: changes on every rewrite
+    return tuple((p.stat().st_mtime_ns, p.stat().st_size) for p in paths)
+
+@timed()
+@st.cache_data
+def readiness_anomalies(stamp):
+    # Climatology state is stored; only months added since the last run are folded in
+    matrix = load_matrix()
+    clim, _ = sync("LA", matrix)
+    return clim.zscores(matrix), alert_table(matrix, clim)
 
+@timed()
 @st.cache_data
+def readiness_forecasts(stamp):
+    # Sufficient statistics are stored; new months are folded in, then one batched solve
+    grid_model, _ = forecast.sync("LA", load_matrix())
+    site_model, _ = forecast.sync("LA_site", load_monthly()[["Date", "Fire Readiness (%)"]])
+    return grid_model.forecast(), site_model.forecast()
+
+@timed()
+@st.cache_resource
 def load_landcover():
     path = DATA_DIR/ "export_land_cover_polygonsLA.geojson"
-    gdf = gpd.read_file(path)
+    gdf = geoframe(path)
     gdf = gdf[gdf["label"].notna()]
     gdf["label"] = gdf["label"].astype(int)
     return gdf
 
 df_monthly = load_monthly()
 df_matrix  = load_matrix()
-shap_df    = load_shap()
 gdf_lc     = load_landcover()
+fc_grid, fc_site = readiness_forecasts(file_stamp(DATA_DIR / "Annual_Fire_Readiness.csv",
+                                                  DATA_DIR / "LA_Fire_Readiness.csv"))
 
 # Land cover styling
 land_cover_dict = {
@@ -128,7 +204,7 @@ st.markdown("---")
 left, center, right = st.columns([4,5,4])
 
 # --- LEFT: time‐series & slider ---
-with left:
+with left, span("Left column", kind="column"):
     st.subheader("Time Filters & Trends")
     min_d = df_monthly["Date"].dt.date.min()
     max_d = df_monthly["Date"].dt.date.max()
@@ -145,58 +221,110 @@ with left:
 
     # Fire Readiness
     if "Fire Readiness (%)" in df_f.columns:
-        with st.expander("Fire Readiness Over Time", expanded=True):
-            fig_fr = px.line(
-                df_f, x="Date", y="Fire Readiness (%)", markers=True
+        with panel("Fire Readiness Over Time", expanded=True):
+            fig_fr = line_chart(
+                df_f, x="Date", y="Fire Readiness (%)", markers=True,
+                layout={"hovermode": "x unified"}
+            )
+            # Seasonal forecast with its 90% prediction interval
+            fig_fr.add_scatter(
+                x=list(fc_site["Date"]) + list(fc_site["Date"][::-1]),
+                y=list(fc_site["Upper"]) + list(fc_site["Lower"][::-1]),
+                fill="toself", fillcolor="rgba(255,127,14,0.2)", line={"width": 0},
+                name="90% interval", hoverinfo="skip"
             )
-            fig_fr.update_layout(hovermode="x unified")
+            fig_fr.add_scatter(x=fc_site["Date"], y=fc_site["Forecast"], mode="lines+markers",
+                               line={"dash": "dash", "color": "#ff7f0e"}, name="Forecast")
             st.plotly_chart(fig_fr, use_container_width=True)
 
     # Environmental Conditions
     env_cols = ["Avg Soil Moisture", "Avg Wind Speed", "Avg Precipitation"]
     valid_env = [c for c in env_cols if c in df_f.columns]
     if valid_env:
-        with st.expander("Environmental Conditions", expanded=False):
-            fig_env = px.line(
+        with panel("Environmental Conditions", expanded=False):
+            fig_env = line_chart(
                 df_f,
                 x="Date",
                 y=valid_env,
                 markers=True,
-                labels={col: col for col in valid_env}
+                labels={col: col for col in valid_env},
+                layout={"hovermode": "x unified"}
             )
-            fig_env.update_layout(hovermode="x unified")
             st.plotly_chart(fig_env, use_container_width=True)
 
     # Vegetation Count
     if "Vegetation Count" in df_f.columns:
-        with st.expander("Vegetation Count Over Time", expanded=False):
-            fig_vc = px.line(
+        with panel("Vegetation Count Over Time", expanded=False):
+            fig_vc = line_chart(
                 df_f,
                 x="Date",
                 y="Vegetation Count",
                 markers=True,
-                labels={"Vegetation Count": "Vegetation Count"}
+                labels={"Vegetation Count": "Vegetation Count"},
+                layout={"hovermode": "x unified"}
             )
-            fig_vc.update_layout(hovermode="x unified")
             st.plotly_chart(fig_vc, use_container_width=True)
 
     # Average Temperature
     if "Avg Temperature" in df_f.columns:
-        with st.expander("Average Temperature Over Time", expanded=False):
-            fig_temp = px.line(
+        with panel("Average Temperature Over Time", expanded=False):
+            fig_temp = line_chart(
                 df_f,
                 x="Date",
                 y="Avg Temperature",
                 markers=True,
-                labels={"Avg Temperature": "Temperature (°C)"}
+                labels={"Avg Temperature": "Temperature (°C)"},
+                layout={"hovermode": "x unified"}
             )
-            fig_temp.update_layout(hovermode="x unified")
             st.plotly_chart(fig_temp, use_container_width=True)
 
+    # Population exposure (pre-computed readiness)
+    with panel("Population Exposure", expanded=False):
+        exp_summary, _, _ = exposure_tables("Pre-computed")
+        exp_f = exp_summary[(exp_summary.index.date >= date_range[0]) &
+                            (exp_summary.index.date <= date_range[1])].reset_index()
+        people_cols = [c for c in exp_f.columns if c.startswith("People")]
+        fig_pw = line_chart(
+            exp_f, x="Date", y="Population-weighted readiness (%)", markers=True,
+            layout={"hovermode": "x unified"}
+        )
+        st.plotly_chart(fig_pw, use_container_width=True)
+        fig_people = line_chart(
+            exp_f, x="Date", y=people_cols,
+            labels={"value": "People", "variable": "Readiness"},
+            layout={"hovermode": "x unified"}
+        )
+        st.plotly_chart(fig_people, use_container_width=True)
+        st.dataframe(exp_f[people_cols].sum().rename("People-months").round().to_frame())
+        unmapped = load_exposure_grid().unmapped
+        if unmapped.sum():
+            st.caption(f"Outside the readiness grid: {', '.join(unmapped.index)} "
+                       f"({unmapped.sum():,.0f} people)")
+
+    # Taxonomic families (aggregated straight from the sparse block)
+    with panel("Taxonomic Families", expanded=False):
+        fam_tbl  = load_families()
+        in_range = ((fam_tbl.dense.index.date >= date_range[0]) &
+                    (fam_tbl.dense.index.date <= date_range[1]))
+        fig_fam = line_chart(
+            df_f, x="Date", y="Family Observations", markers=True,
+            layout={"hovermode": "x unified"}
+        )
+        st.plotly_chart(fig_fam, use_container_width=True)
+        top_fam = fam_tbl.totals_per_family(np.flatnonzero(in_range)).nlargest(10)
+        st.dataframe(top_fam.rename("Observations").to_frame(), height=250)
+
 
 # — Center: Year/Month select & Map —
-with center:
+with center, span("Map column", kind="column"):
     st.subheader("Map: Fire Readiness & Land Cover")
+    source = st.radio(
+        "Readiness source", ["Pre-computed", "Local model"], horizontal=True,
+        help="Local model: readiness re-predicted for every cell and month by the on-device model."
+    )
+    if source == "Local model":
+        with st.spinner("Running fire-readiness model…"):
+            df_matrix = load_model_matrix()
     # Build year/month selectors
     avail = df_matrix["Date"].dt.to_period("M").drop_duplicates().dt.to_timestamp()
     years = sorted(avail.dt.year.unique())
@@ -235,8 +363,13 @@ with center:
         ).add_to(lc_fg)
     lc_fg.add_to(m)
 
+    # Interpolated readiness surface (one image per month, water masked)
+    surface_layer = load_readiness_surface(source).overlay(target, name="Readiness Surface", opacity=0.7)
+    if surface_layer is not None:
+        surface_layer.add_to(m)
+
     # Fire Readiness grid layer
-    fr_fg = folium.FeatureGroup(name="Fire Readiness")
+    fr_fg = folium.FeatureGroup(name="Fire Readiness", show=False)
     row = df_matrix[df_matrix["Date"] == target]
     if row.empty:
         st.warning(f"No readiness data for {target.date()}")
@@ -260,42 +393,100 @@ with center:
                 ).add_to(fr_fg)
 
     fr_fg.add_to(m)
+
+    # Population exposure layer: readiness-weighted head count per cell
+    _, exp_cells, exp_top = exposure_tables(source)
+    exp_fg = folium.FeatureGroup(name="Population Exposure", show=False)
+    if target in exp_cells.index:
+        exp_row = exp_cells.loc[target]
+        exp_grid = load_exposure_grid().cells
+        peak = max(exp_row.max(), 1)
+        for c, lat, lon, pop in exp_grid[["cell", "lat", "lon", "population"]].itertuples(index=False):
+            if exp_row[c] > 0:
+                folium.CircleMarker(
+                    [lat, lon], radius=3 + 17 * np.sqrt(exp_row[c] / peak),
+                    color="purple", weight=1, fill=True, fill_opacity=0.5,
+                    tooltip=f"{c}: {pop:,.0f} people, {exp_row[c]:,.0f} exposed"
+                ).add_to(exp_fg)
+    exp_fg.add_to(m)
+
+    # Anomaly layer: z-score of the month against the cell's climatology for that calendar month
+    anom_z, anom_alerts = readiness_anomalies(file_stamp(DATA_DIR / "Annual_Fire_Readiness.csv"))
+    anom_fg = folium.FeatureGroup(name="Readiness Anomalies", show=False)
+    if target in anom_z.index:
+        anom_grid = create_la_grid(LA_BOUNDS, GRID_SIZE_DEG, n_cells=N_CELLS)
+        anom_grid["z"] = anom_grid["lat_lon"].map(anom_z.loc[target])
+        anom_grid = anom_grid[anom_grid["z"].notna()][["lat_lon", "z", "geometry"]]
+        zmap = branca.colormap.LinearColormap(["blue", "white", "red"], vmin=-3, vmax=3)
+        folium.GeoJson(
+            anom_grid.assign(z=anom_grid["z"].round(2)),
+            style_function=lambda feat: {
+                "fillColor": zmap(max(-3, min(3, feat["properties"]["z"]))),
+                "color": "gray", "weight": 0.5, "fillOpacity": 0.7
+            },
+            tooltip=folium.GeoJsonTooltip(fields=["lat_lon", "z"], aliases=["Cell", "z-score"])
+        ).add_to(anom_fg)
+    anom_fg.add_to(m)
+
+    # Forecast layer: every cell's readiness the chosen number of months after the last month
+    fc_h = st.select_slider("Forecast horizon (months ahead)", options=sorted(fc_grid["Horizon"].unique()),
+                            value=1, key="fc_horizon")
+    fc_sel = fc_grid[fc_grid["Horizon"] == fc_h].set_index("Cell")
+    fc_fg = folium.FeatureGroup(name=f"Readiness Forecast ({fc_sel['Date'].iloc[0]:%b %Y})", show=False)
+    fc_cells = create_la_grid(LA_BOUNDS, GRID_SIZE_DEG, n_cells=N_CELLS)
+    fc_cells = fc_cells[fc_cells["lat_lon"].isin(fc_sel.index)][["lat_lon", "geometry"]]
+    fc_cells = fc_cells.join(fc_sel[["Forecast", "Lower", "Upper"]].round(1), on="lat_lon")
+    fc_cmap = make_colormap(0, 100)
+    folium.GeoJson(
+        fc_cells,
+        style_function=lambda feat: {
+            "fillColor": fc_cmap(feat["properties"]["Forecast"]),
+            "color": "gray", "weight": 0.5, "fillOpacity": 0.7
+        },
+        tooltip=folium.GeoJsonTooltip(fields=["lat_lon", "Forecast", "Lower", "Upper"],
+                                      aliases=["Cell", "Forecast (%)", "Lower (%)", "Upper (%)"])
+    ).add_to(fc_fg)
+    fc_fg.add_to(m)
     folium.LayerControl(collapsed=False).add_to(m)
     st_folium(m, width=900, height=525)
+    map_payload("map", m)
+
+    with panel("Anomaly Alerts", expanded=False):
+        month_alerts = anom_alerts[anom_alerts["Date"] == target].drop(columns="Date")
+        st.markdown(f"**Alerts in {target.strftime('%b %Y')}:** {len(month_alerts)} cells "
+                    "(z ≥ 2, or 3+ months in a row at z ≥ 1)")
+        st.dataframe(month_alerts.round(2), hide_index=True, height=200)
+
+    with panel("Top-Risk Cells", expanded=False):
+        st.dataframe(exp_top[exp_top["Date"] == target].drop(columns="Date").round(1), hide_index=True)
 
 # — Right: SHAP waterfall —
-with right:
+with right, span("Right column", kind="column"):
     st.subheader("Predictions Explainability")
 
-   # SHAP waterfall code…
-    sel_row = shap_df[shap_df["Date"] == target]
-    if sel_row.empty:
+    # SHAP waterfall, computed on demand per month and grid cell
+    cell_opts = [AGGREGATE] + [c for c in df_matrix.columns if c != "Date"]
+    sel_cell  = st.selectbox("Grid cell", cell_opts, key="shap_cell")
+    shap_service = load_shap_service()
+    if target not in shap_service.shared.index:
         st.warning(f"No SHAP for {target.date()}")
     else:
-        feats = [c for c in shap_df.columns if c not in ["Date","base_value"]]
-        sv    = sel_row[feats].values[0]
-        bv    = sel_row["base_value"].values[0]
-        raw   = df_monthly[df_monthly["Date"] == target]
-        present = [f for f in feats if f in df_monthly.columns]
-        vals  = raw[present].iloc[0].values
-        expl  = shap.Explanation(
-            values=sv, base_values=bv,
-            data=vals, feature_names=present
-        )
+        with st.spinner("Computing SHAP explanation…"):
+            expl = shap_service.explain(target, sel_cell)
+        # Warm the neighbouring months in the background worker
+        shap_service.prefetch(target + pd.DateOffset(months=k) for k in (-1, 1))
 
-        st.markdown(f"**SHAP for {target.strftime('%b %Y')}**")
+        st.markdown(f"**SHAP for {target.strftime('%b %Y')}** — {sel_cell}")
         fig, ax = plt.subplots(figsize=(8,5))
         shap.plots.waterfall(expl, max_display=15, show=False)
         st.pyplot(fig)
 
         # — Threatened Species expander (now correctly indented) —
-        with st.expander("**Threatened Species**", expanded=True):
+        with panel("**Threatened Species**", expanded=True):
             at_risk_species = set()
-            for pos in positions:
-                csv_path = Path(__file__).parent / f"species_iucn_gbif_results_{pos}.csv"
-                if not csv_path.exists():
-                    continue
-                df_sp = pd.read_csv(csv_path)
+            species = load_positions(Path(__file__).parent, "species_iucn_gbif_results_{pos}.csv", positions, reader=enriched)
+            species.warn()
+            for pos, df_sp in species.items():
                 if "Year" in df_sp.columns:
                     df_sp = df_sp[df_sp["Year"] == 2024]
                 if {"Red List Category","Species Name"}.issubset(df_sp.columns):
@@ -312,3 +503,4 @@ with right:
                 unsafe_allow_html=True
             )
 
+debug_sidebar("Fire Hazard")
@@ -9,6 +9,21 @@ import math
 import ast
 from pathlib import Path
 import plotly.express as px
+from biomet.charts import line_chart
+from biomet.instrument import debug_sidebar, map_payload, panel, timed
+from biomet.loaders import load_positions
+from biomet.shared import frame, geoframe, workbook
+from biomet.redlist import enriched
+from biomet.taxonomy import invasive_detections, invasive_occurrences, load_index
+from biomet.trends import local_declines, site_trends
+from biomet.landcover import growth_table, landcover_layer, polygon_areas
+from biomet.connectivity import connectivity_by_year
+from biomet.fragmentation import (available_years, compare_years, corridors, display_table,
+                                  ecosystem_summary, high_integrity, rapid_decline, source_path)
+from biomet.rasterize import load_class_stack
+from biomet.timeslider import stack_overlays, year_slider_map
+from biomet.raster import (box_zones, change_map, class_areas, colorize, image_overlay,
+                           open_grid, pixel_area_ha, transition_counts, zonal_counts)
 import numpy as np
 import openpyxl
 import io
@@ -34,21 +49,31 @@ threshold_path = data_folder / 'Water and Air Quality Thresholds.xlsx'
 richness_folder = data_folder
 risk_folder = data_folder
 landcover_file = data_folder / 'export_land_cover_polygons_Stanlow_ChangeNow_2018.geojson'
+mask_files = {1990: data_folder / 'mask_1990.npy', 2018: data_folder / 'mask_2018.npy'}
+# The masks were exported over the land-cover study extent (west, south, east, north)
+MASK_BOUNDS = (-3.0714, 53.1485, -2.7296, 53.4216)
+MASK_LABELS = {0: "Outside mask", 1: "In mask"}
+CHANGE_COLORS = {1: (30, 90, 220, 200), 2: (220, 40, 40, 200), 3: (240, 160, 0, 200)}
 
-# === Confirmed Invasive Species in Europe ===
-invasive_species_europe = [
-    "Eriocheir sinensis", "Alopochen aegyptiacus",
-    "Sciurus carolinensis", "Muntiacus reevesi",
-    "Pacifastacus leniusculus", "Trachemys scripta",
-    "Lysichiton americanus", "Gunnera tinctoria",
-    "Lagarosiphon major", "Hydrocotyle ranunculoides",
-    "Heracleum mantegazzianum", "Impatiens glandulifera",
-    "Elodea nuttallii", "Myriophyllum aquaticum"
-]
+# === Invasive registers (Invasives/registers/*.csv, matched through Invasives/synonyms.csv) ===
+INVASIVE_REGISTERS = ["gb_watchlist"]
+
+@timed()
+@st.cache_resource
+def load_invasive_index(registers):
+    # Normalized, synonym-resolved keys of the site's registers (built once per process)
+    return load_index(list(registers))
+
+@timed()
+@st.cache_data
+def species_declines():
+    # Effort-normalized trend of every species per cell, fitted in one batch
+    trends = site_trends(data_folder)
+    return local_declines(trends), len(trends)
 
 # --- THRESHOLD LOADING & EXCEEDANCE FUNCTIONS ---
 threshold_path = data_folder / 'Water and Air Quality Thresholds.xlsx'
-thresholds = pd.read_excel(threshold_path, sheet_name=None)
+thresholds = workbook(threshold_path)
 ecosystem_water = thresholds['Ecosystem Water Quality']
 human_water    = thresholds['Human Water Quality ']
 epa_air        = thresholds['EPA Air Quality']
@@ -161,17 +186,17 @@ def create_square_region(lat, lon, radius_m):
 centers = create_nine_centers(latitude, longitude, radius_m)
 grid_geometries = [create_square_region(lat, lon, radius_m) for lat, lon in centers]
 
-richness_values, alpha_values = [], []
-for pos in positions:
-    path = richness_folder / f"processed_species_iucn_gbif_results_{pos}.csv"
-    try:
-        df = pd.read_csv(path)
-        row = df[df['Year']==2023]
-        richness_values.append(float(row['Richness'].values[0]) if not row.empty else None)
-        alpha_values.append(float(row['Alpha'].values[0]) if not row.empty else None)
-    except:
-        richness_values.append(None)
-        alpha_values.append(None)
+def richness_2023(path):
+    df = frame(path)
+    row = df[df['Year']==2023]
+    if row.empty:
+        return None, None
+    return float(row['Richness'].iloc[0]), float(row['Alpha'].iloc[0])
+
+richness = load_positions(richness_folder, "processed_species_iucn_gbif_results_{pos}.csv", positions,
+                          reader=richness_2023)
+richness_values = [richness.get(pos, (None, None))[0] for pos in positions]
+alpha_values    = [richness.get(pos, (None, None))[1] for pos in positions]
 
 grid_gdf = gpd.GeoDataFrame({
     'Position':positions, 'Richness':richness_values, 'Alpha':alpha_values
@@ -199,26 +224,43 @@ land_cover_dict = {     111: "Continuous urban fabric", 112: "Discontinuous urba
     511: "Water courses", 512: "Water bodies", 521: "Coastal lagoons",
     522: "Estuaries", 523: "Sea and ocean" }  
 
-# Build map function with dynamic layers
-def build_map(show_richness, show_risks, show_landcover, show_kba_only= True):
+@timed()
+@st.cache_resource
+def load_stack():
+    # Built offline with `python -m biomet.rasterize Stanlow`; None until then
+    return load_class_stack("Stanlow")
+
+@timed()
+@st.cache_resource
+def load_year_slider_map():
+    # Every stack year as one PNG in a single map; the year slider then runs in the browser
+    stack = load_stack()
+    if stack is None:
+        return None
+    colors = {c: (0,0,255,160) if c in water_classes else (0,128,0,160) if c in ecosystem_classes else (128,128,128,160)
+              for c in land_cover_dict}
+    return year_slider_map(stack_overlays("Stanlow", stack, colors), [latitude, longitude], 11)
+
+@timed()
+@st.cache_resource
+def load_masks():
+    # Memory-mapped, read-only; shared by every session of this process
+    return {y: open_grid(p) for y, p in mask_files.items() if p.exists()}
+
+# Build map function with dynamic layers. Every overlay lives in its own named
+# FeatureGroup; the show_* flags only set the initial visibility, so the same
+# map can be built once and toggled in the browser through the LayerControl.
+def build_map(show_richness=True, show_risks=True, show_landcover=True, show_kba_only= True):
     m = folium.Map(location=[latitude, longitude], zoom_start=11, tiles='CartoDB positron')
 
     # Land cover
-    if show_landcover and landcover_file.exists():
-        lc_gdf = gpd.read_file(landcover_file)
-        lc_gdf = lc_gdf[lc_gdf['label'].notna()]
-        lc_gdf['label'] = lc_gdf['label'].astype(int)
-        for _, row in lc_gdf.iterrows():
-            fill_color = ('blue' if row['label'] in water_classes else
-                          'green' if row['label'] in ecosystem_classes else 'gray')
-            folium.GeoJson(
-                row['geometry'],
-                style_function=lambda feat, c=fill_color: {'fillColor': c, 'color': 'black', 'weight': 0.3, 'fillOpacity': 0.5},
-                tooltip=land_cover_dict.get(row['label'], f'Unknown ({row["label"]})')
-            ).add_to(m)
+    # Polygons dissolved into one MultiPolygon per class (one feature per class, cached)
+    landcover_layer(landcover_file, land_cover_dict, water_classes, ecosystem_classes,
+                    show=show_landcover).add_to(m)
 
     # Species richness
-    if show_richness:
+    rich_fg = folium.FeatureGroup(name="Species Richness", show=show_richness)
+    if any(v is not None for v in richness_values):
         colormap = folium.LinearColormap(['red','orange','yellow'],
                                          vmin=min(v for v in richness_values if v is not None),
                                          vmax=max(v for v in richness_values if v is not None),
@@ -229,50 +271,88 @@ def build_map(show_richness, show_risks, show_landcover, show_kba_only= True):
             folium.GeoJson(
                 row.geometry.__geo_interface__,
                 style_function=lambda feat, col=color, w=weight: {'fillColor': col, 'color': 'black', 'weight': w, 'fillOpacity': 0.6}
-            ).add_to(m)
+            ).add_to(rich_fg)
             cent = row.geometry.centroid
             html = f"<div style='font-size:12px;text-align:center'><b>{row['Position']}</b><br>Richness: {row['Richness']:.2f}<br>Alpha: {row['Alpha']:.2f}</div>"
-            folium.Marker(location=[cent.y, cent.x], icon=folium.DivIcon(html=html)).add_to(m)
+            folium.Marker(location=[cent.y, cent.x], icon=folium.DivIcon(html=html)).add_to(rich_fg)
         colormap.add_to(m)
+    rich_fg.add_to(m)
 
     # Environmental risks
-    if show_risks:
-        for pos, (lat, lon) in zip(positions, centers):
-            csv_path = risk_folder / f"environmental_risks_{pos}.csv"
-            if not csv_path.exists(): continue
-            df_risk = pd.read_csv(csv_path)
-            for _, r in df_risk.iterrows():
-                coords = r.get('Coordinates')
-                if pd.isnull(coords) or coords=='None': continue
-                popup_html = f"<div style='font-size:12px;max-width:300px'><b>Region:</b> {r.get('Region Name','Unknown')}<br><b>Risk Info:</b> {r.get('Water Risk Details','N/A')}</div>"
-                try:
-                    y, x = ast.literal_eval(coords)
-                except:
-                    continue
-                if show_kba_only and r.get('Type of Protected Area')!='KBA':
-                    continue
-                if r.get('Type of Protected Area')=='KBA':
-                    poly = r.get('Polygon')
-                    if isinstance(poly, str) and poly!='N/A':
-                        try:
-                            geom = shapely.geometry.shape(ast.literal_eval(poly))
-                            folium.GeoJson(data=geom.__geo_interface__, style_function=lambda feat: {"fillColor":"blue","color":"black","weight":1,"fillOpacity":0.3}, tooltip=popup_html).add_to(m)
-                            continue
-                        except:
-                            pass
-                folium.Marker(location=[y, x], icon=folium.Icon(color='darkred', icon='exclamation-sign'), popup=popup_html).add_to(m)
+    risk_fg = folium.FeatureGroup(name="Environmental Risks", show=show_risks)
+    risks = load_positions(risk_folder, "environmental_risks_{pos}.csv", positions)
+    risks.raise_for_errors()
+    for pos, df_risk in risks.items():
+        for _, r in df_risk.iterrows():
+            coords = r.get('Coordinates')
+            if pd.isnull(coords) or coords=='None': continue
+            popup_html = f"<div style='font-size:12px;max-width:300px'><b>Region:</b> {r.get('Region Name','Unknown')}<br><b>Risk Info:</b> {r.get('Water Risk Details','N/A')}</div>"
+            try:
+                y, x = ast.literal_eval(coords)
+            except:
+                continue
+            if show_kba_only and r.get('Type of Protected Area')!='KBA':
+                continue
+            if r.get('Type of Protected Area')=='KBA':
+                poly = r.get('Polygon')
+                if isinstance(poly, str) and poly!='N/A':
+                    try:
+                        geom = shapely.geometry.shape(ast.literal_eval(poly))
+                        folium.GeoJson(data=geom.__geo_interface__, style_function=lambda feat: {"fillColor":"blue","color":"black","weight":1,"fillOpacity":0.3}, tooltip=popup_html).add_to(risk_fg)
+                        continue
+                    except:
+                        pass
+            folium.Marker(location=[y, x], icon=folium.Icon(color='darkred', icon='exclamation-sign'), popup=popup_html).add_to(risk_fg)
+    risk_fg.add_to(m)
+
+    # 1990 -> 2018 land-cover mask change, one image for the whole raster
+    masks = load_masks()
+    if len(masks) == 2:
+        change = change_map(masks[1990], masks[2018])
+        image_overlay(colorize(change, CHANGE_COLORS), MASK_BOUNDS,
+                      name="Land Cover Change 1990→2018", show=False).add_to(m)
+
+    folium.LayerControl(collapsed=False).add_to(m)
     return m
 
+@timed()
+@st.cache_resource
+def load_full_map():
+    # Built once per server process; overlay toggling then happens client-side
+    return build_map()
+
+@timed()
+@st.cache_data
+def fragmentation_years():
+    return available_years("Stanlow")
+
+@timed()
+@st.cache_data
+def fragmentation_table(option, y1, y2):
+    # Regenerated from the land-cover exports instead of the static *_2018.csv tables
+    center = (latitude, longitude)
+    if option == "Connectivity":
+        paths = {y: source_path("Stanlow", y) for y in fragmentation_years() if y1 <= y <= y2}
+        return connectivity_by_year(paths, ecosystem_classes)
+    if option == "Corridors":
+        return display_table(corridors("Stanlow", y2, center, ecosystem_classes), y1, y2, land_cover_dict)
+    cmp = compare_years("Stanlow", y1, y2, center, ecosystem_classes)
+    if option == "Ecosystem Summary":
+        return ecosystem_summary(cmp, land_cover_dict).rename(columns={"FFI_1": f"FFI_{y1}", "FFI_2": f"FFI_{y2}"})
+    sel = high_integrity(cmp) if option == "High Integrity" else rapid_decline(cmp)
+    return display_table(sel, y1, y2, land_cover_dict)
+
 
 # === PAGE LAYOUT ===
 st.title("Stanlow Biodiversity & Environmental Risk Viewer")
+richness.warn()
 st.markdown("This dashboard visualizes biodiversity richness, land cover, and environmental risks around the Stanlow Refinery.")
 
 left_col, center_col, right_col = st.columns([2,3,2])
 
 with left_col:
     st.subheader("Pressures")
-    with st.expander("Global & Local Pressures", expanded=True):
+    with panel("Global & Local Pressures", expanded=True):
         pressure_md = """
         - **Area of Land Use:** 1,900 acres (~770 ha)  
         - **Freshwater Use:** 70,600 m³/day (≈25.8 M m³/year)  
@@ -284,19 +364,23 @@ with left_col:
         - **Solid Waste:** 5,000 t/yr
         """
         st.markdown(pressure_md)
-    with st.expander("Invasive Species Detected", expanded=False):
-        invasive_species = set()
-        for pos in positions:
-            sp_path = data_folder / f"species_iucn_gbif_results_{pos}.csv"
-            if not sp_path.exists(): continue
-            df_sp = pd.read_csv(sp_path)
-            names = df_sp['Species Name'].dropna().unique()
-            invasive_species |= {n for n in names if n in invasive_species_europe}
+    with panel("Invasive Species Detected", expanded=False):
+        species = load_positions(data_folder, "species_iucn_gbif_results_{pos}.csv", positions, reader=frame)
+        species.warn()
+        # One vectorized lookup over every cell; a taxon counts if any of its rows is listed
+        occurrences = invasive_occurrences(species.results, load_invasive_index(tuple(INVASIVE_REGISTERS)))
+        detections = invasive_detections(occurrences)
+        invasive_species = set(occurrences['Invasive Name'])
         st.markdown(f"**Count:** {len(invasive_species)}")
         st.markdown("<div style='max-height:180px;overflow-y:auto'>"
                     + "<br>".join(sorted(invasive_species)) +
                     "</div>", unsafe_allow_html=True)
-    with st.expander("Impactful Activities Growth & Thresholds", expanded=False):
+        if not detections.empty:
+            st.markdown("**Invasive taxa per cell and year**")
+            st.caption("Years with at least one recorded observation of the taxon in the cell.")
+            st.dataframe(detections.pivot_table(index='Position', columns='Year', values='Invasive Name',
+                                                 aggfunc='nunique', fill_value=0), height=200)
+    with panel("Impactful Activities Growth & Thresholds", expanded=False):
         st.markdown("#### Impactful Activities Growth")
         years_available = [2001,2007,2012,2018]
         y1 = st.selectbox("Baseline year", years_available, index=0, key="growth_y1")
@@ -306,38 +390,22 @@ with left_col:
         else:
             file1 = data_folder / f"export_land_cover_polygons_Stanlow_ChangeNow_{y1}.geojson"
             file2 = data_folder / f"export_land_cover_polygons_Stanlow_ChangeNow_{y2}.geojson"
-            if file1.exists() and file2.exists():
-                gdf1, gdf2 = gpd.read_file(file1).to_crs(epsg=3857), gpd.read_file(file2).to_crs(epsg=3857)
-                for gdf in (gdf1,gdf2): gdf["area_ha"] = gdf.geometry.area/10_000
-                def human_label(gdf):
-                    if "Class Name" in gdf.columns: return gdf["Class Name"]
-                    elif "label" in gdf.columns:
-                        return gdf["label"].astype(int).map(lambda c: land_cover_dict.get(c,f"Unknown ({c})"))
-                    else:
-                        st.warning("No 'Class Name' or 'label' in land‐cover data.")
-                        return pd.Series(["Unknown"]*len(gdf), index=gdf.index)
-                keywords = ["Refinery","Petrochemical","Industrial","Port","Airport",
-                            "Landfill","Factory","Mining","Construction","Military"]
-                def filter_imp(gdf):
-                    names = human_label(gdf).str.lower()
-                    mask = names.str.contains("|".join(kw.lower() for kw in keywords), na=False)
-                    out = gdf[mask].copy(); out["Activity"] = human_label(gdf)[mask].values
-                    return out
-                imp1, imp2 = filter_imp(gdf1), filter_imp(gdf2)
-                sum1 = imp1.groupby("Activity")["area_ha"].sum().rename(f"{y1} ha")
-                sum2 = imp2.groupby("Activity")["area_ha"].sum().rename(f"{y2} ha")
-                dfg = pd.concat([sum1,sum2],axis=1).fillna(0)
-                dfg["Growth (ha)"] = dfg[f"{y2} ha"] - dfg[f"{y1} ha"]
-                dfg["% change"] = (dfg["Growth (ha)"]/dfg[f"{y1} ha"].replace(0,np.nan)*100).fillna(0)
-                dfg = dfg.reset_index().rename(columns={"index":"Activity"})
-                dfg = dfg[dfg["Activity"].str.lower()!="sport and leisure"]
+            stack = load_stack()
+            if stack is not None and y1 in stack.years and y2 in stack.years:
+                # Class areas straight from the rasterized stack (one bincount per year)
+                dfg = growth_table(stack.class_areas(y1), stack.class_areas(y2), y1, y2, land_cover_dict)
+            elif file1.exists() and file2.exists():
+                dfg = growth_table(polygon_areas(geoframe(file1), land_cover_dict),
+                                   polygon_areas(geoframe(file2), land_cover_dict), y1, y2)
+            else:
+                dfg = None
+                st.error(f"Missing GeoJSON for {y1} or {y2}.")
+            if dfg is not None:
                 st.dataframe(
                     dfg.style.format({f"{y1} ha":"{:.1f}", f"{y2} ha":"{:.1f}",
                                       "Growth (ha)":"{:.1f}","% change":"{:+.1f}%"}),
                     height=250
                 )
-            else:
-                st.error(f"Missing GeoJSON for {y1} or {y2}.")
         st.markdown("#### Threshold Exceedances")
         air_ex = check_exceedances(air_sites, epa_air)
         who_ex = check_exceedances(air_sites, who_air)
@@ -351,23 +419,73 @@ with left_col:
 
 with center_col:
     st.subheader("Ecosystem Health")
-    with st.expander("Map & Layer Controls", expanded=True):
-        # Overlay selection
-        layers = st.multiselect(
-            "Choose overlays:",
-            ["Species Richness", "Environmental Risks", "Land Cover"],
-            default=["Species Richness", "Environmental Risks", "Land Cover"]
+    with panel("Map & Layer Controls", expanded=True):
+        client_layers = st.toggle(
+            "Toggle overlays in the map", value=True,
+            help="Use the map's layer control to show/hide overlays without reloading the page."
         )
-        show_richness  = "Species Richness"  in layers
-        show_risks     = "Environmental Risks" in layers
-        show_landcover = "Land Cover"        in layers
+        if client_layers:
+            # All overlays are built once and cached; no rerun on toggle or pan
+            m = load_full_map()
+            st_folium(m, width=700, height=600, returned_objects=[], key="overlay_map")
+            map_payload("map", m)
+        else:
+            # Overlay selection
+            layers = st.multiselect(
+                "Choose overlays:",
+                ["Species Richness", "Environmental Risks", "Land Cover"],
+                default=["Species Richness", "Environmental Risks", "Land Cover"]
+            )
+            show_richness  = "Species Richness"  in layers
+            show_risks     = "Environmental Risks" in layers
+            show_landcover = "Land Cover"        in layers
 
-        # Build and display map in its own container
-        m = build_map(show_richness, show_risks, show_landcover)
-        # finally render the map
-        st_folium(m, width=700, height=600)
+            # Build and display map in its own container
+            m = build_map(show_richness, show_risks, show_landcover)
+            # finally render the map
+            st_folium(m, width=700, height=600)
+            map_payload("map", m)
 
-    with st.expander("Biometric Evolution Over Time", expanded=False):
+    with panel("Land Cover Through Time", expanded=False):
+        slider_map = load_year_slider_map()
+        if slider_map is None:
+            st.info("Class stack not built yet: run `python -m biomet.rasterize Stanlow`")
+        else:
+            # All years are embedded once; sliding, playing and swiping need no rerun
+            st_folium(slider_map, width=700, height=500, returned_objects=[], key="year_slider_map")
+            map_payload("year slider map", slider_map)
+            st.caption("Blue: water · Green: natural ecosystems · Grey: other land cover. "
+                       "Tick 'Compare with' and drag the divider to swipe between two years.")
+
+    with panel("Land Cover Change 1990→2018 (raster)", expanded=False):
+        masks = load_masks()
+        if len(masks) < 2:
+            st.info("Land-cover masks not found.")
+        else:
+            m90, m18 = masks[1990], masks[2018]
+            px_ha = pixel_area_ha(MASK_BOUNDS, m90.shape)
+            areas = pd.concat(
+                [class_areas(g, px_ha, MASK_LABELS).set_index("Name")["Area (ha)"].rename(f"{y} ha")
+                 for y, g in masks.items()], axis=1
+            ).fillna(0)
+            areas["Change (ha)"] = areas["2018 ha"] - areas["1990 ha"]
+            st.markdown("**Class areas**")
+            st.dataframe(areas.style.format("{:.1f}"))
+            st.markdown("**Transitions (ha, rows = 1990, columns = 2018)**")
+            st.dataframe((transition_counts(m90, m18, MASK_LABELS) * px_ha).style.format("{:.1f}"))
+            zones = box_zones(m90.shape, MASK_BOUNDS, [g.bounds for g in grid_geometries])
+            z90 = zonal_counts(m90, zones, len(positions), n_classes=2)
+            z18 = zonal_counts(m18, zones, len(positions), n_classes=2)
+            per_cell = pd.DataFrame({
+                "Position": positions,
+                "1990 in mask (ha)": z90[:, 1] * px_ha,
+                "2018 in mask (ha)": z18[:, 1] * px_ha,
+            })
+            per_cell["Change (ha)"] = per_cell["2018 in mask (ha)"] - per_cell["1990 in mask (ha)"]
+            st.markdown("**Per grid cell**")
+            st.dataframe(per_cell.style.format({c: "{:.1f}" for c in per_cell.columns[1:]}))
+
+    with panel("Biometric Evolution Over Time", expanded=False):
         view_option = st.selectbox(
             "View under map:",
             ["Biometric Evolution Over Time","Additional Data Table"]
@@ -377,52 +495,51 @@ with center_col:
             sel_metrics = st.multiselect("Select metrics:", metrics, default=[metrics[0]])
             sel_positions = st.multiselect("Select grid positions:", positions, default=["center"])
             df_list = []
-            for pos in sel_positions:
-                path = data_folder / f"processed_species_iucn_gbif_results_{pos}.csv"
-                if path.exists():
-                    df_pos = pd.read_csv(path)
-                    if "Year" in df_pos.columns:
-                        cols = [m for m in sel_metrics if m in df_pos.columns]
-                        if cols:
-                            df = df_pos[["Year"]+cols].dropna()
-                            df_m = df.melt(id_vars=["Year"], value_vars=cols, var_name="Metric", value_name="Value")
-                            df_m["Position"] = pos
-                            df_list.append(df_m)
+            processed = load_positions(data_folder, "processed_species_iucn_gbif_results_{pos}.csv", sel_positions,
+                                       reader=frame)
+            processed.warn()
+            for pos, df_pos in processed.items():
+                if "Year" in df_pos.columns:
+                    cols = [m for m in sel_metrics if m in df_pos.columns]
+                    if cols:
+                        df = df_pos[["Year"]+cols].dropna()
+                        df_m = df.melt(id_vars=["Year"], value_vars=cols, var_name="Metric", value_name="Value")
+                        df_m["Position"] = pos
+                        df_list.append(df_m)
             if df_list:
                 df_all = pd.concat(df_list, ignore_index=True)
-                fig = px.line(df_all, x="Year", y="Value",
-                              color="Metric", line_dash="Position",
-                              markers=True, title="Biometric Metrics Over Time")
-                fig.update_layout(height=400)
+                fig = line_chart(df_all, x="Year", y="Value",
+                                 color="Metric", line_dash="Position",
+                                 markers=True, title="Biometric Metrics Over Time",
+                                 layout={"height": 400})
                 st.plotly_chart(fig, use_container_width=True)
             else:
                 st.info("No data available.")
         else:
             st.markdown("### Additional Data Table")
-            file_map = {
-                "High Integrity":"high_integrity.csv",
-                "Rapid Decline":"rapid_decline.csv",
-                "Corridors":"corridors_2018.csv"
-            }
-            table_option = st.selectbox("Choose data to display:", list(file_map))
-            sel_file = data_folder / file_map[table_option]
-            if sel_file.exists():
-                try:
-                    df_table = pd.read_csv(sel_file)
-                    st.dataframe(df_table)
-                except Exception as e:
-                    st.warning(f"Could not load data: {e}")
+            table_option = st.selectbox("Choose data to display:",
+                                        ["High Integrity", "Rapid Decline", "Corridors", "Ecosystem Summary",
+                                         "Connectivity"])
+            frag_years = fragmentation_years()
+            if len(frag_years) < 2:
+                st.info("Not enough land-cover years for this site")
             else:
-                st.info(f"No data file for {table_option}")
+                yc = st.columns(2)
+                fy1 = yc[0].selectbox("From year", frag_years, index=0, key="frag_y1")
+                fy2 = yc[1].selectbox("To year", frag_years, index=len(frag_years)-1, key="frag_y2")
+                df_table = fragmentation_table(table_option, fy1, fy2)
+                if df_table.empty:
+                    st.info(f"No {table_option.lower()} entries for {fy1} → {fy2}")
+                else:
+                    st.dataframe(df_table.round(3), hide_index=True)
 
 with right_col:
     st.subheader("Risks")
-    with st.expander("Threatened Species", expanded=True):
+    with panel("Threatened Species", expanded=True):
         at_risk_species = set()
-        for pos in positions:
-            csv_path = data_folder / f"species_iucn_gbif_results_{pos}.csv"
-            if not csv_path.exists(): continue
-            df_sp = pd.read_csv(csv_path)
+        species = load_positions(data_folder, "species_iucn_gbif_results_{pos}.csv", positions, reader=enriched)
+        species.warn()
+        for pos, df_sp in species.items():
             if "Year" in df_sp.columns:
                 df_sp = df_sp[df_sp["Year"]==2024]
             if "Red List Category" in df_sp.columns and "Species Name" in df_sp.columns:
@@ -434,11 +551,18 @@ with right_col:
         st.markdown("<div style='max-height:180px;overflow-y:auto'>"
                     + "<br>".join(sorted(at_risk_species)) +
                     "</div>", unsafe_allow_html=True)
-    with st.expander("Physical Environmental Risks", expanded=False):
+    with panel("Observed Population Declines", expanded=False):
+        declines, n_fitted = species_declines()
+        st.markdown(f"**Count:** {declines['Species Name'].nunique()} species, "
+                    f"{len(declines)} of {n_fitted} cell trends")
+        st.caption("Significant declines (FDR 5%) of at least 15%/yr in the share of observations per cell.")
+        st.dataframe(declines[["Species Name", "Position", "Years", "Observations", "Trend (%/yr)", "q"]].round(3),
+                     hide_index=True, height=200)
+    with panel("Physical Environmental Risks", expanded=False):
         water_csv = data_folder / "water_risk_details.csv"
         if water_csv.exists():
             try:
-                df_water = pd.read_csv(water_csv)
+                df_water = frame(water_csv)
                 if not df_water.empty:
                     st.dataframe(df_water)
                 else:
@@ -447,7 +571,7 @@ with right_col:
                 st.error(f"Error loading: {e}")
         else:
             st.warning("water_risk_details.csv not found.")
-    with st.expander("Download Full Report", expanded=False):
+    with panel("Download Full Report", expanded=False):
         report_path = data_folder / 'biodiversity_impact_report_101-5.docx'
         if report_path.exists():
             with open(report_path, 'rb') as f:
@@ -461,3 +585,5 @@ with right_col:
             )
         else:
             st.error("Report file not found.")
+
+debug_sidebar("Stanlow")
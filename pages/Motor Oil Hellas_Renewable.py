@@ -9,6 +9,18 @@ import math
 import ast
 from pathlib import Path
 import plotly.express as px
+from biomet.charts import line_chart
+from biomet.instrument import debug_sidebar, map_payload, panel, timed
+from biomet.loaders import load_positions
+from biomet.shared import frame
+from biomet.redlist import enriched
+from biomet.taxonomy import invasive_detections, invasive_occurrences, load_index
+from biomet.trends import local_declines, site_trends
+from biomet.anomaly import alert_table, sync
+from biomet.landcover import landcover_layer
+from biomet.connectivity import connectivity_by_year
+from biomet.fragmentation import (available_years, compare_years, corridors, display_table,
+                                  ecosystem_summary, high_integrity, rapid_decline, source_path)
 import numpy as np
 import openpyxl
 import io
@@ -35,16 +47,22 @@ richness_folder = data_folder
 risk_folder = data_folder
 landcover_file = data_folder / 'export_land_cover_polygons_Motor_oil_landcov_2018.geojson'
 
-# === Confirmed Invasive Species in Europe ===
-invasive_species_europe = [
-    "Eriocheir sinensis", "Alopochen aegyptiacus",
-    "Sciurus carolinensis", "Muntiacus reevesi",
-    "Pacifastacus leniusculus", "Trachemys scripta",
-    "Lysichiton americanus", "Gunnera tinctoria",
-    "Lagarosiphon major", "Hydrocotyle ranunculoides",
-    "Heracleum mantegazzianum", "Impatiens glandulifera",
-    "Elodea nuttallii", "Myriophyllum aquaticum"
-]
+# === Invasive registers (Invasives/registers/*.csv, matched through Invasives/synonyms.csv) ===
+# Greek site: the European watchlist and the global GISD export shipped in MOH/
+INVASIVE_REGISTERS = ["europe_watchlist", "gisd", "gb_watchlist"]
+
+@timed()
+@st.cache_resource
+def load_invasive_index(registers):
+    # Normalized, synonym-resolved keys of the site's registers (built once per process)
+    return load_index(list(registers))
+
+@timed()
+@st.cache_data
+def species_declines():
+    # Effort-normalized trend of every species per cell, fitted in one batch
+    trends = site_trends(data_folder)
+    return local_declines(trends), len(trends)
 
 # --- THRESHOLD LOADING & EXCEEDANCE FUNCTIONS ---
 #threshold_path = data_folder / 'Water and Air Quality Thresholds.xlsx'
@@ -126,17 +144,17 @@ def create_square_region(lat, lon, radius_m):
 centers = create_nine_centers(latitude, longitude, radius_m)
 grid_geometries = [create_square_region(lat, lon, radius_m) for lat, lon in centers]
 
-richness_values, alpha_values = [], []
-for pos in positions:
-    path = richness_folder / f"processed_species_iucn_gbif_results_{pos}.csv"
-    try:
-        df = pd.read_csv(path)
-        row = df[df['Year']==2023]
-        richness_values.append(float(row['Richness'].values[0]) if not row.empty else None)
-        alpha_values.append(float(row['Alpha'].values[0]) if not row.empty else None)
-    except:
-        richness_values.append(None)
-        alpha_values.append(None)
+def richness_2023(path):
+    df = frame(path)
+    row = df[df['Year']==2023]
+    if row.empty:
+        return None, None
+    return float(row['Richness'].iloc[0]), float(row['Alpha'].iloc[0])
+
+richness = load_positions(richness_folder, "processed_species_iucn_gbif_results_{pos}.csv", positions,
+                          reader=richness_2023)
+richness_values = [richness.get(pos, (None, None))[0] for pos in positions]
+alpha_values    = [richness.get(pos, (None, None))[1] for pos in positions]
 
 grid_gdf = gpd.GeoDataFrame({
     'Position':positions, 'Richness':richness_values, 'Alpha':alpha_values
@@ -164,26 +182,20 @@ land_cover_dict = {     111: "Continuous urban fabric", 112: "Discontinuous urba
     511: "Water courses", 512: "Water bodies", 521: "Coastal lagoons",
     522: "Estuaries", 523: "Sea and ocean" }  
 
-# Build map function with dynamic layers
-def build_map(show_richness, show_risks, show_landcover, show_kba_only= True):
+# Build map function with dynamic layers. Every overlay lives in its own named
+# FeatureGroup; the show_* flags only set the initial visibility, so the same
+# map can be built once and toggled in the browser through the LayerControl.
+def build_map(show_richness=True, show_risks=True, show_landcover=True, show_kba_only= True):
     m = folium.Map(location=[latitude, longitude], zoom_start=11, tiles='CartoDB positron')
 
     # Land cover
-    if show_landcover and landcover_file.exists():
-        lc_gdf = gpd.read_file(landcover_file)
-        lc_gdf = lc_gdf[lc_gdf['label'].notna()]
-        lc_gdf['label'] = lc_gdf['label'].astype(int)
-        for _, row in lc_gdf.iterrows():
-            fill_color = ('blue' if row['label'] in water_classes else
-                          'green' if row['label'] in ecosystem_classes else 'gray')
-            folium.GeoJson(
-                row['geometry'],
-                style_function=lambda feat, c=fill_color: {'fillColor': c, 'color': 'black', 'weight': 0.3, 'fillOpacity': 0.5},
-                tooltip=land_cover_dict.get(row['label'], f'Unknown ({row["label"]})')
-            ).add_to(m)
+    # Polygons dissolved into one MultiPolygon per class (one feature per class, cached)
+    landcover_layer(landcover_file, land_cover_dict, water_classes, ecosystem_classes,
+                    show=show_landcover).add_to(m)
 
     # Species richness
-    if show_richness:
+    rich_fg = folium.FeatureGroup(name="Species Richness", show=show_richness)
+    if any(v is not None for v in richness_values):
         colormap = folium.LinearColormap(['red','orange','yellow'],
                                          vmin=min(v for v in richness_values if v is not None),
                                          vmax=max(v for v in richness_values if v is not None),
@@ -194,74 +206,73 @@ def build_map(show_richness, show_risks, show_landcover, show_kba_only= True):
             folium.GeoJson(
                 row.geometry.__geo_interface__,
                 style_function=lambda feat, col=color, w=weight: {'fillColor': col, 'color': 'black', 'weight': w, 'fillOpacity': 0.6}
-            ).add_to(m)
+            ).add_to(rich_fg)
             cent = row.geometry.centroid
             html = f"<div style='font-size:12px;text-align:center'><b>{row['Position']}</b><br>Richness: {row['Richness']:.2f}<br>Alpha: {row['Alpha']:.2f}</div>"
-            folium.Marker(location=[cent.y, cent.x], icon=folium.DivIcon(html=html)).add_to(m)
+            folium.Marker(location=[cent.y, cent.x], icon=folium.DivIcon(html=html)).add_to(rich_fg)
         colormap.add_to(m)
+    rich_fg.add_to(m)
 
     # Environmental risks
-    if show_risks:
-            for pos, (lat, lon) in zip(positions, centers):
-                csv_path = risk_folder / f"environmental_risks_{pos}.csv"
-                if not csv_path.exists():
-                    continue
-    
-                df_risk = pd.read_csv(csv_path)
-                for _, r in df_risk.iterrows():
-                    coords = r.get('Coordinates')
-                    if pd.isnull(coords) or coords == 'None':
-                        continue
-    
-                    # Common popup for all types
-                    area_type = r.get('Type of Protected Area', 'Unknown')
-                    region_name = r.get('Region Name','Unknown')
-                    popup_html = (
-                        f"<div style='font-size:12px;max-width:300px'>"
-                        f"<b>Region:</b> {region_name}<br>"
-                        f"<b>Area Type:</b> {area_type}</div>"
-                    )
-    
-                    # Parse location
+    risk_fg = folium.FeatureGroup(name="Environmental Risks", show=show_risks)
+    risks = load_positions(risk_folder, "environmental_risks_{pos}.csv", positions)
+    risks.raise_for_errors()
+    for pos, df_risk in risks.items():
+        for _, r in df_risk.iterrows():
+            coords = r.get('Coordinates')
+            if pd.isnull(coords) or coords == 'None':
+                continue
+
+            # Common popup for all types
+            area_type = r.get('Type of Protected Area', 'Unknown')
+            region_name = r.get('Region Name','Unknown')
+            popup_html = (
+                f"<div style='font-size:12px;max-width:300px'>"
+                f"<b>Region:</b> {region_name}<br>"
+                f"<b>Area Type:</b> {area_type}</div>"
+            )
+
+            # Parse location
+            try:
+                y, x = ast.literal_eval(coords)
+            except Exception:
+                continue
+
+            if area_type == 'KBA':
+                # Draw the full polygon if available
+                poly = r.get('Polygon')
+                if isinstance(poly, str) and poly != 'N/A':
                     try:
-                        y, x = ast.literal_eval(coords)
-                    except Exception:
+                        geom = shapely.geometry.shape(ast.literal_eval(poly))
+                        folium.GeoJson(
+                            data=geom.__geo_interface__,
+                            style_function=lambda feat: {
+                                "fillColor":"blue",
+                                "color":"black",
+                                "weight":1,
+                                "fillOpacity":0.3
+                            },
+                            tooltip=popup_html
+                        ).add_to(risk_fg)
                         continue
-    
-                    if area_type == 'KBA':
-                        # Draw the full polygon if available
-                        poly = r.get('Polygon')
-                        if isinstance(poly, str) and poly != 'N/A':
-                            try:
-                                geom = shapely.geometry.shape(ast.literal_eval(poly))
-                                folium.GeoJson(
-                                    data=geom.__geo_interface__,
-                                    style_function=lambda feat: {
-                                        "fillColor":"blue",
-                                        "color":"black",
-                                        "weight":1,
-                                        "fillOpacity":0.3
-                                    },
-                                    tooltip=popup_html
-                                ).add_to(m)
-                                continue
-                            except Exception:
-                                pass
-    
-                        # Fallback marker if polygon fails
-                        folium.Marker(
-                            location=[y, x],
-                            icon=folium.Icon(color='blue', icon='info-sign'),
-                            popup=popup_html
-                        ).add_to(m)
-                    else:
-                        # Non-KBA protected area: show as red marker
-                        folium.Marker(
-                            location=[y, x],
-                            icon=folium.Icon(color='red', icon='exclamation-sign'),
-                            popup=popup_html
-                        ).add_to(m)
-            
+                    except Exception:
+                        pass
+
+                # Fallback marker if polygon fails
+                folium.Marker(
+                    location=[y, x],
+                    icon=folium.Icon(color='blue', icon='info-sign'),
+                    popup=popup_html
+                ).add_to(risk_fg)
+            else:
+                # Non-KBA protected area: show as red marker
+                folium.Marker(
+                    location=[y, x],
+                    icon=folium.Icon(color='red', icon='exclamation-sign'),
+                    popup=popup_html
+                ).add_to(risk_fg)
+    risk_fg.add_to(m)
+
     # -------------------------------------------------------------------
     # Wind Turbine Layer (from KML)
     # -------------------------------------------------------------------
@@ -285,71 +296,114 @@ def build_map(show_richness, show_risks, show_landcover, show_kba_only= True):
     except Exception as e:
         st.error(f"Could not load wind‐turbine KML: {e}")
 
-    # Finally add a layer control so the user can toggle Wind Turbines on/off
-    folium.LayerControl().add_to(m)
+    # Finally add a layer control so the user can toggle every overlay on/off
+    folium.LayerControl(collapsed=False).add_to(m)
     
     return m
 
+@timed()
+@st.cache_resource
+def load_full_map():
+    # Built once per server process; overlay toggling then happens client-side
+    return build_map()
+
+@timed()
+@st.cache_data
+def fragmentation_years():
+    return available_years("MOH")
+
+@timed()
+@st.cache_data
+def fragmentation_table(option, y1, y2):
+    # Regenerated from the land-cover exports instead of the static *_2018.csv tables
+    center = (latitude, longitude)
+    if option == "Connectivity":
+        paths = {y: source_path("MOH", y) for y in fragmentation_years() if y1 <= y <= y2}
+        return connectivity_by_year(paths, ecosystem_classes)
+    if option == "Corridors":
+        return display_table(corridors("MOH", y2, center, ecosystem_classes), y1, y2, land_cover_dict)
+    cmp = compare_years("MOH", y1, y2, center, ecosystem_classes)
+    if option == "Ecosystem Summary":
+        return ecosystem_summary(cmp, land_cover_dict).rename(columns={"FFI_1": f"FFI_{y1}", "FFI_2": f"FFI_{y2}"})
+    sel = high_integrity(cmp) if option == "High Integrity" else rapid_decline(cmp)
+    return display_table(sel, y1, y2, land_cover_dict)
+
 
 # === PAGE LAYOUT ===
 st.title("Wind-Farm Biodiversity & Environmental Risk Viewer")
+richness.warn()
 st.markdown("This dashboard visualizes biodiversity richness, land cover, and environmental risks around the potential Wind-Farm Project.")
 
 left_col, center_col, right_col = st.columns([2,3,2])
 
 with left_col:
     st.subheader("Pressures")
-    with st.expander("Invasive Species Detected", expanded=False):
-        invasive_species = set()
-        for pos in positions:
-            sp_path = data_folder / f"species_iucn_gbif_results_{pos}.csv"
-            if not sp_path.exists(): continue
-            df_sp = pd.read_csv(sp_path)
-            names = df_sp['Species Name'].dropna().unique()
-            invasive_species |= {n for n in names if n in invasive_species_europe}
+    with panel("Invasive Species Detected", expanded=False):
+        species = load_positions(data_folder, "species_iucn_gbif_results_{pos}.csv", positions, reader=frame)
+        species.warn()
+        # One vectorized lookup over every cell; a taxon counts if any of its rows is listed
+        occurrences = invasive_occurrences(species.results, load_invasive_index(tuple(INVASIVE_REGISTERS)))
+        detections = invasive_detections(occurrences)
+        invasive_species = set(occurrences['Invasive Name'])
         st.markdown(f"**Count:** {len(invasive_species)}")
         st.markdown("<div style='max-height:180px;overflow-y:auto'>"
                     + "<br>".join(sorted(invasive_species)) +
                     "</div>", unsafe_allow_html=True)
-    with st.expander("Area of Water and Land Use", expanded=False):
+        if not detections.empty:
+            st.markdown("**Invasive taxa per cell and year**")
+            st.caption("Years with at least one recorded observation of the taxon in the cell.")
+            st.dataframe(detections.pivot_table(index='Position', columns='Year', values='Invasive Name',
+                                                 aggfunc='nunique', fill_value=0), height=200)
+    with panel("Area of Water and Land Use", expanded=False):
         # put at least one Streamlit call so the expander renders
         st.write("")  # or you can replace with a placeholder message
 
-    with st.expander("Light and Noise Disturbance", expanded=False):
+    with panel("Light and Noise Disturbance", expanded=False):
         # put at least one Streamlit call so the expander renders
         st.write("")  # or you can replace with a placeholder message
-    with st.expander("Release of Solid Waste", expanded=False):
+    with panel("Release of Solid Waste", expanded=False):
         # put at least one Streamlit call so the expander renders
         st.write("")  # or you can replace with a placeholder message
-    with st.expander("Resource Extraction", expanded=False):
+    with panel("Resource Extraction", expanded=False):
         # put at least one Streamlit call so the expander renders
         st.write("")  # or you can replace with a placeholder message
-    with st.expander("Air Soil and Water Pollution", expanded=False):
+    with panel("Air Soil and Water Pollution", expanded=False):
         # put at least one Streamlit call so the expander renders
         st.write("")  # or you can replace with a placeholder message
-    with st.expander("Impactful Activities Evolution", expanded=False):
+    with panel("Impactful Activities Evolution", expanded=False):
         # put at least one Streamlit call so the expander renders
         st.write("")  # or you can replace with a placeholder message
 
 with center_col:
     st.subheader("Ecosystem Health")
-    with st.expander("Map & Layer Controls", expanded=True):
-        # Overlay selection
-        layers = st.multiselect(
-            "Choose overlays:",
-            ["Species Richness", "Environmental Risks", "Land Cover"],
-            default=["Species Richness", "Environmental Risks", "Land Cover"]
+    with panel("Map & Layer Controls", expanded=True):
+        client_layers = st.toggle(
+            "Toggle overlays in the map", value=True,
+            help="Use the map's layer control to show/hide overlays without reloading the page."
         )
-        show_richness  = "Species Richness"  in layers
-        show_risks     = "Environmental Risks" in layers
-        show_landcover = "Land Cover"        in layers
+        if client_layers:
+            # All overlays are built once and cached; no rerun on toggle or pan
+            m = load_full_map()
+            st_folium(m, width=700, height=600, returned_objects=[], key="overlay_map")
+            map_payload("map", m)
+        else:
+            # Overlay selection
+            layers = st.multiselect(
+                "Choose overlays:",
+                ["Species Richness", "Environmental Risks", "Land Cover"],
+                default=["Species Richness", "Environmental Risks", "Land Cover"]
+            )
+            show_richness  = "Species Richness"  in layers
+            show_risks     = "Environmental Risks" in layers
+            show_landcover = "Land Cover"        in layers
 
-        # Build and display map in its own container
-        m = build_map(show_richness, show_risks, show_landcover)
-        # finally render the map
-        st_folium(m, width=700, height=600)
+            # Build and display map in its own container
+            m = build_map(show_richness, show_risks, show_landcover)
+            # finally render the map
+            st_folium(m, width=700, height=600)
+            map_payload("map", m)
 
-    with st.expander("Biometric Evolution Over Time", expanded=False):
+    with panel("Biometric Evolution Over Time", expanded=False):
         view_option = st.selectbox(
             "View under map:",
             ["Biometric Evolution Over Time","Additional Data Table"]
@@ -359,52 +413,51 @@ with center_col:
             sel_metrics = st.multiselect("Select metrics:", metrics, default=[metrics[0]])
             sel_positions = st.multiselect("Select grid positions:", positions, default=["center"])
             df_list = []
-            for pos in sel_positions:
-                path = data_folder / f"processed_species_iucn_gbif_results_{pos}.csv"
-                if path.exists():
-                    df_pos = pd.read_csv(path)
-                    if "Year" in df_pos.columns:
-                        cols = [m for m in sel_metrics if m in df_pos.columns]
-                        if cols:
-                            df = df_pos[["Year"]+cols].dropna()
-                            df_m = df.melt(id_vars=["Year"], value_vars=cols, var_name="Metric", value_name="Value")
-                            df_m["Position"] = pos
-                            df_list.append(df_m)
+            processed = load_positions(data_folder, "processed_species_iucn_gbif_results_{pos}.csv", sel_positions,
+                                       reader=frame)
+            processed.warn()
+            for pos, df_pos in processed.items():
+                if "Year" in df_pos.columns:
+                    cols = [m for m in sel_metrics if m in df_pos.columns]
+                    if cols:
+                        df = df_pos[["Year"]+cols].dropna()
+                        df_m = df.melt(id_vars=["Year"], value_vars=cols, var_name="Metric", value_name="Value")
+                        df_m["Position"] = pos
+                        df_list.append(df_m)
             if df_list:
                 df_all = pd.concat(df_list, ignore_index=True)
-                fig = px.line(df_all, x="Year", y="Value",
-                              color="Metric", line_dash="Position",
-                              markers=True, title="Biometric Metrics Over Time")
-                fig.update_layout(height=400)
+                fig = line_chart(df_all, x="Year", y="Value",
+                                 color="Metric", line_dash="Position",
+                                 markers=True, title="Biometric Metrics Over Time",
+                                 layout={"height": 400})
                 st.plotly_chart(fig, use_container_width=True)
             else:
                 st.info("No data available.")
         else:
             st.markdown("### Additional Data Table")
-            file_map = {
-                "High Integrity":"high_integrity.csv",
-                "Rapid Decline":"rapid_decline.csv",
-                "Corridors":"corridors_2018.csv"
-            }
-            table_option = st.selectbox("Choose data to display:", list(file_map))
-            sel_file = data_folder / file_map[table_option]
-            if sel_file.exists():
-                try:
-                    df_table = pd.read_csv(sel_file)
-                    st.dataframe(df_table)
-                except Exception as e:
-                    st.warning(f"Could not load data: {e}")
+            table_option = st.selectbox("Choose data to display:",
+                                        ["High Integrity", "Rapid Decline", "Corridors", "Ecosystem Summary",
+                                         "Connectivity"])
+            frag_years = fragmentation_years()
+            if len(frag_years) < 2:
+                st.info("Not enough land-cover years for this site")
             else:
-                st.info(f"No data file for {table_option}")
+                yc = st.columns(2)
+                fy1 = yc[0].selectbox("From year", frag_years, index=0, key="frag_y1")
+                fy2 = yc[1].selectbox("To year", frag_years, index=len(frag_years)-1, key="frag_y2")
+                df_table = fragmentation_table(table_option, fy1, fy2)
+                if df_table.empty:
+                    st.info(f"No {table_option.lower()} entries for {fy1} → {fy2}")
+                else:
+                    st.dataframe(df_table.round(3), hide_index=True)
 
 with right_col:
     st.subheader("Risks")
-    with st.expander("Threatened Species", expanded=True):
+    with panel("Threatened Species", expanded=True):
         at_risk_species = set()
-        for pos in positions:
-            csv_path = data_folder / f"species_iucn_gbif_results_{pos}.csv"
-            if not csv_path.exists(): continue
-            df_sp = pd.read_csv(csv_path)
+        species = load_positions(data_folder, "species_iucn_gbif_results_{pos}.csv", positions, reader=enriched)
+        species.warn()
+        for pos, df_sp in species.items():
             if "Year" in df_sp.columns:
                 df_sp = df_sp[df_sp["Year"]==2024]
             if "Red List Category" in df_sp.columns and "Species Name" in df_sp.columns:
@@ -416,27 +469,41 @@ with right_col:
         st.markdown("<div style='max-height:180px;overflow-y:auto'>"
                     + "<br>".join(sorted(at_risk_species)) +
                     "</div>", unsafe_allow_html=True)
-    with st.expander("Physical Environmental Risks", expanded=False):
+    with panel("Observed Population Declines", expanded=False):
+        declines, n_fitted = species_declines()
+        st.markdown(f"**Count:** {declines['Species Name'].nunique()} species, "
+                    f"{len(declines)} of {n_fitted} cell trends")
+        st.caption("Significant declines (FDR 5%) of at least 15%/yr in the share of observations per cell.")
+        st.dataframe(declines[["Species Name", "Position", "Years", "Observations", "Trend (%/yr)", "q"]].round(3),
+                     hide_index=True, height=200)
+    with panel("Physical Environmental Risks", expanded=False):
         fr_path = data_folder / "Fire_Readiness_2005_2024.csv"
         if fr_path.exists():
             # load and parse the date column
-            df_fr = pd.read_csv(fr_path, parse_dates=['Date'])
+            df_fr = frame(fr_path, parse_dates=['Date'])
             # melt so each region becomes a series
             df_long = df_fr.melt(
                 id_vars='Date',
                 var_name='Region',
                 value_name='Readiness'
             )
-            # line plot
-            fig = px.line(
+            # downsampled WebGL line plot (cached figure JSON)
+            fig = line_chart(
                 df_long,
                 x='Date',
                 y='Readiness',
                 color='Region',
-                title='Monthly Fire Readiness'
+                title='Monthly Fire Readiness',
+                layout={'height': 350}
             )
-            fig.update_layout(height=350)
             st.plotly_chart(fig, use_container_width=True)
+            # Anomaly against the calendar-month climatology (stored state, updated per new month)
+            clim, _ = sync("MOH", df_fr)
+            fr_alerts = alert_table(df_fr, clim)
+            st.markdown(f"**Anomaly {clim.last:%b %Y}:** z = {clim.z[0]:+.2f} "
+                        f"({clim.run[0]} month(s) in a row at z ≥ 1)")
+            if not fr_alerts.empty:
+                st.dataframe(fr_alerts.drop(columns="Cell").round(2), hide_index=True, height=150)
             # Below the chart, show other risk categories in bold
             st.markdown(
                 "**Drought**   |   **Flooding**   |   **Landslide**   |   **Water Quality Risks**"
@@ -448,7 +515,7 @@ with right_col:
 
 
 
-    with st.expander("Download Full Report", expanded=False):
+    with panel("Download Full Report", expanded=False):
         report_path = data_folder / 'MOH_biodiversity_impact_report.docx'
         if report_path.exists():
             with open(report_path, 'rb') as f:
@@ -462,3 +529,5 @@ with right_col:
             )
         else:
             st.error("Report file not found.")
+
+debug_sidebar("Motor Oil Hellas")